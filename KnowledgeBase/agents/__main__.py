@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import dataclasses
+import json
+import sys
+import time
+from typing import List, Optional
+
+# 命令列入口：python -m agents {extract,ingest,sync,worker,search,ask,index,bench}
+# 各子命令只在執行時匯入所需模組，graphiti、langextract 等重量級套件不會在啟動時載入
+from . import metrics
+from .extractor import DOCS_PATH, EXTRACT_MODE, EXTRACT_MODES
+
+
+def _add_ingest_options(parser: argparse.ArgumentParser) -> None:
+    _add_extract_options(parser)
+    parser.add_argument(
+        "--ingest-mode",
+        choices=("episode", "structured"),
+        help="episode: 交給graphiti以LLM抽取；structured: 以批次Cypher直接寫入節點與邊（預設 INGEST_MODE）",
+    )
+
+
+def _add_extract_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--docs", help="文件根目錄（預設 DOCS_PATH）")
+    parser.add_argument("--mode", choices=EXTRACT_MODES, help="抽取模式（預設 EXTRACT_MODE）")
+    parser.add_argument("--static-only", action="store_true", help="不呼叫LLM，只以靜態分析抽取")
+    parser.add_argument("--resume", action="store_true", help="略過抽取日誌中上次已完成的文件（預設清空日誌重新開始）")
+    parser.add_argument("--workers", type=int, default=0, help="以多個worker行程分片抽取（0表示在本行程內抽取）")
+
+
+def _mode(args: argparse.Namespace) -> str:
+    if args.static_only:
+        return "static"
+    return args.mode or EXTRACT_MODE
+
+
+def _docs_path(args: argparse.Namespace) -> str:
+    return args.docs or DOCS_PATH
+
+
+def cmd_extract(args: argparse.Namespace) -> int:
+    from .dedup import DEFAULT_DEDUP_THRESHOLD
+    from .extractor import EXTENSIONS, DocumentCollector, Extractor
+    from .journal import open_journal
+
+    started = time.perf_counter()
+    if args.workers or args.queue:
+        from .workqueue import DEFAULT_QUEUE_PATH, coordinate
+
+        # 結果由各worker寫回佇列，不含原始碼內容
+        results = coordinate(_docs_path(args), args.workers, _mode(args), args.queue or DEFAULT_QUEUE_PATH, resume=args.resume)
+        print(f"✅ 抽取完成 {len(results)} 個文件 ({time.perf_counter() - started:.1f}s)")
+        _write_results(results, args.output)
+        return 0
+
+    documents = DocumentCollector(_docs_path(args), EXTENSIONS).collect_documents()
+    with open_journal(args.resume, args.journal) as journal:
+        results = Extractor.langExtractor(
+            documents,
+            mode=_mode(args),
+            use_cache=not args.no_cache,
+            journal=journal,
+            dedup_threshold=DEFAULT_DEDUP_THRESHOLD if args.dedup is None else args.dedup,
+        )
+    _write_results(results, args.output)
+    print(f"✅ 抽取完成 {len(results)}/{len(documents)} 個文件 ({time.perf_counter() - started:.1f}s)")
+    return 0 if len(results) == len(documents) else 1
+
+
+def _write_results(results: List[dict], output: Optional[str]) -> None:
+    if not output:
+        return
+    from .segment import SEGMENT_SUFFIX, write_segment
+
+    # 原始碼內容不寫入輸出
+    if output.endswith(SEGMENT_SUFFIX):
+        write_segment(results, output)
+        return
+    with open(output, "w", encoding="utf-8") as f:
+        for res in results:
+            f.write(json.dumps({k: v for k, v in res.items() if k != "content"}, ensure_ascii=False) + "\n")
+
+
+def cmd_worker(args: argparse.Namespace) -> int:
+    from .workqueue import DEFAULT_LEASE_SECONDS, DEFAULT_QUEUE_PATH, run_worker
+
+    completed = run_worker(
+        args.queue or DEFAULT_QUEUE_PATH,
+        worker_id=args.id,
+        mode=args.mode,
+        lease_seconds=args.lease or DEFAULT_LEASE_SECONDS,
+        cache_path=args.cache,
+    )
+    print(f"✅ worker結束，完成 {completed} 個工作項目")
+    return 0
+
+
+async def _ingest(args: argparse.Namespace, sync: bool) -> None:
+    from . import connection
+    from .manifest import IngestManifest
+    from .structured import INGEST_MODE
+
+    manifest = IngestManifest()
+    try:
+        await connection.ingest(
+            manifest,
+            sync=sync,
+            stream=getattr(args, "stream", False),
+            mode=_mode(args),
+            docs_path=_docs_path(args),
+            resume=args.resume,
+            workers=args.workers,
+            ingest_mode=args.ingest_mode or INGEST_MODE,
+            results_path=getattr(args, "results", None),
+        )
+    finally:
+        manifest.close()
+        await connection.close_graphiti()
+
+
+def cmd_ingest(args: argparse.Namespace) -> int:
+    asyncio.run(_ingest(args, sync=False))
+    return 0
+
+
+def cmd_sync(args: argparse.Namespace) -> int:
+    asyncio.run(_ingest(args, sync=True))
+    return 0
+
+
+async def _search(args: argparse.Namespace) -> None:
+    from . import connection
+
+    # 本地索引有信心時直接回答，不建立Graphiti連線；本地索引只有抽取記錄，節點搜尋與依圖距離重排序只能在圖上做
+    local = None if args.graph or args.center or args.nodes else connection.local_search(args.query, args.limit)
+    if local is not None:
+        if args.json:
+            print(json.dumps([dataclasses.asdict(hit) for hit in local.hits], ensure_ascii=False, indent=2))
+        else:
+            connection.print_local_hits(local.hits)
+        return
+
+    try:
+        if args.nodes:
+            print_results, results = connection.print_nodes, await connection.search_nodes(args.query, args.limit)
+        else:
+            print_results, results = connection.print_edges, await connection.search_edges(
+                args.query, center_node_uuid=args.center, num_results=args.limit
+            )
+        if args.json:
+            print(json.dumps([result.model_dump(mode="json") for result in results], ensure_ascii=False, indent=2))
+        else:
+            print_results(results)
+    finally:
+        await connection.close_graphiti()
+
+
+def cmd_search(args: argparse.Namespace) -> int:
+    asyncio.run(_search(args))
+    return 0
+
+
+async def _ask(args: argparse.Namespace) -> None:
+    from . import connection
+    from .query import QueryAgent, measure_ttft
+
+    if args.fake:
+        from .fake_chat import FakeChatModel
+        from .fakes import FakeSearcher
+
+        agent = QueryAgent(
+            llm=FakeChatModel(first_token_latency=0.2, token_latency=0.01),
+            searcher=FakeSearcher(latency=0.05),
+        )
+        timing = await measure_ttft(agent, args.question, args.thread)
+        print(f"⏱️ TTFT {timing['ttft_seconds'] * 1000:.1f}ms，總時間 {timing['total_seconds'] * 1000:.1f}ms，{timing['tokens']} 個token")
+        return
+
+    try:
+        agent = QueryAgent(remember=args.remember)
+        async for token in agent.stream(args.question, args.thread):
+            print(token, end="", flush=True)
+        print()
+    finally:
+        await connection.close_graphiti()
+
+
+def cmd_ask(args: argparse.Namespace) -> int:
+    asyncio.run(_ask(args))
+    return 0
+
+
+def cmd_index(args: argparse.Namespace) -> int:
+    from .local_search import DEFAULT_LOCAL_INDEX, LocalSearchIndex
+    from .segment import load_results
+
+    started = time.perf_counter()
+    index = LocalSearchIndex.from_results(load_results(args.results))
+    index.save(args.index or DEFAULT_LOCAL_INDEX)
+    print(f"✅ 本地搜尋索引 {len(index)} 個條目 ({time.perf_counter() - started:.1f}s)")
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    from .benchmark import BenchmarkConfig, compare_reports, format_report, run_benchmark, save_report
+
+    config = BenchmarkConfig(
+        files=args.files,
+        mode=_mode(args),
+        model_latency=args.model_latency,
+        model_error_rate=args.error_rate,
+        concurrency=args.concurrency,
+        graph_latency=args.graph_latency,
+        ingest_bulk=args.bulk,
+        ingest_mode="structured" if args.structured else "episode",
+        ingest_batch_size=args.ingest_batch or (200 if args.structured else 20),
+        query_runs=args.queries,
+        end_to_end=not args.no_end_to_end,
+        seed=args.seed,
+    )
+    report = run_benchmark(config, corpus_dir=args.corpus, verbose=args.verbose)
+    print(format_report(report))
+    if args.output:
+        save_report(report, args.output)
+        print(f"💾 結果已寫入 {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print(compare_reports(json.load(f), report))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="agents", description="程式碼知識庫：抽取、導入與查詢")
+    parser.add_argument("--metrics", metavar="PATH", help="開啟指標記錄並在結束時寫出（.json 為JSON，其餘為Prometheus文字格式）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="抽取文件（不導入圖資料庫）")
+    _add_extract_options(extract)
+    extract.add_argument("--output", "-o", help="將結果寫入此檔案（.seg 為欄式交換檔，其餘為JSONL）")
+    extract.add_argument("--no-cache", action="store_true", help="不讀寫抽取快取")
+    extract.add_argument("--dedup", type=float, metavar="THRESHOLD", help="近似重複門檻（預設 EXTRACT_DEDUP_THRESHOLD，0表示不去重）")
+    extract.add_argument("--journal", help="抽取日誌路徑（預設 EXTRACT_JOURNAL）")
+    extract.add_argument("--queue", help="工作佇列路徑（預設 WORKQUEUE_PATH），可搭配 --workers 0 只等待其他機器的worker")
+    extract.set_defaults(func=cmd_extract)
+
+    ingest = commands.add_parser("ingest", help="抽取並導入所有文件")
+    _add_ingest_options(ingest)
+    ingest.add_argument("--stream", action="store_true", help="串流模式：邊讀取邊抽取邊導入")
+    ingest.add_argument("--from", dest="results", metavar="PATH", help="導入 extract --output 寫出的結果，不重新抽取")
+    ingest.set_defaults(func=cmd_ingest)
+
+    sync = commands.add_parser("sync", help="只導入新增或修改的文件，並移除已刪除文件的episode")
+    _add_ingest_options(sync)
+    sync.set_defaults(func=cmd_sync)
+
+    worker = commands.add_parser("worker", help="從共用工作佇列領取並抽取文件（可在多台機器上執行）")
+    worker.add_argument("--queue", help="工作佇列路徑（預設 WORKQUEUE_PATH）")
+    worker.add_argument("--id", help="worker識別名稱（預設 主機名-pid）")
+    worker.add_argument("--mode", choices=EXTRACT_MODES, help="抽取模式（預設沿用佇列的設定）")
+    worker.add_argument("--lease", type=float, help="租約秒數（預設 WORKQUEUE_LEASE_SECONDS）")
+    worker.add_argument("--cache", help="抽取快取路徑，必須在本機磁碟上（預設 EXTRACT_CACHE 加上worker名稱）")
+    worker.set_defaults(func=cmd_worker)
+
+    search = commands.add_parser("search", help="查詢知識圖")
+    search.add_argument("query", help="查詢文本")
+    search.add_argument("--center", help="依與此節點的圖距離重排序")
+    search.add_argument("--nodes", action="store_true", help="搜尋節點而非關係邊")
+    search.add_argument("--limit", type=int, default=10, help="結果數量")
+    search.add_argument("--json", action="store_true", help="以JSON輸出")
+    search.add_argument("--graph", action="store_true", help="略過本地索引，直接查詢Graphiti")
+    search.set_defaults(func=cmd_search)
+
+    ask = commands.add_parser("ask", help="以查詢agent回答問題（工具同時執行，回答逐詞串流）")
+    ask.add_argument("question", help="問題")
+    ask.add_argument("--thread", help="對話執行緒ID，相同ID延續先前的對話")
+    ask.add_argument("--remember", action="store_true", help="將問答以message episode寫回Graphiti")
+    ask.add_argument("--fake", action="store_true", help="以假模型與假搜尋後端執行，只量測首字延遲")
+    ask.set_defaults(func=cmd_ask)
+
+    index = commands.add_parser("index", help="由抽取結果檔重建本地搜尋索引（不需要圖資料庫）")
+    index.add_argument("results", help="extract --output 寫出的結果（.seg 或 JSONL）")
+    index.add_argument("--index", help="索引目錄（預設 LOCAL_SEARCH_INDEX）")
+    index.set_defaults(func=cmd_index)
+
+    bench = commands.add_parser("bench", help="以合成語料與假後端執行離線基準測試")
+    bench.add_argument("--files", type=int, default=500, help="合成文件數")
+    bench.add_argument("--mode", choices=EXTRACT_MODES, default="llm", help="抽取模式")
+    bench.add_argument("--static-only", action="store_true", help="等同 --mode static")
+    bench.add_argument("--model-latency", type=float, default=0.05, help="假模型每次呼叫的延遲秒數")
+    bench.add_argument("--error-rate", type=float, default=0.0, help="假模型的錯誤率")
+    bench.add_argument("--concurrency", type=int, default=8, help="模型與導入的並行數")
+    bench.add_argument("--graph-latency", type=float, default=0.01, help="假圖資料庫每次寫入的延遲秒數")
+    bench.add_argument("--bulk", action="store_true", help="以 add_episode_bulk 導入")
+    bench.add_argument("--structured", action="store_true", help="以批次Cypher直接寫入節點與邊（假圖資料庫）")
+    bench.add_argument("--ingest-batch", type=int, help="每批導入的文件數（預設 episode 20、structured 200）")
+    bench.add_argument("--queries", type=int, default=20, help="量測查詢agent首字延遲的次數")
+    bench.add_argument("--no-end-to-end", action="store_true", help="略過 langExtractor 端到端量測")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--corpus", help="語料目錄（預設在暫存目錄產生）")
+    bench.add_argument("--output", "-o", help="將報告以JSON寫入此檔案")
+    bench.add_argument("--compare", help="與先前的JSON報告比較")
+    bench.add_argument("--verbose", action="store_true", help="顯示各元件的逐筆輸出")
+    bench.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    try:
+        return args.func(args)
+    finally:
+        written = metrics.write(args.metrics)
+        if written:
+            print(f"📊 指標已寫入 {written}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,147 @@
 import os
 import uuid
-from contextlib import suppress
-from typing import Any, Sequence
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.constants import END, START
 from langgraph.graph import StateGraph
 
+# 每個對話執行緒保留的checkpoint數；只需要最新的checkpoint就能繼續對話
+AGENT_MAX_CHECKPOINTS = int(os.environ.get('AGENT_MAX_CHECKPOINTS', 2))
+# 同時保留的執行緒數，超過時淘汰最久未使用的執行緒
+AGENT_MAX_THREADS = int(os.environ.get('AGENT_MAX_THREADS', 256))
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    有上限的MemorySaver
+
+    MemorySaver 會保留每個執行緒每一步的checkpoint與所有版本的channel值，
+    對話越長占用越多。這裡每次寫入後只保留最新的 max_checkpoints 個checkpoint，
+    刪除不再被引用的channel值，並以LRU淘汰超過 max_threads 的執行緒。
+    """
+
+    def __init__(self, max_checkpoints: int = AGENT_MAX_CHECKPOINTS, max_threads: int = AGENT_MAX_THREADS, **kwargs: Any):
+        """
+        :param max_checkpoints: 每個執行緒（與命名空間）保留的checkpoint數
+        :param max_threads: 保留的執行緒數
+        """
+        super().__init__(**kwargs)
+        self.max_checkpoints = max(1, max_checkpoints)
+        self.max_threads = max(1, max_threads)
+        self._threads: "OrderedDict[str, None]" = OrderedDict()
+        # 每個 (thread_id, checkpoint_ns) 寫入過的 (channel, version)，刪除時不必掃描所有執行緒的值
+        self._blob_keys: Dict[Tuple[str, str], Set[Tuple[str, Any]]] = defaultdict(set)
+
+    def get_tuple(self, config):
+        self._touch(config["configurable"]["thread_id"])
+        return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        self._blob_keys[(thread_id, checkpoint_ns)].update(new_versions.items())
+        self._prune(thread_id, checkpoint_ns)
+        self._touch(thread_id)
+        return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        namespaces = list(self.storage.get(thread_id, {}))
+        super().delete_thread(thread_id)
+        for checkpoint_ns in namespaces:
+            self._blob_keys.pop((thread_id, checkpoint_ns), None)
+        self._threads.pop(thread_id, None)
+
+    def _touch(self, thread_id: str) -> None:
+        self._threads[thread_id] = None
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self.max_threads:
+            oldest, _ = self._threads.popitem(last=False)
+            self._evict(oldest)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+        # checkpoint id 是依時間遞增的uuid6，排序即為寫入順序
+        for checkpoint_id in sorted(checkpoints)[:-self.max_checkpoints]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        referenced = set()
+        for saved, _, _ in checkpoints.values():
+            referenced.update(self.serde.loads_typed(saved)["channel_versions"].items())
+        keys = self._blob_keys[(thread_id, checkpoint_ns)]
+        for channel, version in keys - referenced:
+            self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+        keys &= referenced
+
+    def _evict(self, thread_id: str) -> None:
+        # 只刪除本執行緒的鍵，不像 delete_thread 需要掃描全部的writes與blobs
+        for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            for channel, version in self._blob_keys.pop((thread_id, checkpoint_ns), ()):
+                self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+
+
+def trim_history(messages: Sequence[BaseMessage], max_messages: int) -> List[RemoveMessage]:
+    """
+    訊息超過上限時，從最舊的對話輪次開始移除
+
+    只在使用者訊息處切斷，工具呼叫與其結果不會被拆開。
+
+    :param messages: 目前的訊息
+    :param max_messages: 保留的訊息數上限
+    :return: 交給 add_messages 的 RemoveMessage 列表（不需要移除時為空）
+    """
+    excess = len(messages) - max_messages
+    if excess <= 0:
+        return []
+    cut = next(
+        (index for index, message in enumerate(messages) if index >= excess and isinstance(message, HumanMessage)),
+        None,
+    )
+    if cut is None:
+        # 最後一輪本身就超過上限時保留整輪
+        return []
+    return [RemoveMessage(id=message.id) for message in messages[:cut] if message.id]
+
+
+def thread_config(thread_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    :param thread_id: 對話執行緒ID，None時建立新的執行緒
+    :return: 傳給圖的config
+    """
+    return {"configurable": {"thread_id": thread_id or str(uuid.uuid4())}}
+
+
+def build_tool_agent(
+    state_schema: Any,
+    call_model: Callable[..., Any],
+    tools: Sequence[Any],
+    checkpointer: Optional[Any] = None,
+) -> Any:
+    """
+    建立 agent ⇄ tools 迴圈的圖
+
+    模型一次回傳多個工具呼叫時，ToolNode 會以 asyncio.gather 同時執行。
+
+    :param state_schema: 含 messages 的狀態型別
+    :param call_model: agent節點，回傳 {"messages": [...]}
+    :param tools: 工具
+    :param checkpointer: 預設為 BoundedMemorySaver
+    :return: 編譯後的圖
+    """
+    from langgraph.prebuilt import ToolNode, tools_condition
+
+    graph = StateGraph(state_schema)
+    graph.add_node("agent", call_model)
+    graph.add_node("tools", ToolNode(tools))
+    graph.add_edge(START, "agent")
+    graph.add_conditional_edges("agent", tools_condition, {"tools": "tools", END: END})
+    graph.add_edge("tools", "agent")
+    return graph.compile(checkpointer=checkpointer if checkpointer is not None else BoundedMemorySaver())
@@ -0,0 +1,536 @@
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from .chunker import DEFAULT_CHUNK_CHARS, merge_chunk_extractions, split_document
+from .extractor import EXTENSIONS, DocumentCollector, Extractor, _normalize, build_scheduler, combine_extractions
+from .fakes import FakeCrossEncoder, FakeEmbedder, FakeGraphDriver, FakeGraphiti, FakeModelClient, FakeSearcher
+from .ingest import EpisodeIngestor
+from .structured import StructuredIngestor
+from .packer import DEFAULT_PACK_CHARS, pack_documents, split_packed_extractions
+
+# 離線基準測試：以合成語料與假後端量測各階段的吞吐量、延遲分位數與記憶體峰值
+
+LANGUAGE_SUFFIXES = {"groovy": ".groovy", "java": ".java", "python": ".py"}
+
+_WORDS = [
+    "issue", "project", "manager", "field", "status", "priority", "owner", "sprint", "epic", "worklog",
+    "budget", "review", "release", "ticket", "assignee", "component", "version", "label", "comment", "team",
+]
+
+
+def _name(rng: random.Random, parts: int = 2) -> str:
+    words = [rng.choice(_WORDS) for _ in range(parts)]
+    return words[0] + "".join(word.capitalize() for word in words[1:])
+
+
+def _groovy_file(rng: random.Random, blocks: int) -> str:
+    lines = [
+        "import com.atlassian.jira.component.ComponentAccessor",
+        f"import com.example.{rng.choice(_WORDS)}.{_name(rng).capitalize()}",
+        "",
+    ]
+    for _ in range(blocks):
+        fn = _name(rng)
+        lines += [
+            f"// use ComponentAccessor to read the {rng.choice(_WORDS)} field",
+            f"def {fn}(issue) {{",
+            f"    def cf = ComponentAccessor.getCustomFieldManager().getCustomFieldObject(\"customfield_{rng.randint(10000, 29999)}\")",
+            f"    def value = issue.getCustomFieldValue(cf)?.toString()",
+            f"    if (value) {{ log.info(\"{fn}: \" + value) }}",
+            "    return value",
+            "}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def _java_file(rng: random.Random, blocks: int, class_name: str) -> str:
+    lines = [
+        f"package com.example.{rng.choice(_WORDS)};",
+        "",
+        "import org.springframework.stereotype.Service;",
+        f"import com.example.{rng.choice(_WORDS)}.{_name(rng).capitalize()};",
+        "",
+        "@Service",
+        f"public class {class_name} {{",
+    ]
+    for _ in range(blocks):
+        fn = _name(rng)
+        lines += [
+            f"    /** Resolve the {rng.choice(_WORDS)} for an issue. */",
+            f"    public String {fn}(Issue issue) {{",
+            f"        Object value = issue.getCustomFieldValue(\"customfield_{rng.randint(10000, 29999)}\");",
+            f"        return value == null ? \"\" : value.toString();",
+            "    }",
+            "",
+        ]
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def _python_file(rng: random.Random, blocks: int) -> str:
+    lines = ["import os", f"from {rng.choice(_WORDS)}.client import {_name(rng).capitalize()}", ""]
+    for _ in range(blocks):
+        fn = "_".join(rng.choice(_WORDS) for _ in range(2))
+        lines += [
+            f"def {fn}(issue: dict) -> str:",
+            f"    \"\"\"Return the {rng.choice(_WORDS)} stored in customfield_{rng.randint(10000, 29999)}.\"\"\"",
+            f"    value = issue.get(\"fields\", {{}}).get(\"customfield_{rng.randint(10000, 29999)}\")",
+            "    return os.path.basename(str(value))",
+            "",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def generate_corpus(
+    root: str,
+    files: int = 500,
+    languages: Sequence[str] = ("groovy", "java", "python"),
+    mean_blocks: int = 6,
+    seed: int = 0,
+) -> List[str]:
+    """
+    產生合成的Groovy/Java/Python語料
+
+    :param root: 輸出目錄
+    :param files: 文件數
+    :param languages: 語言（groovy / java / python）
+    :param mean_blocks: 每個文件平均的函數數量（文件大小以此控制）
+    :param seed: 亂數種子，相同參數產生相同語料
+    :return: 產生的文件路徑
+    """
+    rng = random.Random(seed)
+    paths = []
+    for number in range(files):
+        language = languages[number % len(languages)]
+        blocks = max(1, int(rng.expovariate(1 / mean_blocks)))
+        directory = os.path.join(root, language, f"module{number % 17}", f"pkg{number % 5}")
+        os.makedirs(directory, exist_ok=True)
+        if language == "groovy":
+            name, text = f"script{number}", _groovy_file(rng, blocks)
+        elif language == "java":
+            name = f"Service{number}"
+            text = _java_file(rng, blocks, name)
+        else:
+            name, text = f"module_{number}", _python_file(rng, blocks)
+        path = os.path.join(directory, name + LANGUAGE_SUFFIXES[language])
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(path)
+    return paths
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """最近秩法分位數（q介於0與100）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """行程至今的記憶體峰值（MB），不支援的平台返回0"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS以位元組計，Linux以KB計
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class StageReport:
+    """單一階段的量測結果"""
+
+    name: str
+    count: int = 0
+    seconds: float = 0.0
+    latencies: List[float] = field(default_factory=list, repr=False)
+    peak_rss_mb: float = 0.0
+
+    @property
+    def per_sec(self) -> float:
+        return self.count / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "seconds": round(self.seconds, 4),
+            "per_sec": round(self.per_sec, 2),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 3),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+        }
+
+
+class _Stage:
+    """量測一個階段的總時間與記憶體峰值"""
+
+    def __init__(self, report: StageReport):
+        self.report = report
+
+    def __enter__(self) -> StageReport:
+        self._started = time.perf_counter()
+        return self.report
+
+    def __exit__(self, *exc: Any) -> None:
+        self.report.seconds = time.perf_counter() - self._started
+        self.report.peak_rss_mb = peak_rss_mb()
+
+
+class _TimedGraphiti:
+    """記錄每次 add_episode / add_episode_bulk 延遲的包裝"""
+
+    def __init__(self, graphiti: Any, latencies: List[float]):
+        self.graphiti = graphiti
+        self.latencies = latencies
+
+    async def add_episode(self, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await self.graphiti.add_episode(**kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    async def add_episode_bulk(self, bulk_episodes: List[Any], group_id: Optional[str] = None) -> Any:
+        started = time.perf_counter()
+        try:
+            return await self.graphiti.add_episode_bulk(bulk_episodes, group_id)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.graphiti, name)
+
+
+class _TimedDriver:
+    """記錄每次 execute_query 延遲的包裝"""
+
+    def __init__(self, driver: Any, latencies: List[float]):
+        self.driver = driver
+        self.latencies = latencies
+
+    async def execute_query(self, query: str, **params: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await self.driver.execute_query(query, **params)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+@dataclass
+class BenchmarkConfig:
+    """基準測試參數（全部寫入輸出JSON以便比較）"""
+
+    files: int = 500
+    languages: Sequence[str] = ("groovy", "java", "python")
+    mean_blocks: int = 6
+    seed: int = 0
+    mode: str = "llm"
+    model_latency: float = 0.05
+    model_jitter: float = 0.02
+    model_error_rate: float = 0.0
+    concurrency: int = 8
+    chunk_chars: int = DEFAULT_CHUNK_CHARS
+    pack_chars: int = DEFAULT_PACK_CHARS
+    read_workers: int = 8
+    graph_latency: float = 0.01
+    graph_error_rate: float = 0.0
+    ingest_batch_size: int = 20
+    ingest_bulk: bool = False
+    ingest_mode: str = "episode"
+    embed_latency: float = 0.02
+    embed_texts: int = 2000
+    rerank_latency: float = 0.02
+    rerank_queries: int = 200
+    rerank_distinct: int = 20
+    query_runs: int = 20
+    search_latency: float = 0.05
+    chat_first_token_latency: float = 0.2
+    chat_token_latency: float = 0.01
+    end_to_end: bool = True
+
+
+def run_benchmark(config: BenchmarkConfig, corpus_dir: Optional[str] = None, verbose: bool = False) -> Dict[str, Any]:
+    """
+    以假後端執行 collect → extract → normalize → ingest → embed → rerank → query 並量測
+
+    :param config: 基準測試參數
+    :param corpus_dir: 語料目錄，None時在暫存目錄產生
+    :param verbose: 為False時隱藏各元件的逐筆輸出
+    :return: 可序列化為JSON的報告
+    """
+    with contextlib.ExitStack() as stack:
+        if corpus_dir is None:
+            corpus_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="agents-bench-"))
+        work_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="agents-bench-work-"))
+        started = time.perf_counter()
+        generate_corpus(corpus_dir, config.files, config.languages, config.mean_blocks, config.seed)
+        corpus_seconds = time.perf_counter() - started
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        stages, end_to_end = _run_stages(config, corpus_dir, work_dir)
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {**asdict(config), "languages": list(config.languages)},
+        "corpus_seconds": round(corpus_seconds, 3),
+        "stages": {report.name: report.to_dict() for report in stages},
+        "end_to_end": end_to_end,
+    }
+
+
+def _run_stages(config: BenchmarkConfig, corpus_dir: str, work_dir: str):
+    from .embedding_store import BatchingEmbedder, EmbeddingStore
+    from .search_cache import CachedCrossEncoder
+
+    def model_client() -> FakeModelClient:
+        return FakeModelClient(config.model_latency, config.model_jitter, config.model_error_rate, seed=config.seed)
+
+    stages = []
+
+    # collect: 走訪目錄並讀檔
+    collector = DocumentCollector(corpus_dir, EXTENSIONS, read_workers=config.read_workers)
+    with _Stage(StageReport("collect")) as collect:
+        def timed_load(path: str) -> Optional[Dict]:
+            t = time.perf_counter()
+            doc = collector.load_document(path)
+            collect.latencies.append(time.perf_counter() - t)
+            return doc
+
+        with ThreadPoolExecutor(max_workers=config.read_workers) as pool:
+            documents = [doc for doc in pool.map(timed_load, collector.iter_files()) if doc is not None]
+        collect.count = len(documents)
+    stages.append(collect)
+
+    # extract: 經排程器（限流、重試、並行）呼叫假模型
+    scheduler = build_scheduler(config.concurrency, client=model_client(), mode=config.mode)
+    packs, singles = pack_documents(documents, config.pack_chars)
+    units = packs + [chunk for doc in singles for chunk in split_document(doc, config.chunk_chars)]
+    with _Stage(StageReport("extract")) as extract:
+        outcomes = scheduler.run(units) if config.mode != "static" else []
+        extract.count = len(documents)
+        extract.latencies = [outcome.latency for outcome in outcomes]
+    stages.append(extract)
+
+    # normalize: 拆回各文件、合併切塊、與靜態結果合併並正規化
+    parts: Dict[str, List] = defaultdict(list)
+    failed = set()
+    for outcome in outcomes:
+        unit = outcome.doc
+        if "members" in unit:
+            if outcome.error is not None:
+                failed.update(doc_id for doc_id, _, _ in unit["members"])
+                continue
+            split, _ = split_packed_extractions(unit, outcome.result.extractions)
+            for doc_id, extractions in split.items():
+                parts[doc_id].append((0, extractions))
+        elif outcome.error is not None:
+            failed.add(unit["parent_id"])
+        else:
+            parts[unit["parent_id"]].append((unit["chunk_start"], outcome.result.extractions))
+    results = []
+    with _Stage(StageReport("normalize")) as normalize:
+        for doc in documents:
+            if doc["document_id"] in failed:
+                continue
+            t = time.perf_counter()
+            extractions = merge_chunk_extractions(parts.get(doc["document_id"], []))
+            data = _normalize(combine_extractions(extractions, doc, config.mode), doc)
+            normalize.latencies.append(time.perf_counter() - t)
+            results.append({
+                "id": doc["document_id"],
+                "content_hash": doc["content_hash"],
+                "mtime": doc["mtime"],
+                "metadata": data["metadata"],
+                "records": data["records"],
+            })
+        normalize.count = len(results)
+    stages.append(normalize)
+
+    # ingest: 導入假圖資料庫
+    graph_latencies: List[float] = []
+    graphiti = _TimedGraphiti(FakeGraphiti(config.graph_latency, error_rate=config.graph_error_rate, seed=config.seed), graph_latencies)
+    if config.ingest_mode == "structured":
+        # 每個Cypher查詢一次往返，延遲與 add_episode 相同
+        ingestor = StructuredIngestor(
+            graphiti,
+            driver=_TimedDriver(FakeGraphDriver(config.graph_latency), graph_latencies),
+            embedder=FakeEmbedder(latency=config.embed_latency),
+            batch_size=config.ingest_batch_size,
+            max_concurrency=config.concurrency,
+            retry_queue_path=None,
+        )
+    else:
+        ingestor = EpisodeIngestor(
+            graphiti,
+            batch_size=config.ingest_batch_size,
+            max_concurrency=config.concurrency,
+            use_bulk=config.ingest_bulk,
+            retry_queue_path=None,
+        )
+    with _Stage(StageReport("ingest")) as ingest:
+        asyncio.run(ingestor.ingest(results))
+        ingest.count = len(results) - len(ingestor.failed)
+        ingest.latencies = graph_latencies
+    stages.append(ingest)
+
+    # embed: 抽取文本經合併批次的embedder寫入本地向量庫
+    texts = list(dict.fromkeys(row[1] for res in results for row in res["records"]))[:config.embed_texts]
+    store = EmbeddingStore(os.path.join(work_dir, "embeddings"))
+    fake_embedder = FakeEmbedder(latency=config.embed_latency)
+    embedder = BatchingEmbedder(fake_embedder, store=store)
+    with _Stage(StageReport("embed")) as embed:
+        async def embed_all() -> None:
+            async def one(text: str) -> None:
+                t = time.perf_counter()
+                # 與graphiti相同的呼叫形式（edges.py、nodes.py、search.py 都傳入單一文本的列表）
+                await embedder.create(input_data=[text])
+                embed.latencies.append(time.perf_counter() - t)
+
+            await asyncio.gather(*(one(text) for text in texts))
+            await embedder.close()
+
+        asyncio.run(embed_all())
+        embed.count = len(texts)
+    stored = len(store)
+    store.close()
+    if texts and (fake_embedder.calls or stored != len(texts)):
+        raise RuntimeError(
+            f"embed階段沒有經過批次與向量庫：create {fake_embedder.calls} 次、"
+            f"create_batch {fake_embedder.batch_calls} 次、向量庫 {stored}/{len(texts)} 筆"
+        )
+    stages.append(embed)
+
+    # rerank: 重複的查詢由快取回應
+    rng = random.Random(config.seed)
+    reranker = CachedCrossEncoder(FakeCrossEncoder(latency=config.rerank_latency))
+    passages = texts[:50]
+    distinct = [f"{rng.choice(_WORDS)} {rng.choice(_WORDS)}" for _ in range(config.rerank_distinct)]
+    queries = [rng.choice(distinct) for _ in range(config.rerank_queries)]
+    with _Stage(StageReport("rerank")) as rerank:
+        async def rerank_all() -> None:
+            for query in queries:
+                t = time.perf_counter()
+                await reranker.rank(query, passages)
+                rerank.latencies.append(time.perf_counter() - t)
+
+        asyncio.run(rerank_all())
+        rerank.count = len(queries)
+    stages.append(rerank)
+
+    # query: 查詢agent的首字延遲（工具呼叫同時執行，回答逐詞串流），latencies 為每次的TTFT
+    from .fake_chat import FakeChatModel
+    from .query import QueryAgent, measure_ttft
+
+    searcher = FakeSearcher(latency=config.search_latency)
+    agent = QueryAgent(
+        llm=FakeChatModel(first_token_latency=config.chat_first_token_latency, token_latency=config.chat_token_latency),
+        searcher=searcher,
+    )
+    with _Stage(StageReport("query")) as query:
+        async def query_all() -> None:
+            for number in range(config.query_runs):
+                timing = await measure_ttft(agent, queries[number % len(queries)], thread_id=f"bench-{number % 4}")
+                query.latencies.append(timing["ttft_seconds"])
+
+        asyncio.run(query_all())
+        query.count = config.query_runs
+    stages.append(query)
+
+    end_to_end = None
+    if config.end_to_end:
+        # 實際的 langExtractor 路徑（含打包、切塊與正規化）
+        client = model_client()
+        started = time.perf_counter()
+        extracted = Extractor.langExtractor(
+            documents,
+            max_concurrency=config.concurrency,
+            client=client,
+            use_cache=False,
+            chunk_chars=config.chunk_chars,
+            pack_chars=config.pack_chars,
+            mode=config.mode,
+        )
+        seconds = time.perf_counter() - started
+        end_to_end = {
+            "count": len(extracted),
+            "seconds": round(seconds, 4),
+            "files_per_sec": round(len(extracted) / seconds, 2) if seconds > 0 else 0.0,
+            "model_calls": client.calls,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+    return stages, end_to_end
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """
+    以表格列出兩份報告各階段吞吐量與p99的變化
+
+    :param baseline: 先前的報告
+    :param current: 本次的報告
+    :return: 可直接印出的文字
+    """
+    lines = [f"{'stage':<10} {'per_sec':>22} {'p99_ms':>26}"]
+    for name, stage in current["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if old is None:
+            lines.append(f"{name:<10} {stage['per_sec']:>22} {stage['p99_ms']:>26}")
+            continue
+
+        def delta(key: str) -> str:
+            before, after = old[key], stage[key]
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            return f"{before} → {after} ({change})"
+
+        lines.append(f"{name:<10} {delta('per_sec'):>22} {delta('p99_ms'):>26}")
+    return "\n".join(lines)
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"{'stage':<10} {'count':>7} {'seconds':>9} {'per_sec':>10} {'p50_ms':>9} {'p99_ms':>9} {'rss_mb':>8}"]
+    for name, stage in report["stages"].items():
+        lines.append(
+            f"{name:<10} {stage['count']:>7} {stage['seconds']:>9} {stage['per_sec']:>10} "
+            f"{stage['p50_ms']:>9} {stage['p99_ms']:>9} {stage['peak_rss_mb']:>8}"
+        )
+    if report.get("end_to_end"):
+        e2e = report["end_to_end"]
+        lines.append(f"end_to_end: {e2e['count']} 個文件 {e2e['seconds']}s, {e2e['files_per_sec']} files/s, {e2e['model_calls']} 次模型呼叫")
+    return "\n".join(lines)
+
+
+def save_report(report: Dict[str, Any], path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from . import metrics
+
+# 正規化結果的格式版本，_normalize 輸出改變時需遞增
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_PATH = os.environ.get('EXTRACT_CACHE', 'KnowledgeBase/.cache/extractions.sqlite')
+# 快取內容總大小上限（位元組）與條目最長保存秒數，未設定時不淘汰
+DEFAULT_CACHE_MAX_BYTES = int(os.environ['EXTRACT_CACHE_MAX_BYTES']) if os.environ.get('EXTRACT_CACHE_MAX_BYTES') else None
+DEFAULT_CACHE_MAX_AGE = float(os.environ['EXTRACT_CACHE_MAX_AGE']) if os.environ.get('EXTRACT_CACHE_MAX_AGE') else None
+
+
+def content_hash(content: str) -> str:
+    """計算文件內容的sha256"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _canonical_example(example: Any) -> Dict:
+    return {
+        "text": getattr(example, "text", ""),
+        "extractions": [
+            {
+                "class": getattr(extraction, "extraction_class", ""),
+                "text": getattr(extraction, "extraction_text", ""),
+                "attributes": getattr(extraction, "attributes", None) or {},
+            }
+            for extraction in getattr(example, "extractions", None) or []
+        ],
+    }
+
+
+def extraction_fingerprint(prompt: str, examples: Sequence[Any], model_id: str) -> str:
+    """
+    計算prompt、範例與模型的指紋，任一改變都會使快取失效
+
+    :param prompt: 抽取prompt
+    :param examples: lx.data.ExampleData 列表
+    :param model_id: 模型名稱
+    :return: 十六進位指紋
+    """
+    payload = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "prompt": prompt,
+            "examples": [_canonical_example(example) for example in examples],
+            "model_id": model_id,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ExtractionCache:
+    """以SQLite保存的抽取結果快取，鍵為 (指紋, 內容雜湊)"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: Optional[int] = DEFAULT_CACHE_MAX_BYTES,
+        max_age: Optional[float] = DEFAULT_CACHE_MAX_AGE,
+    ):
+        """
+        :param path: SQLite檔案路徑
+        :param max_bytes: 快取內容總大小上限，超過時依最近存取時間淘汰，預設讀取 EXTRACT_CACHE_MAX_BYTES
+        :param max_age: 條目最長保存秒數，預設讀取 EXTRACT_CACHE_MAX_AGE
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extractions (
+                fingerprint TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (fingerprint, content_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_accessed ON extractions(accessed_at)")
+        self._conn.commit()
+
+    def get_many(self, fingerprint: str, hashes: Iterable[str]) -> Dict[str, Dict]:
+        """
+        批次查詢快取
+
+        :param fingerprint: extraction_fingerprint 的結果
+        :param hashes: 內容雜湊
+        :return: 命中的 {內容雜湊: 正規化結果}
+        """
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, Dict] = {}
+        now = time.time()
+        min_created = now - self.max_age if self.max_age else 0.0
+        with self._lock:
+            # SQLite的參數數量有上限，分批查詢
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT content_hash, payload FROM extractions "
+                    f"WHERE fingerprint = ? AND created_at >= ? AND content_hash IN ({placeholders})",
+                    [fingerprint, min_created, *chunk],
+                ).fetchall()
+                for key, payload in rows:
+                    found[key] = json.loads(payload)
+            if found:
+                self._conn.executemany(
+                    "UPDATE extractions SET accessed_at = ? WHERE fingerprint = ? AND content_hash = ?",
+                    [(now, fingerprint, key) for key in found],
+                )
+                self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(wanted) - len(found)
+        metrics.inc("extraction_cache_requests_total", len(found), result="hit")
+        metrics.inc("extraction_cache_requests_total", len(wanted) - len(found), result="miss")
+        return found
+
+    def get(self, fingerprint: str, key: str) -> Optional[Dict]:
+        return self.get_many(fingerprint, [key]).get(key)
+
+    def put_many(self, fingerprint: str, items: Dict[str, Dict]) -> None:
+        """
+        批次寫入快取
+
+        :param fingerprint: extraction_fingerprint 的結果
+        :param items: {內容雜湊: 正規化結果}
+        """
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            payload = json.dumps(value, ensure_ascii=False)
+            rows.append((fingerprint, key, payload, len(payload.encode('utf-8')), now, now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def put(self, fingerprint: str, key: str, value: Dict) -> None:
+        self.put_many(fingerprint, {key: value})
+
+    def evict(self) -> int:
+        """
+        依 max_age 與 max_bytes 淘汰條目
+
+        :return: 刪除的條目數
+        """
+        removed = 0
+        with self._lock:
+            if self.max_age:
+                cursor = self._conn.execute(
+                    "DELETE FROM extractions WHERE created_at < ?", (time.time() - self.max_age,)
+                )
+                removed += cursor.rowcount
+            if self.max_bytes:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+                if total > self.max_bytes:
+                    victims: List[tuple] = []
+                    for fingerprint, key, size in self._conn.execute(
+                        "SELECT fingerprint, content_hash, size FROM extractions ORDER BY accessed_at"
+                    ):
+                        if total <= self.max_bytes:
+                            break
+                        victims.append((fingerprint, key))
+                        total -= size
+                    self._conn.executemany(
+                        "DELETE FROM extractions WHERE fingerprint = ? AND content_hash = ?", victims
+                    )
+                    removed += len(victims)
+            self._conn.commit()
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,167 @@
+import copy
+import dataclasses
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+DEFAULT_CHUNK_CHARS = int(os.environ.get('EXTRACT_CHUNK_CHARS', 8000))
+DEFAULT_OVERLAP_LINES = int(os.environ.get('EXTRACT_CHUNK_OVERLAP', 5))
+
+# 頂層宣告：Python以縮排判斷，其餘語言以大括號深度判斷
+_PY_DECL = re.compile(r"^(?:async\s+def|def|class)\s|^@")
+_BRACE_DECL = re.compile(
+    r"^\s*(?:@\w+|(?:export\s+)?(?:default\s+)?(?:public|private|protected|internal|static|final|abstract|"
+    r"override|open|data|sealed|suspend|async|def|fun|function|class|interface|enum|object|record|void|const|let|var)\b)"
+)
+_STRING_OR_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//.*$|/\*.*?\*/', re.MULTILINE)
+
+
+@dataclass
+class Chunk:
+    """文件中的一段，start/end為原文的字符偏移"""
+
+    index: int
+    start: int
+    end: int
+    text: str
+
+
+def _line_offsets(lines: Sequence[str]) -> List[int]:
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+def _boundaries(lines: Sequence[str], python: bool) -> List[int]:
+    """找出可以切分的行號（頂層或類別內第一層的宣告）"""
+    boundaries = [0]
+    depth = 0
+    for number, line in enumerate(lines):
+        if python:
+            if number and _PY_DECL.match(line):
+                boundaries.append(number)
+            continue
+        if number and depth <= 1 and _BRACE_DECL.match(line):
+            boundaries.append(number)
+        code = _STRING_OR_COMMENT.sub("", line)
+        depth = max(0, depth + code.count("{") - code.count("}"))
+    # 裝飾器/註解與其宣告視為一體
+    merged = []
+    for number in boundaries:
+        if merged and number == merged[-1] + 1 and lines[merged[-1]].lstrip().startswith("@"):
+            continue
+        merged.append(number)
+    return merged
+
+
+def _windows(start_line: int, end_line: int, offsets: List[int], max_chars: int, overlap_lines: int) -> Iterable[Tuple[int, int]]:
+    """將過長的區段以行窗口切分，相鄰窗口重疊 overlap_lines 行"""
+    line = start_line
+    while line < end_line:
+        stop = line + 1
+        while stop < end_line and offsets[stop + 1] - offsets[line] <= max_chars:
+            stop += 1
+        yield line, stop
+        if stop >= end_line:
+            break
+        line = max(line + 1, stop - overlap_lines)
+
+
+def chunk_text(text: str, file_path: str = "", max_chars: int = DEFAULT_CHUNK_CHARS, overlap_lines: int = DEFAULT_OVERLAP_LINES) -> List[Chunk]:
+    """
+    依類別/函數邊界切分文本，無法切分的長區段退回重疊的行窗口
+
+    :param text: 文件內容
+    :param file_path: 文件路徑，用於判斷語言
+    :param max_chars: 每塊最大字符數
+    :param overlap_lines: 行窗口之間的重疊行數
+    :return: 依偏移排序的 Chunk 列表
+    """
+    if len(text) <= max_chars:
+        return [Chunk(0, 0, len(text), text)]
+
+    lines = text.splitlines(keepends=True)
+    offsets = _line_offsets(lines)
+    boundaries = _boundaries(lines, python=file_path.endswith(".py")) + [len(lines)]
+
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    for previous, boundary in zip(boundaries, boundaries[1:]):
+        # 貪婪地合併相鄰區段，直到超過上限
+        if offsets[boundary] - offsets[start] <= max_chars:
+            continue
+        if previous > start:
+            spans.append((start, previous))
+            start = previous
+        if offsets[boundary] - offsets[start] > max_chars:
+            spans.extend(_windows(start, boundary, offsets, max_chars, overlap_lines))
+            start = boundary
+    if start < len(lines):
+        spans.append((start, len(lines)))
+
+    return [
+        Chunk(index, offsets[first], offsets[last], text[offsets[first]:offsets[last]])
+        for index, (first, last) in enumerate(spans)
+    ]
+
+
+def split_document(doc: Dict, max_chars: int = DEFAULT_CHUNK_CHARS, overlap_lines: int = DEFAULT_OVERLAP_LINES) -> List[Dict]:
+    """
+    將文檔切成子文檔，每個子文檔帶有 parent_id 與 chunk_start
+
+    :param doc: DocumentCollector 產生的文檔
+    :return: 子文檔列表（小文件只有一個）
+    """
+    chunks = chunk_text(doc["text"], doc["document_id"], max_chars, overlap_lines)
+    return [
+        {
+            "text": chunk.text,
+            "document_id": f"{doc['document_id']}#{chunk.index}" if len(chunks) > 1 else doc["document_id"],
+            "parent_id": doc["document_id"],
+            "chunk_start": chunk.start,
+            "chunk_end": chunk.end,
+        }
+        for chunk in chunks
+    ]
+
+
+def _shift(extraction: Any, offset: int) -> Any:
+    """返回偏移換算回原文的副本，不修改呼叫端的物件"""
+    interval = getattr(extraction, "char_interval", None)
+    if offset and interval is not None and interval.start_pos is not None:
+        extraction = copy.copy(extraction)
+        extraction.char_interval = dataclasses.replace(
+            interval,
+            start_pos=interval.start_pos + offset,
+            end_pos=interval.end_pos + offset if interval.end_pos is not None else None,
+        )
+    return extraction
+
+
+def _start(extraction: Any) -> Any:
+    interval = getattr(extraction, "char_interval", None)
+    return interval.start_pos if interval is not None else None
+
+
+def merge_chunk_extractions(parts: Iterable[Tuple[int, Sequence[Any]]]) -> List[Any]:
+    """
+    合併各塊的抽取結果：偏移換算回原文，並去除重疊區造成的重複
+
+    重複以 (類別, 文本, 原文起始位置) 判斷，不同位置出現的相同抽取都會保留。
+
+    :param parts: (chunk_start, extractions) 序列
+    :return: 合併後的抽取列表（依塊順序）
+    """
+    merged = []
+    seen = set()
+    for offset, extractions in sorted(parts, key=lambda part: part[0]):
+        for extraction in extractions:
+            shifted = _shift(extraction, offset)
+            key = (shifted.extraction_class, shifted.extraction_text, _start(shifted))
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(shifted)
+    return merged
@@ -1,189 +1,467 @@
 import asyncio
-import datetime
-import json
 import os
-from datetime import datetime, timezone
-from pathlib import Path
+import sys
+from typing import Any, Optional
 
-from extractor import Extractor
+from . import metrics
+from .cache import ExtractionCache
+from .extractor import DOCS_PATH, EXTENSIONS, EXTRACT_MODE, DocumentCollector, Extractor, build_scheduler
+from .ingest import EpisodeIngestor, drain_retry_queue, enqueue_removal
+from .journal import open_journal
+from .manifest import IngestManifest, SyncPlan
+from .pipeline import PipelineStats, StreamingPipeline
+from .structured import INGEST_MODE, StructuredIngestor
+from .workqueue import coordinate
 
-from graphiti_core import Graphiti
-from graphiti_core.edges import EntityEdge
-from graphiti_core.nodes import EpisodeType
-from graphiti_core.search.search_config_recipes import \
-    NODE_HYBRID_SEARCH_EPISODE_MENTIONS, NODE_HYBRID_SEARCH_RRF
-from graphiti_core.utils.maintenance import clear_data
+neo4j_uri = os.environ.get('NEO4J_URI', 'bolt://localhost:7687')
+neo4j_user = os.environ.get('NEO4J_USER', 'neo4j') 
+neo4j_password = os.environ.get('NEO4J_PASSWORD', 'test1234')
 
-from graphiti_core.llm_client.gemini_client import GeminiClient, LLMConfig
-from graphiti_core.embedder.gemini import GeminiEmbedder, GeminiEmbedderConfig
-from graphiti_core.cross_encoder.gemini_reranker_client import GeminiRerankerClient
+# graphiti、Gemini客戶端與查詢快取在第一次使用時才建立，並在整個行程中共用
+_graphiti = None
+_embedder = None
+_search_cache = None
+_local_index = None
+_neighborhood = None
 
-from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-from langgraph.prebuilt import ToolNode
 
-import langextract as lx
+def get_graphiti():
+    """
+    取得共用的Graphiti實例（延遲建立，匯入本模組不會連線或載入graphiti_core）
 
-neo4j_uri = os.environ.get('NEO4J_URI', 'bolt://localhost:7687')
-neo4j_user = os.environ.get('NEO4J_USER', 'neo4j') 
-neo4j_password = os.environ.get('NEO4J_PASSWORD', 'test1234')
+    :return: Graphiti
+    """
+    global _graphiti, _embedder
+    if _graphiti is not None:
+        return _graphiti
 
-# Initialize Graphiti with proper configuration and LLM settings
-try:
-    # Ensure OpenAI environment variables are set for Graphiti
-
-    api_key = os.environ.get('GEMINI_API_KEY')
-    graphiti = Graphiti(
-        neo4j_uri, 
-        neo4j_user, 
-        neo4j_password,
-        llm_client=GeminiClient(
-            config=LLMConfig(
-                api_key=api_key,
-                model="gemini-2.5-flash"
-            )
-        ),
-        embedder=GeminiEmbedder(
-            config=GeminiEmbedderConfig(
-                api_key=api_key,
-                embedding_model="gemini-embedding-001"
-            )
-        ),
-        cross_encoder=GeminiRerankerClient(
-            config=LLMConfig(
-                api_key=api_key,
-                model="gemini-2.5-flash"
-            )
+    from graphiti_core import Graphiti
+    from graphiti_core.llm_client.gemini_client import GeminiClient, LLMConfig
+    from graphiti_core.embedder.gemini import GeminiEmbedder, GeminiEmbedderConfig
+    from graphiti_core.cross_encoder.gemini_reranker_client import GeminiRerankerClient
+
+    from .embedding_store import DEFAULT_EMBEDDING_STORE, BatchingEmbedder, EmbeddingStore
+    from .search_cache import CachedCrossEncoder, CachedEmbedder
+
+    # Initialize Graphiti with proper configuration and LLM settings
+    try:
+        api_key = os.environ.get('GEMINI_API_KEY')
+        # 合併批次請求並持久化到本地向量檔，關閉連線前需等待送出中的批次
+        _embedder = BatchingEmbedder(
+            GeminiEmbedder(
+                config=GeminiEmbedderConfig(
+                    api_key=api_key,
+                    embedding_model="gemini-embedding-001"
+                )
+            ),
+            store=EmbeddingStore(os.path.join(DEFAULT_EMBEDDING_STORE, "gemini-embedding-001")),
         )
-    )
-        # You can optionally specify LLM model here if needed
-    
-except Exception as e:
-    print(f"Error initializing Graphiti: {e}")
-    raise
+        _graphiti = Graphiti(
+            neo4j_uri, 
+            neo4j_user, 
+            neo4j_password,
+            llm_client=GeminiClient(
+                config=LLMConfig(
+                    api_key=api_key,
+                    model="gemini-2.5-flash"
+                )
+            ),
+            # 查詢向量走記憶體LRU，其餘向量交給 _embedder
+            embedder=CachedEmbedder(_embedder),
+            cross_encoder=CachedCrossEncoder(GeminiRerankerClient(
+                config=LLMConfig(
+                    api_key=api_key,
+                    model="gemini-2.5-flash"
+                )
+            ))
+        )
+    except Exception as e:
+        print(f"Error initializing Graphiti: {e}")
+        raise
+    return _graphiti
+
+
+def get_search_cache():
+    """
+    取得共用的查詢結果快取，導入或移除episode後失效
+
+    :return: SearchCache
+    """
+    global _search_cache
+    if _search_cache is None:
+        from .search_cache import SearchCache
+        _search_cache = SearchCache()
+    return _search_cache
+
+
+def invalidate_search_cache() -> None:
+    # 尚未建立快取時不需要（也不應該為此載入graphiti_core）
+    if _search_cache is not None:
+        _search_cache.invalidate()
+
+
+def get_local_index():
+    """
+    取得行程內的本地搜尋索引（第一次使用時從 LOCAL_SEARCH_INDEX 載入）
+
+    :return: LocalSearchIndex，尚未建立過索引時為None
+    """
+    global _local_index
+    if _local_index is None:
+        from .local_search import LocalSearchIndex
+        _local_index = LocalSearchIndex.load()
+    return _local_index
+
+
+def update_local_index(results: list = (), removed: list = ()) -> None:
+    """
+    以新的抽取結果更新本地搜尋索引並寫回磁碟
 
-langextract_results = Extractor.langExtractor()
+    :param results: 新增或修改文件的結果
+    :param removed: 已刪除的文件ID
+    """
+    global _local_index
+    from .local_search import LocalSearchIndex
 
-async def main():
+    index = get_local_index() or LocalSearchIndex([])
+    _local_index = index.updated(results, removed)
+    _local_index.save()
+
+
+def local_search(query: str, limit: int = 10) -> Any:
+    """
+    先查本地索引，結果有信心時直接回傳，不需要連線
+
+    :param query: 查詢文本
+    :param limit: 結果數量
+    :return: LocalSearchResult；本地索引停用、不存在或信心不足時為None，應改查Graphiti
+    """
+    from .local_search import LOCAL_SEARCH_ENABLED
+
+    if not LOCAL_SEARCH_ENABLED:
+        return None
+    index = get_local_index()
+    if index is None:
+        return None
+    result = index.search(query, limit)
+    return result if result.confident else None
+
+
+async def get_neighborhood_index() -> Any:
+    """
+    取得行程內的鄰接索引（第一次使用或episode被移除後從Neo4j重新載入）
+
+    :return: NeighborhoodIndex
+    """
+    global _neighborhood
+    if _neighborhood is None or _neighborhood.stale:
+        from .neighborhood import NeighborhoodIndex
+        _neighborhood = await NeighborhoodIndex.load(get_graphiti().driver)
+    return _neighborhood
+
+
+def update_neighborhood(edges: list) -> None:
+    # 尚未載入時不需要：第一次使用時會讀到包含這些邊的完整圖
+    if _neighborhood is not None:
+        _neighborhood.add_edges(edges)
+
+
+async def close_graphiti() -> None:
+    """關閉已建立的Graphiti連線"""
+    global _graphiti, _embedder
+    if _embedder is not None:
+        await _embedder.close()
+        _embedder.store.close()
+        _embedder = None
+    if _graphiti is not None:
+        await _graphiti.close()
+        _graphiti = None
+        print('\nConnection closed')
+
+
+async def remove_file_episode(episode_uuid: str) -> None:
+    """
+    移除episode；失敗時拋出，由呼叫端保留清單記錄或加入重試佇列
+
+    :param episode_uuid: 待移除的episode
+    """
     try:
-        # await clear_data(graphiti.driver)
-        await graphiti.build_indices_and_constraints()
-
-        for res in langextract_results:
-            # for i, data in enumerate(res["metadata"]):
-                # Create a proper episode body with extracted code knowledge
-            episode_body = {
-                "file_id": f"{res['id']}",
-                "code_with_comment": res["metadata"].get("code_with_comment", "")
-                if res["metadata"].get("code_with_comment", "") else "unknown",
-                "import_statement": res["metadata"].get("import_statement", "unknown"),
-                "jira_field": res["metadata"].get("jira_field", "unknown"), 
-                "function_name": res["metadata"].get("function_name", "unknown")
-            }
-            
-            await graphiti.add_episode(
-                name=f"{res['id']}",
-                episode_body=json.dumps(res["metadata"], ensure_ascii=False),
-                source_description="Code Knowledge Extraction",
-                source=EpisodeType.text,
-                reference_time=datetime.now(timezone.utc),
-            )
+        await get_graphiti().remove_episode(episode_uuid)
+    finally:
+        # 失敗時可能已刪除部分節點與邊
+        invalidate_search_cache()
+        if _neighborhood is not None:
+            _neighborhood.stale = True
 
-        #################################################
-        # BASIC SEARCH
-        #################################################
-        # The simplest way to retrieve relationships (edges)
-        # from Graphiti is using the search method, which
-        # performs a hybrid search combining semantic
-        # similarity and BM25 text retrieval.
-        #################################################
 
-        # Perform a hybrid search combining semantic similarity and BM25 retrieval
-        results = await graphiti.search('Who was the California Attorney General?')
+def make_ingestor(ingest_mode: str = INGEST_MODE) -> EpisodeIngestor:
+    """
+    :param ingest_mode: episode 交給 graphiti.add_episode；structured 以批次Cypher直接寫入節點與邊
+    :return: 導入器
+    """
+    if ingest_mode == "structured":
+        return StructuredIngestor(
+            get_graphiti(),
+            batch_size=int(os.environ.get('INGEST_BATCH_SIZE', 200)),
+            max_concurrency=int(os.environ.get('INGEST_CONCURRENCY', 4)),
+            on_edges=update_neighborhood,
+        )
+    return EpisodeIngestor(
+        get_graphiti(),
+        batch_size=int(os.environ.get('INGEST_BATCH_SIZE', 20)),
+        max_concurrency=int(os.environ.get('INGEST_CONCURRENCY', 4)),
+        use_bulk=os.environ.get('INGEST_BULK', '') == '1',
+        on_edges=update_neighborhood,
+    )
 
-        # Print search results
-        print('\nSearch Results:')
-        for result in results:
-            print(f'UUID: {result.uuid}')
-            print(f'Fact: {result.fact}')
-            if hasattr(result, 'valid_at') and result.valid_at:
-                print(f'Valid from: {result.valid_at}')
-            if hasattr(result, 'invalid_at') and result.invalid_at:
-                print(f'Valid until: {result.invalid_at}')
-            print('---')
 
-        #################################################
-        # CENTER NODE SEARCH
-        #################################################
-        # For more contextually relevant results, you can
-        # use a center node to rerank search results based
-        # on their graph distance to a specific node
-        #################################################
+def on_ingested_for(manifest: IngestManifest):
+    """建立更新清單並取代舊episode的回呼"""
+    async def on_ingested(res: dict, episode_uuid: str) -> None:
+        invalidate_search_cache()
+        previous = manifest.get(res['id'])
+        manifest.record(res['id'], res['content_hash'], episode_uuid, res['mtime'])
+        # 新episode寫入後再移除舊版本，取代而非重複；移除失敗時留待下次導入重試，不遺失舊UUID
+        if previous is not None and previous.episode_uuid != episode_uuid:
+            try:
+                await remove_file_episode(previous.episode_uuid)
+            except Exception as e:
+                enqueue_removal(previous.episode_uuid, e)
+
+    return on_ingested
+
+
+async def ingest_results(results: list, manifest: IngestManifest, ingest_mode: str = INGEST_MODE) -> None:
+    """
+    批次導入抽取結果並更新清單，已有舊版本的文件會被新episode取代
+
+    :param results: langExtractor 的結果
+    :param manifest: 導入清單
+    :param ingest_mode: 導入方式（episode / structured）
+    """
+    await make_ingestor(ingest_mode).ingest(results, on_ingested=on_ingested_for(manifest))
+    update_local_index(results)
+
+
+async def stream_episodes(
+    manifest: IngestManifest,
+    mode: str = EXTRACT_MODE,
+    docs_path: str = DOCS_PATH,
+    ingest_mode: str = INGEST_MODE,
+) -> PipelineStats:
+    """
+    串流模式：文件邊讀取邊抽取，每個結果完成後立即導入
 
-        # Use the top search result's UUID as the center node for reranking
-        if results and len(results) > 0:
-            # Get the source node UUID from the top result
-            center_node_uuid = results[0].source_node_uuid
-
-            print('\nReranking search results based on graph distance:')
-            print(f'Using center node UUID: {center_node_uuid}')
-
-            reranked_results = await graphiti.search(
-                'Who was the California Attorney General?', center_node_uuid=center_node_uuid
-            )
-
-            # Print reranked search results
-            print('\nReranked Search Results:')
-            for result in reranked_results:
-                print(f'UUID: {result.uuid}')
-                print(f'Fact: {result.fact}')
-                if hasattr(result, 'valid_at') and result.valid_at:
-                    print(f'Valid from: {result.valid_at}')
-                if hasattr(result, 'invalid_at') and result.invalid_at:
-                    print(f'Valid until: {result.invalid_at}')
-                print('---')
+    :param manifest: 導入清單
+    :param mode: 抽取模式（llm / hybrid / static）
+    :param docs_path: 文件根目錄
+    :param ingest_mode: 導入方式（episode / structured）
+    :return: 管線統計
+    """
+    ingestor = make_ingestor(ingest_mode)
+    on_ingested = on_ingested_for(manifest)
+    ingested = []
+
+    async def sink(res: dict) -> None:
+        await ingestor.ingest_one(res, on_ingested)
+        # 原始碼內容不需要保留到最後
+        ingested.append({'id': res['id'], 'records': res.get('records', [])})
+
+    cache = ExtractionCache()
+    pipeline = StreamingPipeline(
+        DocumentCollector(docs_path, EXTENSIONS),
+        build_scheduler(mode=mode),
+        cache=cache,
+        mode=mode,
+    )
+    stats = await pipeline.run(sink, sink_workers=ingestor.max_concurrency)
+    # 依 EXTRACT_CACHE_MAX_BYTES / EXTRACT_CACHE_MAX_AGE 淘汰，與批次抽取相同
+    cache.evict()
+    update_local_index(ingested)
+    print(f"🌊 串流完成: {stats}")
+    return stats
+
+
+async def sync_episodes(
+    manifest: IngestManifest,
+    mode: str = EXTRACT_MODE,
+    docs_path: str = DOCS_PATH,
+    resume: bool = False,
+    workers: int = 0,
+    ingest_mode: str = INGEST_MODE,
+) -> SyncPlan:
+    """
+    增量同步：只抽取並導入新增或修改的文件，並移除已刪除文件的episode
+
+    :param manifest: 導入清單
+    :param mode: 抽取模式（llm / hybrid / static）
+    :param docs_path: 文件根目錄
+    :param resume: 略過抽取日誌中上次已完成的文件
+    :param workers: 大於0時以多個worker行程分片抽取
+    :param ingest_mode: 導入方式（episode / structured）
+    :return: 本次同步的計畫
+    """
+    documents = DocumentCollector(docs_path, EXTENSIONS).collect_documents()
+    plan = manifest.plan(documents)
+    print(f"🔄 同步計畫: {plan.summary()}")
+
+    if plan.changed:
+        if workers:
+            paths = [doc['document_id'] for doc in plan.changed]
+            results = coordinate(docs_path, workers, mode, paths=paths, resume=resume)
         else:
-            print('No results found in the initial search to use as center node.')
+            with open_journal(resume) as journal:
+                results = Extractor.langExtractor(documents=plan.changed, mode=mode, journal=journal)
+        await ingest_results(results, manifest, ingest_mode)
 
-        #################################################
-        # NODE SEARCH USING SEARCH RECIPES
-        #################################################
-        # Graphiti provides predefined search recipes
-        # optimized for different search scenarios.
-        # Here we use NODE_HYBRID_SEARCH_RRF for retrieving
-        # nodes directly instead of edges.
-        #################################################
+    for entry in plan.deleted:
+        try:
+            await remove_file_episode(entry.episode_uuid)
+        except Exception as e:
+            # 保留清單記錄，下次同步時仍會列為已刪除並重試
+            print(f"⚠️ 移除episode {entry.episode_uuid} 失敗: {e}")
+            continue
+        manifest.remove(entry.path)
+    if plan.deleted:
+        update_local_index(removed=[entry.path for entry in plan.deleted])
 
-        # Example: Perform a node search using _search method with standard recipes
-        print(
-            '\nPerforming node search using _search method with standard recipe NODE_HYBRID_SEARCH_RRF:'
-        )
+    return plan
+
+
+def print_edges(results: Any) -> None:
+    for result in results:
+        print(f'UUID: {result.uuid}')
+        print(f'Fact: {result.fact}')
+        if hasattr(result, 'valid_at') and result.valid_at:
+            print(f'Valid from: {result.valid_at}')
+        if hasattr(result, 'invalid_at') and result.invalid_at:
+            print(f'Valid until: {result.invalid_at}')
+        print('---')
+
+
+def print_nodes(nodes: Any) -> None:
+    for node in nodes:
+        print(f'Node UUID: {node.uuid}')
+        print(f'Node Name: {node.name}')
+        node_summary = node.summary[:100] + '...' if len(node.summary) > 100 else node.summary
+        print(f'Content Summary: {node_summary}')
+        print(f'Node Labels: {", ".join(node.labels)}')
+        print(f'Created At: {node.created_at}')
+        if hasattr(node, 'attributes') and node.attributes:
+            print('Attributes:')
+            for key, value in node.attributes.items():
+                print(f'  {key}: {value}')
+        print('---')
 
-        # Use a predefined search configuration recipe and modify its limit
-        node_search_config = NODE_HYBRID_SEARCH_RRF.model_copy(deep=True)
-        node_search_config.limit = 3
 
-        # Execute the node search
-        node_search_results = await graphiti._search(
-            query='call the manager for customField',
-            config=node_search_config,
+def print_local_hits(hits: Any) -> None:
+    for hit in hits:
+        print(f'[{hit.extraction_class}] {hit.text}')
+        for key, value in hit.attributes.items():
+            if key != 'file_path':
+                print(f'  {key}: {value}')
+        print(f'Files: {", ".join(hit.documents)}')
+        print(f'Score: {hit.score:.3f}')
+        print('---')
+
+
+async def search_edges(query: str, center_node_uuid: Optional[str] = None, num_results: int = 10) -> Any:
+    """
+    混合搜尋（語意相似度 + BM25）關係邊，可選擇依與中心節點的圖距離重排序
+
+    :param query: 查詢文本
+    :param center_node_uuid: 中心節點
+    :param num_results: 結果數量
+    :return: EntityEdge 列表
+    """
+    from .neighborhood import NEIGHBORHOOD_ENABLED
+
+    if center_node_uuid is None or not NEIGHBORHOOD_ENABLED:
+        return await get_search_cache().search(
+            get_graphiti(), query, center_node_uuid=center_node_uuid, num_results=num_results
         )
+    # 候選與不指定中心時相同（不同中心共用快取），圖距離重排序在本地完成，不需要每次查詢都遍歷Neo4j
+    candidates = await get_search_cache().search(get_graphiti(), query, num_results=2 * num_results)
+    index = await get_neighborhood_index()
+    return index.rerank_edges(candidates, center_node_uuid, num_results)
+
 
-        # Print node search results
-        print('\nNode Search Results:')
-        for node in node_search_results.nodes:
-            print(f'Node UUID: {node.uuid}')
-            print(f'Node Name: {node.name}')
-            node_summary = node.summary[:100] + '...' if len(node.summary) > 100 else node.summary
-            print(f'Content Summary: {node_summary}')
-            print(f'Node Labels: {", ".join(node.labels)}')
-            print(f'Created At: {node.created_at}')
-            if hasattr(node, 'attributes') and node.attributes:
-                print('Attributes:')
-                for key, value in node.attributes.items():
-                    print(f'  {key}: {value}')
-            print('---')
+async def search_nodes(query: str, limit: int = 3) -> Any:
+    """
+    以 NODE_HYBRID_SEARCH_RRF 直接搜尋節點
 
+    :param query: 查詢文本
+    :param limit: 結果數量
+    :return: 節點列表
+    """
+    from graphiti_core.search.search_config_recipes import NODE_HYBRID_SEARCH_RRF
+
+    # Use a predefined search configuration recipe and modify its limit
+    node_search_config = NODE_HYBRID_SEARCH_RRF.model_copy(deep=True)
+    node_search_config.limit = limit
+    results = await get_search_cache().search_(get_graphiti(), query=query, config=node_search_config)
+    return results.nodes
+
+
+async def ingest(
+    manifest: IngestManifest,
+    sync: bool = False,
+    stream: bool = False,
+    mode: str = EXTRACT_MODE,
+    docs_path: str = DOCS_PATH,
+    resume: bool = False,
+    workers: int = 0,
+    ingest_mode: str = INGEST_MODE,
+    results_path: Optional[str] = None,
+) -> None:
+    """
+    建立索引、重試上次失敗的episode，再以指定方式抽取並導入
+
+    :param manifest: 導入清單
+    :param sync: 增量同步
+    :param stream: 串流模式
+    :param mode: 抽取模式（llm / hybrid / static）
+    :param docs_path: 文件根目錄
+    :param resume: 續跑上次中斷的抽取（串流模式以抽取快取續跑）
+    :param workers: 大於0時以多個worker行程分片抽取（不適用於串流模式）
+    :param ingest_mode: 導入方式（episode / structured）
+    :param results_path: extract --output 寫出的結果（.seg 或 JSONL），指定時直接導入而不抽取
+    """
+    # from graphiti_core.utils.maintenance import clear_data
+    # await clear_data(get_graphiti().driver)
+    await get_graphiti().build_indices_and_constraints()
+
+    # 先處理上次失敗的episode與未能移除的舊版本
+    retries, removals = drain_retry_queue()
+    for episode_uuid in removals:
+        try:
+            await remove_file_episode(episode_uuid)
+        except Exception as e:
+            enqueue_removal(episode_uuid, e)
+    if retries:
+        print(f"🔁 重試 {len(retries)} 個失敗的episode")
+        await ingest_results(retries, manifest, ingest_mode)
+
+    if results_path:
+        from .segment import load_results
+        await ingest_results(list(load_results(results_path)), manifest, ingest_mode)
+    elif sync:
+        await sync_episodes(manifest, mode, docs_path, resume, workers, ingest_mode)
+    elif stream:
+        await stream_episodes(manifest, mode, docs_path, ingest_mode)
+    elif workers:
+        await ingest_results(coordinate(docs_path, workers, mode, resume=resume), manifest, ingest_mode)
+    else:
+        documents = DocumentCollector(docs_path, EXTENSIONS).collect_documents()
+        with open_journal(resume) as journal:
+            results = Extractor.langExtractor(documents, mode=mode, journal=journal)
+        await ingest_results(results, manifest, ingest_mode)
+
+
+async def main(sync: bool = False, stream: bool = False, mode: str = EXTRACT_MODE, resume: bool = False):
+    manifest = IngestManifest()
+    try:
+        await ingest(manifest, sync=sync, stream=stream, mode=mode, resume=resume)
     finally:
         #################################################
         # CLEANUP
@@ -193,9 +471,19 @@ async def main():
         #################################################
 
         # Close the connection
-        await graphiti.close()
-        print('\nConnection closed')
+        manifest.close()
+        await close_graphiti()
+        # AGENTS_METRICS=1 時寫出到 AGENTS_METRICS_FILE
+        metrics.write()
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    args = sys.argv[1:]
+    asyncio.run(main(
+        sync='--sync' in args,
+        stream='--stream' in args,
+        # --static-only: 不呼叫LLM，只以靜態分析抽取import、Jira欄位與函數名
+        mode='static' if '--static-only' in args else EXTRACT_MODE,
+        # --resume: 略過抽取日誌中上次已完成的文件
+        resume='--resume' in args,
+    ))
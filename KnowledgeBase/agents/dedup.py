@@ -0,0 +1,161 @@
+import copy
+import dataclasses
+import os
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .static_extractor import static_extract
+
+# MinHash估計的Jaccard相似度達到此值視為近似重複，0表示不去重
+DEFAULT_DEDUP_THRESHOLD = float(os.environ.get('EXTRACT_DEDUP_THRESHOLD', 0.9))
+NUM_PERM = 128
+SHINGLE_CHARS = 8
+# 一次與所有排列相乘的shingle數，限制中間矩陣大小（NUM_PERM × 此值 × 8位元組）
+_BLOCK = 8192
+_WHITESPACE_RE = re.compile(rb"\s+")
+_SEED = 1729
+
+_rng = np.random.default_rng(_SEED)
+# multiply-shift雜湊族：(a·x + b) >> 32，a 為奇數
+_A = _rng.integers(1, 2 ** 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+_EMPTY = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+
+
+def shingle_hashes(text: str, k: int = SHINGLE_CHARS) -> np.ndarray:
+    """
+    以NumPy向量化計算空白正規化後的k字元（位元組）shingle雜湊
+
+    :param text: 文件內容
+    :param k: shingle長度
+    :return: 去重後的uint64雜湊陣列
+    """
+    data = _WHITESPACE_RE.sub(b" ", text.encode("utf-8")).strip()
+    values = np.frombuffer(data, dtype=np.uint8).astype(np.uint64)
+    if len(values) < k:
+        k = max(1, len(values))
+    count = len(values) - k + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    hashes = np.zeros(count, dtype=np.uint64)
+    prime = np.uint64(1099511628211)
+    # 多項式雜湊：迴圈只跑k次，每次處理所有位置（溢位即 mod 2^64）
+    for offset in range(k):
+        hashes = hashes * prime + values[offset:offset + count]
+    return np.unique(hashes)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    :param text: 文件內容
+    :return: 長度 NUM_PERM 的MinHash簽名
+    """
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return _EMPTY >> np.uint64(32)
+    signature = _EMPTY.copy()
+    buffer = np.empty((NUM_PERM, min(len(hashes), _BLOCK)), dtype=np.uint64)
+    for start in range(0, len(hashes), _BLOCK):
+        block = hashes[start:start + _BLOCK]
+        permuted = buffer[:, :len(block)]
+        # 原地運算避免暫存矩陣；右移是單調的，可以先取最小值再移位
+        np.multiply(_A[:, None], block[None, :], out=permuted)
+        permuted += _B[:, None]
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature >> np.uint64(32)
+
+
+def lsh_params(threshold: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """
+    選擇分帶數與每帶列數，使S曲線的轉折點 (1/b)^(1/r) 最接近門檻
+
+    :return: (bands, rows)
+    """
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+def near_duplicate_clusters(docs: Sequence[Dict], threshold: float = DEFAULT_DEDUP_THRESHOLD) -> Dict[str, List[str]]:
+    """
+    以MinHash/LSH找出近似重複的文件群組，時間與文件總長度成線性
+
+    依文件順序做leader分群：LSH分桶找出與已有代表同桶的候選，以簽名估計的Jaccard相似度確認，
+    加入相似度最高且達到門檻的代表所在的群組，否則自成代表。成員只會加入與自己直接相似的代表，
+    A~B、B~C 不會讓相似度不足的 A、C 落在同一群組。
+
+    :param docs: 含 document_id 與 text 的文檔
+    :param threshold: Jaccard相似度門檻
+    :return: {代表文件ID: [其他成員ID]}，代表為群組中順序最前的文件；只包含有成員的群組
+    """
+    if threshold <= 0 or len(docs) < 2:
+        return {}
+    signatures = np.stack([minhash_signature(doc["text"]) for doc in docs])
+    bands, rows = lsh_params(threshold)
+
+    # 每個band只登記代表，成員不再作為其他文件的比較對象
+    leader_buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+    clusters: Dict[str, List[str]] = {}
+    for index, doc in enumerate(docs):
+        keys = [signatures[index, band * rows:(band + 1) * rows].tobytes() for band in range(bands)]
+        candidates = sorted({leader for band, key in enumerate(keys) for leader in leader_buckets[band].get(key, ())})
+        if candidates:
+            similarities = np.mean(signatures[candidates] == signatures[index], axis=1)
+            # 相似度相同時 argmax 取順序最前的代表
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                clusters.setdefault(docs[candidates[best]]["document_id"], []).append(doc["document_id"])
+                continue
+        for band, key in enumerate(keys):
+            leader_buckets[band][key].append(index)
+    return clusters
+
+
+def adapt_extractions(extractions: Sequence[Any], source: Dict, target: Dict) -> List[Any]:
+    """
+    將代表文件的抽取結果套用到近似重複的成員
+
+    - 代表文件的抽取在成員中找得到原文時保留，偏移改為成員中的位置，file_path 改為成員路徑
+    - 找不到原文的抽取（兩者的差異部分）捨棄
+    - 成員獨有的import、Jira欄位與函數名以靜態分析補上
+
+    :param extractions: 代表文件的抽取結果（不會被修改）
+    :param source: 代表文件
+    :param target: 成員文件
+    :return: 成員的抽取列表
+    """
+    text = target["text"]
+    adapted = []
+    seen = set()
+    for extraction in extractions:
+        position = text.find(extraction.extraction_text)
+        if position < 0:
+            continue
+        clone = copy.copy(extraction)
+        interval = getattr(extraction, "char_interval", None)
+        if interval is not None:
+            clone.char_interval = dataclasses.replace(
+                interval, start_pos=position, end_pos=position + len(extraction.extraction_text)
+            )
+        attributes = getattr(extraction, "attributes", None)
+        if attributes and "file_path" in attributes:
+            clone.attributes = {**attributes, "file_path": target["document_id"]}
+        adapted.append(clone)
+        seen.add((extraction.extraction_class, extraction.extraction_text))
+
+    source_static = {(e.extraction_class, e.extraction_text) for e in static_extract(source["text"], source["document_id"])}
+    for extraction in static_extract(text, target["document_id"]):
+        key = (extraction.extraction_class, extraction.extraction_text)
+        if key not in source_static and key not in seen:
+            adapted.append(extraction)
+    return adapted
@@ -0,0 +1,159 @@
+import fnmatch
+import mmap
+import os
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from . import metrics
+
+# 預設略過的第三方與建置產物目錄
+DEFAULT_IGNORED_DIRS = frozenset({
+    ".git", ".hg", ".svn", ".idea", ".vscode", ".gradle", ".mvn", ".venv", "venv",
+    "__pycache__", "node_modules", "vendor", "build", "dist", "target", "out", ".next", ".cache",
+})
+DEFAULT_MAX_FILE_SIZE = int(os.environ.get('COLLECT_MAX_FILE_SIZE', 2 * 1024 * 1024))
+# 超過此大小的文件以mmap讀取，避免額外的緩衝區複製
+MMAP_THRESHOLD = 256 * 1024
+ENCODINGS = ("utf-8", "gbk")
+
+
+class IgnoreRules:
+    """
+    .gitignore 規則的精簡實作：支援萬用字元、目錄規則（結尾/）與錨定規則（含/）
+
+    不支援 ! 反向規則。
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]] = ()):
+        # (規則所在目錄的相對路徑, 規則)
+        self._patterns: List[Tuple[str, str, bool, bool]] = []
+        for base, pattern in patterns:
+            self.add(base, pattern)
+
+    def add(self, base: str, pattern: str) -> None:
+        pattern = pattern.strip()
+        if not pattern or pattern.startswith(("#", "!")):
+            return
+        dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        self._patterns.append((base, pattern.lstrip("/"), dir_only, anchored))
+
+    def load(self, directory: str, base: str) -> None:
+        """讀取目錄中的 .gitignore（若存在）"""
+        try:
+            with open(os.path.join(directory, ".gitignore"), "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    self.add(base, line)
+        except OSError:
+            pass
+
+    def matches(self, relative_path: str, is_dir: bool) -> bool:
+        name = relative_path.rsplit("/", 1)[-1]
+        for base, pattern, dir_only, anchored in self._patterns:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not relative_path.startswith(base + "/"):
+                    continue
+                local = relative_path[len(base) + 1:]
+            else:
+                local = relative_path
+            if fnmatch.fnmatchcase(local if anchored else name, pattern):
+                return True
+        return False
+
+
+def normalize_suffixes(extensions: Iterable[str]) -> Set[str]:
+    """將副檔名統一為帶點的小寫形式（"tsx" 與 ".tsx" 等價）"""
+    return {(ext if ext.startswith(".") else f".{ext}").lower() for ext in extensions}
+
+
+def scan_files(
+    root: str,
+    suffixes: Set[str],
+    ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS,
+    max_file_size: Optional[int] = DEFAULT_MAX_FILE_SIZE,
+    use_gitignore: bool = True,
+) -> Iterator[str]:
+    """
+    以 os.scandir 走訪目錄，依副檔名集合、忽略規則與大小上限篩選
+
+    :param root: 根目錄
+    :param suffixes: normalize_suffixes 的結果
+    :param ignored_dirs: 直接略過的目錄名
+    :param max_file_size: 文件大小上限（位元組），None表示不限
+    :param use_gitignore: 是否套用各層 .gitignore
+    :return: 文件路徑的迭代器（目錄內依名稱排序，結果穩定）
+    """
+    ignored_dirs = frozenset(ignored_dirs)
+    rules = IgnoreRules()
+    stack = [(root, "")]
+    while stack:
+        directory, relative = stack.pop()
+        if use_gitignore:
+            rules.load(directory, relative)
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name not in ignored_dirs and not rules.matches(entry_relative, True):
+                    subdirs.append((entry.path, entry_relative))
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in suffixes:
+                continue
+            if rules.matches(entry_relative, False):
+                continue
+            if max_file_size is not None:
+                try:
+                    if entry.stat().st_size > max_file_size:
+                        continue
+                except OSError:
+                    continue
+            yield entry.path
+        # 反向壓入以維持字母順序的深度優先走訪
+        stack.extend(reversed(subdirs))
+
+
+def decode_bytes(data) -> Tuple[str, str]:
+    """
+    依序嘗試 ENCODINGS 解碼同一份位元組
+
+    :param data: bytes 或任何支援buffer協定的物件
+    :return: (文本, 使用的編碼)
+    :raises UnicodeDecodeError: 所有編碼都失敗時
+    """
+    error: Optional[UnicodeDecodeError] = None
+    for encoding in ENCODINGS:
+        try:
+            return str(data, encoding), encoding
+        except UnicodeDecodeError as e:
+            error = e
+    raise error
+
+
+def read_text(file_path: str) -> Tuple[str, str]:
+    """
+    讀取文件一次並解碼，大文件使用mmap
+
+    :param file_path: 文件路徑
+    :return: (文本, 使用的編碼)
+    """
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                text, encoding = decode_bytes(mapped)
+        else:
+            text, encoding = decode_bytes(f.read())
+    metrics.inc("bytes_decoded_total", size, encoding=encoding)
+    return text, encoding
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+from graphiti_core.embedder.client import EmbedderClient
+
+DEFAULT_EMBEDDING_STORE = os.environ.get('EMBEDDING_STORE', 'KnowledgeBase/.cache/embeddings')
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    以記憶體映射的float32矩陣保存向量，SQLite只保存 文本雜湊 → 列號
+
+    向量檔依需要倍增擴充；讀取直接來自映射頁面，不經過網路。
+    """
+
+    def __init__(self, directory: str = DEFAULT_EMBEDDING_STORE, initial_capacity: int = 1024):
+        """
+        :param directory: 存放 vectors.f32 與 index.sqlite 的目錄（每個嵌入模型一個目錄）
+        :param initial_capacity: 首次建立時預留的列數
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self._vectors_path = os.path.join(directory, 'vectors.f32')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.commit()
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        self.dim: Optional[int] = meta.get('dim')
+        self._rows: Dict[str, int] = dict(self._conn.execute("SELECT key, row FROM rows").fetchall())
+        self._matrix: Optional[np.memmap] = None
+        if self.dim:
+            self._map(max(self._capacity_on_disk(), 1))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, text: str) -> bool:
+        return text_key(text) in self._rows
+
+    def _capacity_on_disk(self) -> int:
+        if not self.dim or not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (4 * self.dim)
+
+    def _map(self, capacity: int) -> None:
+        if self._matrix is not None:
+            self._matrix.flush()
+        size = capacity * self.dim * 4
+        with open(self._vectors_path, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        查詢向量
+
+        :param texts: 文本列表
+        :return: 與輸入對應的向量（未命中為None）
+        """
+        with self._lock:
+            rows = [self._rows.get(text_key(text)) for text in texts]
+            return [np.array(self._matrix[row]) if row is not None else None for row in rows]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """
+        寫入向量，已存在的文本會被略過
+
+        :param texts: 文本列表
+        :param vectors: 對應的向量
+        """
+        with self._lock:
+            new = {}
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                if key not in self._rows and key not in new:
+                    new[key] = vector
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = len(next(iter(new.values())))
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (self.dim,))
+                self._map(self.initial_capacity)
+            needed = len(self._rows) + len(new)
+            capacity = self._matrix.shape[0]
+            if needed > capacity:
+                while capacity < needed:
+                    capacity *= 2
+                self._map(capacity)
+
+            inserted = []
+            for key, vector in new.items():
+                row = len(self._rows)
+                self._matrix[row] = np.asarray(vector, dtype=np.float32)
+                self._rows[key] = row
+                inserted.append((key, row))
+            self._matrix.flush()
+            self._conn.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?)", inserted)
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._conn.close()
+
+
+class BatchingEmbedder(EmbedderClient):
+    """
+    合併短時間窗口內的並行 create() 呼叫為一次 create_batch()，
+    並以 EmbeddingStore 直接回應已嵌入過的文本
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        store: Optional[EmbeddingStore] = None,
+        window: float = 0.01,
+        max_batch: int = 100,
+    ):
+        """
+        :param embedder: 實際的Graphiti embedder（如 GeminiEmbedder）
+        :param store: 持久化向量庫，None表示不持久化
+        :param window: 等待更多請求合併的秒數
+        :param max_batch: 單次 create_batch 的最大文本數
+        """
+        self.embedder = embedder
+        self.store = store
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        # 已送出但尚未返回的文本，重複請求直接等待同一結果
+        self._inflight: Dict[str, List[asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 事件迴圈只保留task的弱引用，送出中的批次需要在這裡持有，否則可能在等待者返回前被回收
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def create(self, input_data: Any) -> List[float]:
+        # graphiti 一律以 create(input_data=[text]) 呼叫，單一文本的列表與字串同樣合併批次
+        if isinstance(input_data, list) and len(input_data) == 1 and isinstance(input_data[0], str):
+            input_data = input_data[0]
+        if not isinstance(input_data, str):
+            return await self.embedder.create(input_data)
+        if self.store is not None:
+            stored = self.store.get_many([input_data])[0]
+            if stored is not None:
+                return stored.tolist()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if input_data in self._inflight:
+            self._inflight[input_data].append(future)
+            return await future
+        self._pending.setdefault(input_data, []).append(future)
+        if len(self._pending) >= self.max_batch:
+            # 滿批立即送出，之後的請求開始新的一批
+            self._cancel_flush()
+            pending, self._pending = self._pending, {}
+            self._track(pending)
+            self._spawn(self._resolve(pending))
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, lambda: self._spawn(self._flush()))
+        return await future
+
+    async def create_batch(self, input_data_list: List[str]) -> List[List[float]]:
+        stored = self.store.get_many(input_data_list) if self.store is not None else [None] * len(input_data_list)
+        vectors: List[Optional[List[float]]] = [vector.tolist() if vector is not None else None for vector in stored]
+        missing = list(dict.fromkeys(text for text, vector in zip(input_data_list, vectors) if vector is None))
+        if missing:
+            created = dict(zip(missing, await self._embed(missing)))
+            vectors = [vector if vector is not None else created[text] for text, vector in zip(input_data_list, vectors)]
+        return vectors
+
+    async def close(self) -> None:
+        """立即送出窗口中的請求，並等待所有送出中的批次完成（向量庫由呼叫端關閉）"""
+        self._cancel_flush()
+        if self._pending:
+            await self._flush()
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _spawn(self, coro: Any) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        # 嵌入失敗已交給等待者；這裡取出其他意外錯誤，避免靜默遺失
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ 向量批次失敗: {task.exception()!r}")
+
+    def _cancel_flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    async def _flush(self) -> None:
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        self._track(pending)
+        await self._resolve(pending)
+
+    def _track(self, pending: Dict[str, List[asyncio.Future]]) -> None:
+        """送出前登記為進行中，之後相同文本的請求直接等待這一批"""
+        for text, futures in pending.items():
+            # 同一文本可能已在另一批中，合併等待者由先完成的一批回應
+            waiting = self._inflight.setdefault(text, futures)
+            if waiting is not futures:
+                waiting.extend(futures)
+
+    async def _resolve(self, pending: Dict[str, List[asyncio.Future]]) -> None:
+        if not pending:
+            return
+        texts = list(pending)
+        try:
+            vectors = await self._embed(texts)
+        except Exception as e:
+            for text in texts:
+                for future in self._inflight.pop(text, ()):
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for text, vector in zip(texts, vectors):
+            for future in self._inflight.pop(text, ()):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            self.batches += 1
+            try:
+                return await self.embedder.create_batch(batch)
+            except NotImplementedError:
+                # 底層不支援批次時退回並行的單筆呼叫
+                return await asyncio.gather(*(self.embedder.create(text) for text in batch))
+
+        batches = await asyncio.gather(*(
+            embed_batch(texts[start:start + self.max_batch]) for start in range(0, len(texts), self.max_batch)
+        ))
+        vectors = [vector for batch in batches for vector in batch]
+        if self.store is not None:
+            self.store.put_many(texts, vectors)
+        return vectors
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.embedder, name)
@@ -1,11 +1,35 @@
+import dataclasses
 import os
 import re
-import time
-import langextract as lx
-from typing import Union, Iterable, List, Dict, Iterator
-from langextract.data import Document 
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Union, Iterable, List, Dict, Iterator, Optional
+
+from . import metrics
+from .cache import ExtractionCache, content_hash, extraction_fingerprint
+from .chunker import DEFAULT_CHUNK_CHARS, chunk_text, merge_chunk_extractions, split_document
+from .dedup import DEFAULT_DEDUP_THRESHOLD, adapt_extractions, near_duplicate_clusters
+from .discovery import DEFAULT_IGNORED_DIRS, DEFAULT_MAX_FILE_SIZE, normalize_suffixes, read_text, scan_files
+from .journal import ExtractionJournal
+from .packer import DEFAULT_PACK_CHARS, pack_documents, pack_text, split_packed_extractions
+from .records import records_from_extractions
+from .scheduler import ExtractionScheduler, ModelClient, ScheduledResult
+from .static_extractor import STATIC_CLASSES, STATIC_VERSION, static_extract
 # To-do: add multi-modal
 
+if TYPE_CHECKING:
+    import langextract as lx
+
+# 全局變量
+EXTENSIONS = [".py", ".java", ".groovy", ".kt", ".js", ".ts", ".tsx"]
+DOCS_PATH = "KnowledgeBase/docs"
+MODEL_ID = "gemini-2.5-flash"
+# llm: 全部類別交給LLM；hybrid: 靜態分析 + LLM只抽語意類別；static: 只用靜態分析
+EXTRACT_MODES = ("llm", "hybrid", "static")
+EXTRACT_MODE = os.environ.get('EXTRACT_MODE', "hybrid")
+# 逐文件的處理訊息，大量文件時可設 EXTRACT_VERBOSE=0 關閉
+EXTRACT_VERBOSE = os.environ.get('EXTRACT_VERBOSE', '1') != '0'
+
 def _process_and_normalize(extractions, doc: Dict) -> Dict:
     """Process LangExtract results and normalize them"""
     
@@ -34,65 +58,122 @@ def _process_and_normalize(extractions, doc: Dict) -> Dict:
 
     return metadata
 
+def _normalize(extractions, doc: Dict) -> Dict:
+    """
+    產生快取與下游使用的正規化結果
+
+    :param extractions: LangExtract 抽取結果
+    :param doc: 來源文檔
+    :return: {'metadata': 單值摘要, 'records': 每個抽取的緊湊記錄}
+    """
+    with metrics.timer("normalize_seconds"):
+        extractions = list(extractions)
+        return {
+            'metadata': _process_and_normalize(extractions, doc),
+            'records': [record.to_row() for record in records_from_extractions(extractions, doc['document_id'])],
+        }
+
+def combine_extractions(extractions, doc: Dict, mode: str = EXTRACT_MODE) -> List:
+    """
+    依抽取模式合併靜態分析與LLM的結果
+
+    :param extractions: LLM抽取結果（static模式下忽略）
+    :param doc: 來源文檔
+    :param mode: EXTRACT_MODES 之一
+    :return: 合併後的抽取列表
+    """
+    if mode == "llm":
+        return list(extractions)
+    static = static_extract(doc['text'], doc['document_id'])
+    if mode == "static":
+        return static
+    # 靜態分析能精確取得的類別以其為準，LLM只補語意類別
+    return static + [extraction for extraction in extractions if extraction.extraction_class not in STATIC_CLASSES]
+
 class DocumentCollector:
     """收集文檔內容並轉換為LangExtract所需的Document對象"""
     
-    def __init__(self, file_path: str, extensions: List[str]):
+    def __init__(
+        self,
+        file_path: str,
+        extensions: List[str],
+        verbose: bool = False,
+        read_workers: int = 8,
+        max_file_size: Optional[int] = DEFAULT_MAX_FILE_SIZE,
+        ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS,
+    ):
+        """
+        :param file_path: 根目錄
+        :param extensions: 副檔名列表（有無前導點皆可）
+        :param verbose: 是否逐一印出每個文件的處理訊息
+        :param read_workers: 並行讀檔的執行緒數
+        :param max_file_size: 略過超過此大小的文件（位元組），None表示不限
+        :param ignored_dirs: 直接略過的目錄名（另會套用 .gitignore）
+        """
         self.file_path = file_path
         self.extensions = extensions
+        self.verbose = verbose
+        self.read_workers = max(1, read_workers)
+        self.max_file_size = max_file_size
+        self.ignored_dirs = ignored_dirs
+        self._suffixes = normalize_suffixes(extensions)
         self.documents: List[Dict] = []
   
 
-    def find_files_with_extensions(self) -> List[str]:
+    def iter_files(self) -> Iterator[str]:
         """
-        遞歸查找指定副檔名的文件
+        遞歸查找指定副檔名的文件，邊走訪邊產出
         
-        :return: 找到的文件路徑列表
+        :return: 文件路徑的迭代器
         """
-        found_files = []
-
         if not os.path.isdir(self.file_path):
             raise FileNotFoundError(f"找不到目錄: {os.path.abspath(self.file_path)}")
 
-        for dirpath, _, filenames in os.walk(self.file_path):
-            for filename in filenames:
-                if any(filename.endswith(ext) for ext in self.extensions):
-                    file_path = os.path.join(dirpath, filename)
-                    found_files.append(file_path)
-                    print(f"找到文件: {file_path}")
+        for file_path in scan_files(self.file_path, self._suffixes, self.ignored_dirs, self.max_file_size):
+            metrics.inc("files_discovered_total")
+            if self.verbose:
+                print(f"找到文件: {file_path}")
+            yield file_path
+
+    def find_files_with_extensions(self) -> List[str]:
+        """
+        遞歸查找指定副檔名的文件
+        
+        :return: 找到的文件路徑列表
+        """
+        with metrics.timer("discovery_seconds"):
+            found_files = list(self.iter_files())
 
         print(f"找到程式文件共 {len(found_files)} 個。")
         return found_files
 
     def load_file_content(self, file_path: str) -> str:
         """
-        安全地載入單個文件內容
+        安全地載入單個文件內容（只讀取一次，依序嘗試utf-8與gbk解碼）
         
         :param file_path: 文件路徑
         :return: 文件內容，出錯時返回空字符串
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                print(f"✅ 成功載入: {file_path} ({len(content)} 字符)")
-                return content
-        except UnicodeDecodeError:
-            # 嘗試其他編碼
-            try:
-                with open(file_path, 'r', encoding='gbk') as f:
-                    content = f.read()
-                    print(f"✅ 成功載入 (GBK編碼): {file_path}")
-                    return content
-            except Exception as e:
-                print(f"❌ 編碼錯誤: {file_path} - {e}")
-                return ""
+            with metrics.timer("file_read_seconds"):
+                content, encoding = read_text(file_path)
+            if self.verbose:
+                print(f"✅ 成功載入 ({encoding}): {file_path} ({len(content)} 字符)")
+            return content
+        except UnicodeDecodeError as e:
+            metrics.inc("file_read_errors_total", kind="encoding")
+            print(f"❌ 編碼錯誤: {file_path} - {e}")
+            return ""
         except FileNotFoundError:
+            metrics.inc("file_read_errors_total", kind="not_found")
             print(f"❌ 找不到檔案: {file_path}")
             return ""
         except PermissionError:
+            metrics.inc("file_read_errors_total", kind="permission")
             print(f"❌ 沒有權限讀取檔案: {file_path}")
             return ""
         except Exception as e:
+            metrics.inc("file_read_errors_total", kind="other")
             print(f"❌ 讀取檔案 {file_path} 時發生錯誤: {e}")
             return ""
 
@@ -111,6 +192,8 @@ class DocumentCollector:
         doc = {
             "text":content,
             "document_id":relative_path,
+            "content_hash":content_hash(content),
+            "mtime":os.path.getmtime(file_path),
             
             # 可以添加metadata
             # metadata={
@@ -121,6 +204,24 @@ class DocumentCollector:
         }
         return doc
 
+    def load_document(self, file_path: str) -> Optional[Dict]:
+        """
+        載入單個文件並創建Document，空文件或失敗時返回None
+        
+        :param file_path: 文件路徑
+        :return: Document對象或None
+        """
+        content = self.load_file_content(file_path)
+        if not (content and content.strip()):
+            if self.verbose:
+                print(f"⚠️ 跳過空文件: {file_path}")
+            return None
+        try:
+            return self.create_langextract_document(file_path, content)
+        except Exception as e:
+            print(f"❌ 創建文檔失敗 {file_path}: {e}")
+            return None
+
     def collect_documents_as_text(self) -> str:
         """
         收集所有文檔並合併為單一長文本，使用相對路徑作為篇章標記
@@ -130,36 +231,26 @@ class DocumentCollector:
         found_files = self.find_files_with_extensions()
         print(f"準備載入 {len(found_files)} 個檔案...")
 
-        successful_count = 0
-        combined_text = ""
-        
+        # 先收集各段再一次join，避免字串反覆串接的二次方成本
+        docs = []
         for file_path in found_files:
-            content = self.load_file_content(file_path)
-            
-            # 只處理非空內容
-            if content and content.strip():
-                try:
-                    relative_path = os.path.relpath(file_path, self.file_path)
-                    successful_count += 1
-                    
-                    # 添加文件路徑標記和內容
-                    combined_text += f"\n\n=== FILE: {relative_path} ===\n\n"
-                    combined_text += content
-                    
-                    # 顯示文件內容預覽
-                    preview = content[:100].replace('\n', '\\n')
-                    print(f"📄 文檔載入成功: {os.path.basename(file_path)} - 預覽: {preview}...")
-                    
-                except Exception as e:
-                    print(f"❌ 載入文檔失敗 {file_path}: {e}")
-                    continue
-            else:
+            doc = self.load_document(file_path)
+            if doc is None:
                 print(f"⚠️ 跳過空文件: {file_path}")
+                continue
+            docs.append(doc)
 
-        print(f"\n✅ 成功處理 {successful_count} 個文件")
+            # 顯示文件內容預覽
+            preview = doc["text"][:100].replace('\n', '\\n')
+            print(f"📄 文檔載入成功: {os.path.basename(file_path)} - 預覽: {preview}...")
+
+        combined_text, _ = pack_text(docs)
+
+        print(f"\n✅ 成功處理 {len(docs)} 個文件")
         print(f"📋 合併文本長度: {len(combined_text)} 字符")
         
         return combined_text
+
     def collect_documents(self) -> List[Dict]:
         """
         收集所有文檔並轉換為LangExtract Document對象
@@ -172,44 +263,24 @@ class DocumentCollector:
         found_files = self.find_files_with_extensions()
         print(f"準備載入 {len(found_files)} 個檔案...")
 
-        successful_count = 0
-        
-        for file_path in found_files:
-            content = self.load_file_content(file_path)
-            
-            # 只處理非空內容
-            if content and content.strip():
-                try:
-                    doc = self.create_langextract_document(file_path, content)
-                    self.documents.append(doc)
-                    successful_count += 1
-                    
-                    # 顯示文件內容預覽
-                    preview = content[:100].replace('\n', '\\n')
-                    print(f"📄 文檔創建成功: {os.path.basename(file_path)} - 預覽: {preview}...")
-                    
-                except Exception as e:
-                    print(f"❌ 創建文檔失敗 {file_path}: {e}")
+        # 以執行緒池並行讀檔，map保持原有順序
+        with ThreadPoolExecutor(max_workers=self.read_workers) as pool:
+            for doc in pool.map(self.load_document, found_files):
+                if doc is None:
                     continue
-            else:
-                print(f"⚠️ 跳過空文件: {file_path}")
+                self.documents.append(doc)
 
-        print(f"\n✅ 成功處理 {successful_count}/{len(found_files)} 個文件")
+                if self.verbose:
+                    # 顯示文件內容預覽
+                    preview = doc["text"][:100].replace('\n', '\\n')
+                    print(f"📄 文檔創建成功: {os.path.basename(doc['document_id'])} - 預覽: {preview}...")
+
+        print(f"\n✅ 成功處理 {len(self.documents)}/{len(found_files)} 個文件")
         print(f"📋 總共創建 {len(self.documents)} 個Document對象")
         
         return self.documents
 
-class Extractor:
-    def __init__(self):
-        print("✅ LangExtract initialized")
-
-    def langExtractor():
-        # 全局變量
-        extensions = [".py", ".java", ".groovy", ".kt", ".js", ".ts", "tsx"]
-
-        file_path = "KnowledgeBase/docs"
-
-        prompt = """ 
+PROMPT = """ 
         # 程式碼知識提取Agent
 
         ## 任務
@@ -270,12 +341,24 @@ class Extractor:
         - 標註版本差異（如Spring Boot 2/3）
         - 必須在attributes中包含file_path信息
         - 不確定時標記 `[需驗證]`
-        """
+"""
 
-        # Example for program documentation data extraction
-        program_doc_examples = [
-            lx.data.ExampleData(
-                text="""
+# hybrid模式下附加於PROMPT：靜態類別已由語法分析取得
+HYBRID_PROMPT_NOTE = """
+        ## 抽取範圍
+        import、Jira自定義欄位ID與函數名稱已由靜態分析取得，只需提取 code_with_comment、configuration_parameter 等需要理解語意的類別。
+"""
+
+
+def program_doc_examples() -> List["lx.data.ExampleData"]:
+    """建立抽取所用的few-shot範例"""
+    # langextract 載入較慢，只在實際需要範例時匯入
+    import langextract as lx
+
+    # Example for program documentation data extraction
+    return [
+        lx.data.ExampleData(
+            text="""
         === FILE: scripts/jira/fieldManager.groovy ===
 
         import com.atlassian.jira.component.ComponentAccessor
@@ -296,60 +379,246 @@ class Extractor:
             programManagerVal = Users.getByName(mappingTable[lastVal])
         }
         """,
-                extractions=[
-                    lx.data.Extraction(
-                        extraction_class="code_with_comment",
-                        extraction_text="# use ComponentAccessor.getCustomFieldManager() to initiate a manager for custumfield" + "def customField = ComponentAccessor.getCustomFieldManager().getCustomFieldObject(""customfield_19210"")",
-                        attributes={"package": "com.atlassian.jira.component.ComponentAccessor", "usage": "use ComponentAccessor.getCustomFieldManager() to initiate a manager for custumfield"}
-                    ),
-                    lx.data.Extraction(
-                        extraction_class="import_statement",
-                        extraction_text="import com.atlassian.jira.component.ComponentAccessor",
-                        attributes={"package": "com.atlassian.jira.component.ComponentAccessor", "file_path": "scripts/jira/fieldManager.groovy"}
-                    ),
-                    lx.data.Extraction(
-                        extraction_class="jira_field",
-                        extraction_text="customfield_19210",
-                        attributes={"field_type": "custom_field", "usage": "project attribute", "file_path": "scripts/jira/fieldManager.groovy"}
-                    ),
-                    lx.data.Extraction(
-                        extraction_class="function_name",
-                        extraction_text="getCustomFieldObject",
-                        attributes={"context": "accessing Jira custom field", "file_path": "scripts/jira/fieldManager.groovy"}
-                    ),
-                    lx.data.Extraction(
-                        extraction_class="configuration_parameter",
-                        extraction_text="mappingTable",
-                        attributes={"type": "key-value mapping", "purpose": "program manager assignment", "file_path": "scripts/jira/fieldManager.groovy"}
-                    ),
-                ]
-            )
-        ]
+            extractions=[
+                lx.data.Extraction(
+                    extraction_class="code_with_comment",
+                    extraction_text="# use ComponentAccessor.getCustomFieldManager() to initiate a manager for custumfield" + "def customField = ComponentAccessor.getCustomFieldManager().getCustomFieldObject(""customfield_19210"")",
+                    attributes={"package": "com.atlassian.jira.component.ComponentAccessor", "usage": "use ComponentAccessor.getCustomFieldManager() to initiate a manager for custumfield"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="import_statement",
+                    extraction_text="import com.atlassian.jira.component.ComponentAccessor",
+                    attributes={"package": "com.atlassian.jira.component.ComponentAccessor", "file_path": "scripts/jira/fieldManager.groovy"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="jira_field",
+                    extraction_text="customfield_19210",
+                    attributes={"field_type": "custom_field", "usage": "project attribute", "file_path": "scripts/jira/fieldManager.groovy"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="function_name",
+                    extraction_text="getCustomFieldObject",
+                    attributes={"context": "accessing Jira custom field", "file_path": "scripts/jira/fieldManager.groovy"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="configuration_parameter",
+                    extraction_text="mappingTable",
+                    attributes={"type": "key-value mapping", "purpose": "program manager assignment", "file_path": "scripts/jira/fieldManager.groovy"}
+                ),
+            ]
+        )
+    ]
+
+
+def semantic_examples() -> List["lx.data.ExampleData"]:
+    """只保留語意類別的few-shot範例（hybrid模式）"""
+    return [
+        dataclasses.replace(
+            example,
+            extractions=[e for e in example.extractions if e.extraction_class not in STATIC_CLASSES],
+        )
+        for example in program_doc_examples()
+    ]
+
+
+def mode_fingerprint(scheduler: ExtractionScheduler, mode: str = EXTRACT_MODE) -> str:
+    """快取指紋：hybrid模式的結果同時取決於靜態規則的版本"""
+    model_id = f"{scheduler.model_id}+static{STATIC_VERSION}" if mode == "hybrid" else scheduler.model_id
+    return extraction_fingerprint(scheduler.prompt, scheduler.examples, model_id)
+
+
+def build_scheduler(
+    max_concurrency: Optional[int] = None,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+    client: Optional[ModelClient] = None,
+    mode: str = EXTRACT_MODE,
+) -> ExtractionScheduler:
+    """
+    建立抽取排程器，未指定的限制從環境變數讀取
+
+    :param max_concurrency: 同時進行的模型請求數，預設讀取 EXTRACT_CONCURRENCY
+    :param requests_per_minute: 每分鐘請求上限，預設讀取 EXTRACT_RPM
+    :param tokens_per_minute: 每分鐘token上限，預設讀取 EXTRACT_TPM
+    :param client: 模型客戶端，預設使用 lx.extract
+    :param mode: 抽取模式，hybrid時prompt與範例只涵蓋語意類別
+    :return: ExtractionScheduler
+    """
+    hybrid = mode == "hybrid"
+    return ExtractionScheduler(
+        prompt=PROMPT + HYBRID_PROMPT_NOTE if hybrid else PROMPT,
+        examples=semantic_examples() if hybrid else program_doc_examples(),
+        model_id=MODEL_ID,
+        client=client,
+        max_concurrency=max_concurrency or int(os.environ.get('EXTRACT_CONCURRENCY', 4)),
+        requests_per_minute=requests_per_minute or float(os.environ.get('EXTRACT_RPM', 0)),
+        tokens_per_minute=tokens_per_minute or float(os.environ.get('EXTRACT_TPM', 0)),
+    )
 
-        extracted_docs = []
-        documents = DocumentCollector(file_path, extensions).collect_documents()
-        data = {}
-        for doc in documents:
-            print(f"📄 Processing: {doc["document_id"]}")
 
-            
-            result = lx.extract(
-                text_or_documents=doc["text"],
-                prompt_description=prompt,
-                examples=program_doc_examples,
-                model_id="gemini-2.5-flash",
-            )
-            
+class Extractor:
+    def __init__(self):
+        print("✅ LangExtract initialized")
+
+    @staticmethod
+    def langExtractor(
+        documents: Optional[List[Dict]] = None,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        client: Optional[ModelClient] = None,
+        cache: Optional[ExtractionCache] = None,
+        use_cache: bool = True,
+        chunk_chars: int = DEFAULT_CHUNK_CHARS,
+        pack_chars: int = DEFAULT_PACK_CHARS,
+        mode: str = EXTRACT_MODE,
+        verbose: bool = EXTRACT_VERBOSE,
+        journal: Optional[ExtractionJournal] = None,
+        dedup_threshold: float = DEFAULT_DEDUP_THRESHOLD,
+    ) -> List[Dict]:
+        """
+        並行抽取所有文檔的程式碼知識
+
+        :param documents: 要抽取的文檔，預設收集 DOCS_PATH 下的所有文件
+        :param max_concurrency: 同時進行的模型請求數，預設讀取 EXTRACT_CONCURRENCY
+        :param requests_per_minute: 每分鐘請求上限，預設讀取 EXTRACT_RPM
+        :param tokens_per_minute: 每分鐘token上限，預設讀取 EXTRACT_TPM
+        :param client: 模型客戶端，預設使用 lx.extract
+        :param cache: 抽取結果快取，預設開啟 EXTRACT_CACHE 指定的SQLite檔
+        :param use_cache: 為False時不讀寫快取
+        :param chunk_chars: 超過此長度的文件按類別/函數邊界切塊並行抽取
+        :param pack_chars: 小文件合併為不超過此長度的單一請求，0表示不合併
+        :param mode: 抽取模式（llm / hybrid / static），預設讀取 EXTRACT_MODE
+        :param verbose: 是否逐一印出每個請求與文件的結果（錯誤一律印出）
+        :param journal: 抽取日誌，每個文件完成時立即寫入；其中已有的文件（續跑）不再抽取
+        :param dedup_threshold: 近似重複（MinHash估計的Jaccard相似度）達到此值的文件只抽取一次，
+            其他成員套用代表文件的結果；0表示不去重
+        :return: 與文檔順序一致的抽取結果列表
+        """
+        if mode not in EXTRACT_MODES:
+            raise ValueError(f"未知的抽取模式: {mode}")
+        if documents is None:
+            documents = DocumentCollector(DOCS_PATH, EXTENSIONS).collect_documents()
+        normalized: Dict[str, Dict] = {}
+
+        if mode == "static":
+            # 純靜態分析每個文件只需數毫秒，不經過排程器與快取
+            for doc in documents:
+                normalized[doc["content_hash"]] = _normalize(combine_extractions((), doc, mode), doc)
+            print(f"⚡ 靜態抽取完成 {len(documents)} 個文件")
+            return Extractor._results(documents, normalized, chunk_chars)
+
+        scheduler = build_scheduler(max_concurrency, requests_per_minute, tokens_per_minute, client, mode)
+
+        if use_cache and cache is None:
+            cache = ExtractionCache()
+        fingerprint = mode_fingerprint(scheduler, mode)
+
+        if cache is not None:
+            normalized = cache.get_many(fingerprint, (doc["content_hash"] for doc in documents))
+            print(f"💾 快取命中 {len(normalized)}/{len(documents)} 個文件")
+        if journal is not None:
+            resumed = {key: data for key, data in journal.load(fingerprint).items() if key not in normalized}
+            if resumed:
+                normalized.update(resumed)
+                print(f"⏯️ 從日誌續跑，略過 {len(resumed)} 個已完成的文件")
+        pending = {doc["document_id"]: doc for doc in documents if doc["content_hash"] not in normalized}
+
+        # 近似重複的文件（複製貼上只改欄位ID的腳本）只送代表文件給模型
+        clusters = near_duplicate_clusters(list(pending.values()), dedup_threshold)
+        duplicates = {member for members in clusters.values() for member in members}
+        if clusters:
+            print(f"🧬 {len(duplicates)} 個近似重複文件歸入 {len(clusters)} 個群組，只抽取代表文件")
+
+        # 小文件合併為一個請求；大文件切塊後與其他文件一起排程，全部塊完成後再合併
+        packs, singles = pack_documents([doc for doc_id, doc in pending.items() if doc_id not in duplicates], pack_chars)
+        chunk_docs = [chunk for doc in singles for chunk in split_document(doc, chunk_chars)]
+        remaining = Counter(chunk["parent_id"] for chunk in chunk_docs)
+        remaining.update(doc_id for pack in packs for doc_id, _, _ in pack["members"])
+        parts: Dict[str, List] = defaultdict(list)
+        failed = set()
+        if packs:
+            print(f"📦 {sum(len(pack['members']) for pack in packs)} 個小文件合併為 {len(packs)} 個請求")
+
+        def on_result(outcome: ScheduledResult) -> None:
+            unit = outcome.doc
+            if outcome.error is not None:
+                print(f"❌ 抽取失敗 {unit['document_id']} (嘗試 {outcome.attempts} 次): {outcome.error}")
+            elif verbose:
+                print(f"📄 Processed: {unit['document_id']} ({outcome.latency:.1f}s)")
+            if "members" not in unit:
+                extractions = outcome.result.extractions if outcome.error is None else None
+                complete_part(unit["parent_id"], unit["chunk_start"], extractions)
+                return
+            # 合併請求的結果依文件標記拆回各文件，偏移已換算為文件內位置
+            split = {}
+            if outcome.error is None:
+                split, unassigned = split_packed_extractions(unit, outcome.result.extractions)
+                if unassigned:
+                    print(f"⚠️ {unit['document_id']} 有 {unassigned} 個抽取無法對應到文件")
+            for doc_id, _, _ in unit["members"]:
+                complete_part(doc_id, 0, split.get(doc_id) if outcome.error is None else None)
+
+        def complete_part(parent_id: str, offset: int, extractions: Optional[List]) -> None:
+            remaining[parent_id] -= 1
+            if extractions is None:
+                failed.add(parent_id)
+            else:
+                parts[parent_id].append((offset, extractions))
+            if remaining[parent_id]:
+                return
+            if parent_id in failed:
+                parts.pop(parent_id, None)
+                return
+
+            doc = pending[parent_id]
+            extractions = merge_chunk_extractions(parts.pop(parent_id))
+            finish(doc, extractions)
+            for member_id in clusters.get(parent_id, ()):
+                member = pending[member_id]
+                finish(member, adapt_extractions(extractions, doc, member))
+
+        def finish(doc: Dict, extractions: List) -> None:
             # Process and normalize extractions
-            data = _process_and_normalize(result.extractions, doc)
+            data = _normalize(combine_extractions(extractions, doc, mode), doc)
+            normalized[doc["content_hash"]] = data
 
-            print(f"{data}\n")
-            
-            time.sleep(3)
+            if verbose:
+                print(f"{data['metadata']}\n")
+
+            if journal is not None:
+                journal.append(fingerprint, doc, data)
+            if cache is not None:
+                cache.put(fingerprint, doc["content_hash"], data)
+
+        try:
+            if packs or chunk_docs:
+                scheduler.run(packs + chunk_docs, on_result=on_result)
+        finally:
+            # 中途出錯時已完成的文件也要落盤
+            if journal is not None:
+                journal.sync()
+        if cache is not None:
+            cache.evict()
+
+        return Extractor._results(documents, normalized, chunk_chars)
+
+    @staticmethod
+    def _results(documents: List[Dict], normalized: Dict[str, Dict], chunk_chars: int) -> List[Dict]:
+        """依文檔順序組合輸出，略過沒有結果（抽取失敗）的文件"""
+        extracted_docs = []
+        for doc in documents:
+            data = normalized.get(doc["content_hash"])
+            if data is None:
+                continue
             extracted_docs.append({
                 'id': doc['document_id'],
                 'content': doc['text'],
-                'metadata': data
+                'content_hash': doc['content_hash'],
+                'mtime': doc['mtime'],
+                'chunks': [[chunk.start, chunk.end] for chunk in chunk_text(doc['text'], doc['document_id'], chunk_chars)],
+                'metadata': data['metadata'],
+                'records': data['records'],
             })
         
-        return extracted_docs
\ No newline at end of file
+        return extracted_docs
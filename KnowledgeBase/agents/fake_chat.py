@@ -0,0 +1,75 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# 查詢agent基準測試用的假聊天模型（與 fakes 分開，其他替身不需要載入langchain）
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    假的聊天模型，用來量測查詢agent的首字延遲（TTFT）
+
+    使用者訊息之後的第一輪同時呼叫所有只需要 query 參數的工具；
+    收到工具結果後以 token_latency 的間隔逐詞串流回答。
+    """
+
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    answer_tokens: int = 40
+    tool_names: List[str] = []
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        names = [tool.name for tool in tools if set(getattr(tool, "args", {})) == {"query"}]
+        return self.model_copy(update={"tool_names": names})
+
+    def _respond(self, messages: List[BaseMessage]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        # 回傳 (工具呼叫, 回答的詞)
+        self.calls += 1
+        last = messages[-1]
+        if self.tool_names and isinstance(last, HumanMessage):
+            calls = [
+                {"name": name, "args": {"query": last.content}, "id": f"call_{self.calls}_{index}"}
+                for index, name in enumerate(self.tool_names)
+            ]
+            return calls, []
+        # 只使用最後一個問題之後的工具結果
+        start = max((index for index, message in enumerate(messages) if isinstance(message, HumanMessage)), default=0)
+        results = [message for message in messages[start:] if isinstance(message, ToolMessage)]
+        words = " ".join(str(message.content) for message in results).split() or ["沒有找到相關資料"]
+        tokens = [f"根據{len(results)}個工具結果："] + [words[i % len(words)] + " " for i in range(self.answer_tokens - 1)]
+        return [], tokens
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        calls, tokens = self._respond(messages)
+        time.sleep(self.first_token_latency + self.token_latency * max(0, len(tokens) - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens), tool_calls=calls))])
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        calls, tokens = self._respond(messages)
+        if self.first_token_latency:
+            await asyncio.sleep(self.first_token_latency)
+        if calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"], ensure_ascii=False), "id": call["id"], "index": index}
+                    for index, call in enumerate(calls)
+                ],
+            ))
+            return
+        for index, token in enumerate(tokens):
+            if index and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,311 @@
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 供測試與基準測試使用的本地假後端，不會發出任何網路請求
+# 假的聊天模型需要langchain，放在 fake_chat 模組，這裡的替身不依賴langchain
+
+_IMPORT_RE = re.compile(r"^\s*import\s+([\w.]+)", re.MULTILINE)
+_FIELD_RE = re.compile(r"customfield_\d+")
+_CALL_RE = re.compile(r"\.(get\w+)\(")
+
+
+@dataclass
+class FakeCharInterval:
+    start_pos: Optional[int] = None
+    end_pos: Optional[int] = None
+
+
+@dataclass
+class FakeExtraction:
+    extraction_class: str
+    extraction_text: str
+    attributes: Optional[Dict[str, Any]] = None
+    char_interval: Optional[FakeCharInterval] = None
+
+
+@dataclass
+class FakeResult:
+    text: str
+    extractions: List[FakeExtraction] = field(default_factory=list)
+
+
+class FakeAPIError(Exception):
+    """模擬帶狀態碼的API錯誤"""
+
+    def __init__(self, status_code: int, message: str = "fake api error"):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+class FakeModelClient:
+    """可設定延遲與錯誤率的假模型客戶端，介面與 LangExtractClient 相同"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def extract(self, text: str, prompt: str, examples: Sequence[Any], model_id: str) -> FakeResult:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeAPIError(self.error_status)
+        return FakeResult(text=text, extractions=fake_extractions(text))
+
+
+def fake_extractions(text: str) -> List[FakeExtraction]:
+    """以正則從文本產生確定性的抽取結果"""
+    extractions = []
+    for pattern, extraction_class, group in (
+        (_IMPORT_RE, "import_statement", 0),
+        (_FIELD_RE, "jira_field", 0),
+        (_CALL_RE, "function_name", 1),
+    ):
+        for match in pattern.finditer(text):
+            extractions.append(FakeExtraction(
+                extraction_class=extraction_class,
+                extraction_text=match.group(group).strip(),
+                char_interval=FakeCharInterval(match.start(group), match.end(group)),
+            ))
+    return extractions
+
+
+class FakeGraphiti:
+    """記憶體中的Graphiti替身，模擬 add_episode 的延遲與錯誤"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.episodes: Dict[str, Dict[str, Any]] = {}
+        self.calls = 0
+        self._random = random.Random(seed)
+        # structured導入直接寫入的圖與使用的embedder
+        self.driver = FakeGraphDriver(latency)
+        self.embedder = FakeEmbedder()
+
+    async def _roundtrip(self) -> None:
+        self.calls += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        fail = self._random.random() < self.error_rate
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise FakeAPIError(503, "fake graph backend unavailable")
+
+    async def build_indices_and_constraints(self) -> None:
+        return None
+
+    async def add_episode(self, **kwargs: Any) -> SimpleNamespace:
+        await self._roundtrip()
+        episode_uuid = str(uuid.uuid4())
+        self.episodes[episode_uuid] = kwargs
+        return SimpleNamespace(episode=SimpleNamespace(uuid=episode_uuid, **kwargs), edges=[])
+
+    async def add_episode_bulk(self, bulk_episodes: List[Any], group_id: Optional[str] = None) -> None:
+        await self._roundtrip()
+        for episode in bulk_episodes:
+            self.episodes[episode.uuid or str(uuid.uuid4())] = vars(episode)
+
+    async def remove_episode(self, episode_uuid: str) -> None:
+        await self._roundtrip()
+        self.episodes.pop(episode_uuid, None)
+
+    async def close(self) -> None:
+        return None
+
+
+class FakeGraphDriver:
+    """
+    記憶體中的圖資料庫替身，介面與Neo4j驅動的 execute_query 相同
+
+    只理解 structured 模組的 UNWIND 查詢（以MERGE語意寫入節點與關係）與 neighborhood 模組讀取鄰接邊的查詢。
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.relationships: Dict[str, Dict[str, Any]] = {}
+        self.queries = 0
+        self.rows = 0
+
+    def _node(self, node_uuid: str, label: str) -> Dict[str, Any]:
+        return self.nodes.setdefault(node_uuid, {"labels": {label}, "properties": {"uuid": node_uuid}})
+
+    def _relationship(self, rel_type: str, rel_uuid: str, source: str, target: str) -> Optional[Dict[str, Any]]:
+        # MATCH 找不到端點時該列不寫入
+        if source not in self.nodes or target not in self.nodes:
+            return None
+        return self.relationships.setdefault(
+            rel_uuid, {"type": rel_type, "source": source, "target": target, "properties": {"uuid": rel_uuid}}
+        )
+
+    async def execute_query(self, query: str, **params: Any) -> Any:
+        from .neighborhood import ADJACENCY_QUERY
+        from .structured import EDGES_QUERY, EPISODES_QUERY, MENTIONS_QUERY
+
+        self.queries += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if query == EPISODES_QUERY:
+            for episode in params["episodes"]:
+                created = episode["uuid"] not in self.nodes
+                node = self._node(episode["uuid"], "Episodic")
+                if created:
+                    node["properties"].update({k: v for k, v in episode.items() if k != "entity_edges"}, entity_edges=[])
+                existing = node["properties"].setdefault("entity_edges", [])
+                existing.extend(x for x in episode["entity_edges"] if x not in existing)
+            self.rows += len(params["episodes"])
+        elif query == EDGES_QUERY:
+            for edge in params["edges"]:
+                relationship = self._relationship("RELATES_TO", edge["uuid"], edge["source_node_uuid"], edge["target_node_uuid"])
+                if relationship is not None:
+                    relationship["properties"] = {k: v for k, v in edge["properties"].items() if v is not None}
+            self.rows += len(params["edges"])
+        elif query == MENTIONS_QUERY:
+            for mention in params["mentions"]:
+                relationship = self._relationship("MENTIONS", mention["uuid"], mention["episode_uuid"], mention["node_uuid"])
+                if relationship is not None:
+                    relationship["properties"].update(group_id=mention["group_id"], created_at=mention["created_at"])
+            self.rows += len(params["mentions"])
+        elif query == ADJACENCY_QUERY:
+            records = [
+                {"source": relationship["source"], "target": relationship["target"]}
+                for relationship in self.relationships.values()
+                if relationship["type"] == "RELATES_TO"
+            ]
+            return records, None, ["source", "target"]
+        elif (match := re.search(r"MERGE \(n:Entity .*?SET n:(\w+)", query, re.DOTALL)) is not None:
+            for node in params["nodes"]:
+                created = node["uuid"] not in self.nodes
+                entity = self._node(node["uuid"], "Entity")
+                entity["labels"].add(match.group(1))
+                if created:
+                    entity["properties"].update(node)
+            self.rows += len(params["nodes"])
+        else:
+            raise ValueError(f"FakeGraphDriver 不支援的查詢: {query.strip()[:80]}")
+
+    def labeled(self, label: str) -> List[Dict[str, Any]]:
+        return [node["properties"] for node in self.nodes.values() if label in node["labels"]]
+
+
+def _fake_vector(text: str, dim: int) -> List[float]:
+    # 由文本雜湊產生確定性的向量
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(digest[i % len(digest)] - 128) / 128.0 for i in range(dim)]
+
+
+class FakeEmbedder:
+    """假的embedder，介面與Graphiti EmbedderClient 相同，向量由文本雜湊決定"""
+
+    def __init__(self, dim: int = 64, latency: float = 0.0, batch_latency: Optional[float] = None):
+        """
+        :param dim: 向量維度
+        :param latency: 每次 create 的延遲秒數
+        :param batch_latency: 每次 create_batch 的延遲秒數，預設與 latency 相同
+        """
+        self.dim = dim
+        self.latency = latency
+        self.batch_latency = latency if batch_latency is None else batch_latency
+        self.calls = 0
+        self.batch_calls = 0
+
+    async def create(self, input_data: Any) -> List[float]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = input_data if isinstance(input_data, str) else repr(input_data)
+        return _fake_vector(text, self.dim)
+
+    async def create_batch(self, input_data_list: List[str]) -> List[List[float]]:
+        self.batch_calls += 1
+        if self.batch_latency:
+            await asyncio.sleep(self.batch_latency)
+        return [_fake_vector(text, self.dim) for text in input_data_list]
+
+
+class FakeCrossEncoder:
+    """假的reranker，以查詢與段落的詞彙重疊比例排序"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def rank(self, query: str, passages: List[str]) -> List[Tuple[str, float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        terms = set(query.lower().split())
+        scored = [
+            (passage, len(terms & set(passage.lower().split())) / (len(terms) or 1))
+            for passage in passages
+        ]
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+
+class FakeSearcher:
+    """假的知識圖搜尋後端，介面與 connection 的搜尋函數相同，記錄同時進行的搜尋數"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _roundtrip(self) -> None:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+    async def search_edges(self, query: str, center_node_uuid: Optional[str] = None, num_results: int = 10) -> List[Any]:
+        await self._roundtrip()
+        return [
+            SimpleNamespace(
+                uuid=f"edge-{i}",
+                fact=f"{query} fact {i}",
+                source_node_uuid=center_node_uuid or f"node-{i}",
+                target_node_uuid=f"node-{i + 1}",
+                valid_at=None,
+                invalid_at=None,
+            )
+            for i in range(min(num_results, 3))
+        ]
+
+    async def search_nodes(self, query: str, limit: int = 3) -> List[Any]:
+        await self._roundtrip()
+        return [
+            SimpleNamespace(uuid=f"node-{i}", name=f"{query} {i}", summary=f"summary of {query} {i}", labels=["Entity"])
+            for i in range(limit)
+        ]
+
+    def get_local_index(self) -> None:
+        return None
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import metrics
+
+DEFAULT_RETRY_QUEUE = os.environ.get('INGEST_RETRY_QUEUE', 'KnowledgeBase/.cache/ingest_retry.jsonl')
+
+
+def build_episode(res: Dict) -> Dict[str, Any]:
+    """
+    將 langExtractor 的單筆結果轉為 add_episode 的參數
+
+    :param res: 抽取結果（id, content_hash, mtime, metadata）
+    :return: add_episode 關鍵字參數
+    """
+    from graphiti_core.nodes import EpisodeType
+
+    return {
+        "name": f"{res['id']}",
+        "episode_body": json.dumps(res["metadata"], ensure_ascii=False),
+        "source_description": "Code Knowledge Extraction",
+        "source": EpisodeType.text,
+        # 以文件修改時間作為參考時間，重跑時不會產生新的時間點
+        "reference_time": datetime.fromtimestamp(res["mtime"], timezone.utc),
+    }
+
+
+@dataclass
+class BatchStats:
+    """單一批次的導入統計"""
+
+    batch: int
+    size: int
+    succeeded: int
+    failed: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        return self.succeeded / self.seconds if self.seconds > 0 else 0.0
+
+
+class EpisodeIngestor:
+    """以有界並行或bulk API批次導入episode，失敗項目寫入重試佇列"""
+
+    def __init__(
+        self,
+        graphiti: Any,
+        batch_size: int = 20,
+        max_concurrency: int = 4,
+        use_bulk: bool = False,
+        retry_queue_path: Optional[str] = DEFAULT_RETRY_QUEUE,
+        episode_builder: Callable[[Dict], Dict[str, Any]] = build_episode,
+        on_edges: Optional[Callable[[List[Tuple[str, str]]], None]] = None,
+    ):
+        """
+        :param graphiti: Graphiti 實例或任何提供 add_episode 的替身
+        :param batch_size: 每批episode數
+        :param max_concurrency: 同時進行的 add_episode 數
+        :param use_bulk: 使用 add_episode_bulk（不做邊失效處理，只適合首次導入互不相關的文件）
+        :param retry_queue_path: 失敗項目的JSONL路徑，None表示不寫入
+        :param episode_builder: 將結果轉為 add_episode 參數的函數
+        :param on_edges: 寫入新的關係邊後的回呼（(來源節點UUID, 目標節點UUID) 列表），用於維護鄰接索引
+        """
+        self.graphiti = graphiti
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.use_bulk = use_bulk
+        self.retry_queue_path = retry_queue_path
+        self.episode_builder = episode_builder
+        self.on_edges = on_edges
+        self.failed: List[Dict] = []
+
+    async def ingest(
+        self,
+        results: Sequence[Dict],
+        on_ingested: Optional[Callable[[Dict, str], Awaitable[None]]] = None,
+    ) -> List[BatchStats]:
+        """
+        導入所有結果
+
+        :param results: langExtractor 的結果
+        :param on_ingested: 每個episode成功寫入後的回呼（結果, episode UUID）
+        :return: 每批的統計
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        stats = []
+
+        async def add_one(res: Dict) -> bool:
+            async with semaphore:
+                return await self.ingest_one(res, on_ingested)
+
+        for number, start in enumerate(range(0, len(results), self.batch_size)):
+            batch = results[start:start + self.batch_size]
+            started = time.perf_counter()
+            outcomes = await self._ingest_batch(batch, on_ingested, add_one)
+            failed = outcomes.count(False)
+
+            batch_stats = BatchStats(number, len(batch), len(batch) - failed, failed, time.perf_counter() - started)
+            stats.append(batch_stats)
+            print(
+                f"📦 批次 {number}: {batch_stats.succeeded}/{batch_stats.size} 成功, "
+                f"{batch_stats.seconds:.2f}s, {batch_stats.throughput:.2f} episodes/s"
+            )
+
+        return stats
+
+    async def _ingest_batch(
+        self,
+        batch: Sequence[Dict],
+        on_ingested: Optional[Callable[[Dict, str], Awaitable[None]]],
+        add_one: Callable[[Dict], Awaitable[bool]],
+    ) -> List[bool]:
+        """導入一批結果，返回每筆是否成功（子類別可改寫導入方式）"""
+        if self.use_bulk:
+            return await self._add_bulk(batch, on_ingested)
+        return list(await asyncio.gather(*(add_one(res) for res in batch)))
+
+    async def ingest_one(
+        self,
+        res: Dict,
+        on_ingested: Optional[Callable[[Dict, str], Awaitable[None]]] = None,
+    ) -> bool:
+        """
+        導入單一結果，失敗時寫入重試佇列而不拋出
+
+        :param res: langExtractor 的單筆結果
+        :param on_ingested: 成功寫入後的回呼（結果, episode UUID）
+        :return: 是否成功
+        """
+        try:
+            with metrics.timer("graph_add_episode_seconds", op="add_episode"):
+                added = await self.graphiti.add_episode(**self.episode_builder(res))
+            self._report_edges(added.edges)
+            if on_ingested is not None:
+                await on_ingested(res, added.episode.uuid)
+        except Exception as e:
+            metrics.inc("episodes_total", outcome="failed")
+            self._enqueue_retry(res, e)
+            return False
+        metrics.inc("episodes_total", outcome="ok")
+        return True
+
+    async def _add_bulk(
+        self,
+        batch: Sequence[Dict],
+        on_ingested: Optional[Callable[[Dict, str], Awaitable[None]]],
+    ) -> List[bool]:
+        from graphiti_core.utils.bulk_utils import RawEpisode
+
+        uuids = [str(uuid.uuid4()) for _ in batch]
+        raw_episodes = []
+        for res, episode_uuid in zip(batch, uuids):
+            episode = self.episode_builder(res)
+            raw_episodes.append(RawEpisode(
+                uuid=episode_uuid,
+                name=episode["name"],
+                content=episode["episode_body"],
+                source_description=episode["source_description"],
+                source=episode["source"],
+                reference_time=episode["reference_time"],
+            ))
+        try:
+            with metrics.timer("graph_add_episode_seconds", op="add_episode_bulk"):
+                added = await self.graphiti.add_episode_bulk(raw_episodes)
+        except Exception as e:
+            # bulk是整批成功或失敗
+            metrics.inc("episodes_total", len(batch), outcome="failed")
+            for res in batch:
+                self._enqueue_retry(res, e)
+            return [False] * len(batch)
+        self._report_edges(getattr(added, "edges", ()))
+
+        outcomes = []
+        for res, episode_uuid in zip(batch, uuids):
+            try:
+                if on_ingested is not None:
+                    await on_ingested(res, episode_uuid)
+                outcomes.append(True)
+                metrics.inc("episodes_total", outcome="ok")
+            except Exception as e:
+                metrics.inc("episodes_total", outcome="failed")
+                self._enqueue_retry(res, e)
+                outcomes.append(False)
+        return outcomes
+
+    def _report_edges(self, edges: Iterable[Any]) -> None:
+        pairs = [(edge.source_node_uuid, edge.target_node_uuid) for edge in edges]
+        if self.on_edges is not None and pairs:
+            self.on_edges(pairs)
+
+    def _enqueue_retry(self, res: Dict, error: BaseException) -> None:
+        print(f"❌ 導入失敗 {res['id']}: {error}")
+        # 原始碼內容不需要重新導入，只保留episode所需欄位
+        entry = {key: value for key, value in res.items() if key != 'content'}
+        entry['error'] = repr(error)
+        self.failed.append(entry)
+        if self.retry_queue_path is None:
+            return
+        directory = os.path.dirname(self.retry_queue_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.retry_queue_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def enqueue_removal(episode_uuid: str, error: BaseException, path: Optional[str] = DEFAULT_RETRY_QUEUE) -> None:
+    """
+    將移除失敗的舊episode寫入重試佇列，下次導入時再移除
+
+    :param episode_uuid: 待移除的episode
+    :param error: 移除時的錯誤
+    :param path: 重試佇列路徑，None表示不寫入
+    """
+    print(f"❌ 移除episode失敗 {episode_uuid}: {error}")
+    if path is None:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'remove_episode': episode_uuid, 'error': repr(error)}, ensure_ascii=False) + "\n")
+
+
+def drain_retry_queue(path: str = DEFAULT_RETRY_QUEUE) -> Tuple[List[Dict], List[str]]:
+    """
+    讀出並清空重試佇列
+
+    :param path: 重試佇列路徑
+    :return: (待重新導入的結果, 待移除的episode UUID)
+    """
+    if not os.path.exists(path):
+        return [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    os.remove(path)
+    removals = list(dict.fromkeys(entry['remove_episode'] for entry in entries if 'remove_episode' in entry))
+    # 同一文件可能失敗多次，保留最後一筆
+    latest = {entry['id']: entry for entry in entries if 'remove_episode' not in entry}
+    return list(latest.values()), removals
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_JOURNAL_PATH = os.environ.get('EXTRACT_JOURNAL', 'KnowledgeBase/.cache/extract_journal.jsonl')
+# 每累積這麼多筆或距上次fsync超過這麼多秒才fsync一次；每筆仍會flush到作業系統，行程被殺不會遺失
+JOURNAL_SYNC_EVERY = int(os.environ.get('EXTRACT_JOURNAL_SYNC_EVERY', 64))
+JOURNAL_SYNC_SECONDS = float(os.environ.get('EXTRACT_JOURNAL_SYNC_SECONDS', 1.0))
+
+
+class ExtractionJournal:
+    """
+    只追加的JSONL抽取日誌，每個文件完成時寫入一行
+
+    行格式：{"fingerprint", "content_hash", "document_id", "data"}，data 為 _normalize 的結果。
+    中斷後以 load() 讀回同一指紋下已完成的文件，--resume 時略過這些文件。
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_JOURNAL_PATH,
+        sync_every: int = JOURNAL_SYNC_EVERY,
+        sync_seconds: float = JOURNAL_SYNC_SECONDS,
+    ):
+        """
+        :param path: 日誌檔路徑
+        :param sync_every: 每累積幾筆fsync一次，1表示每筆都fsync
+        :param sync_seconds: 距上次fsync超過此秒數時，下一筆寫入後立即fsync
+        """
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        self.sync_seconds = sync_seconds
+        self.appended = 0
+        self.syncs = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._file = open(path, 'a+', encoding='utf-8')
+        self._repair_tail()
+
+    def _repair_tail(self) -> None:
+        # 上次在寫入途中被中斷時最後一行不完整，補上換行使新紀錄從新的一行開始
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell() == 0:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                self._file.write("\n")
+                self._file.flush()
+
+    def load(self, fingerprint: str) -> Dict[str, Dict]:
+        """
+        讀回指定指紋下已完成的文件
+
+        :param fingerprint: mode_fingerprint 的結果，prompt、範例或模型改變時舊紀錄不會被使用
+        :return: {內容雜湊: 正規化結果}，同一內容有多筆時以最後一筆為準
+        """
+        found: Dict[str, Dict] = {}
+        with self._lock:
+            self._file.flush()
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 中斷時寫到一半的行
+                        continue
+                    if entry.get("fingerprint") == fingerprint:
+                        found[entry["content_hash"]] = entry["data"]
+        return found
+
+    def append(self, fingerprint: str, doc: Dict, data: Dict) -> None:
+        """
+        寫入一個已完成的文件
+
+        :param fingerprint: mode_fingerprint 的結果
+        :param doc: 文檔（需含 document_id 與 content_hash）
+        :param data: _normalize 的結果
+        """
+        line = json.dumps(
+            {
+                "fingerprint": fingerprint,
+                "content_hash": doc["content_hash"],
+                "document_id": doc["document_id"],
+                "data": data,
+            },
+            ensure_ascii=False,
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.appended += 1
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_seconds:
+                self._sync()
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self.syncs += 1
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self) -> None:
+        """將尚未fsync的紀錄寫入磁碟"""
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+
+    def reset(self) -> None:
+        """清空日誌（不續跑的新一輪抽取）"""
+        with self._lock:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._unsynced:
+                self._sync()
+            self._file.close()
+
+    def __enter__(self) -> "ExtractionJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def open_journal(resume: bool, path: Optional[str] = None) -> ExtractionJournal:
+    """
+    開啟日誌；不續跑時清空舊紀錄
+
+    :param resume: 是否保留先前的紀錄以續跑
+    :param path: 日誌檔路徑，預設 EXTRACT_JOURNAL
+    :return: ExtractionJournal
+    """
+    journal = ExtractionJournal(path or DEFAULT_JOURNAL_PATH)
+    if not resume:
+        journal.reset()
+    return journal
@@ -0,0 +1,384 @@
+import json
+import os
+import re
+import tempfile
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import metrics
+from .records import ExtractionRecord, RecordStore
+
+# 以抽取記錄建立的行程內第一層索引，信心足夠時不需要連到Neo4j與Gemini
+DEFAULT_LOCAL_INDEX = os.environ.get('LOCAL_SEARCH_INDEX', 'KnowledgeBase/.cache/local_search')
+# 設為0時查詢一律走Graphiti
+LOCAL_SEARCH_ENABLED = os.environ.get('LOCAL_SEARCH', '1') != '0'
+# 最高分結果涵蓋的查詢詞比例低於此值時視為信心不足
+LOCAL_SEARCH_MIN_COVERAGE = float(os.environ.get('LOCAL_SEARCH_MIN_COVERAGE', 0.6))
+# 雜湊向量的餘弦相似度下限（對應 sim_min_score；雜湊向量的分數尺度低於語意向量）
+LOCAL_SEARCH_SIM_MIN_SCORE = float(os.environ.get('LOCAL_SEARCH_SIM_MIN_SCORE', 0.2))
+VECTOR_DIM = 256
+
+# 與Lucene（Neo4j全文索引）相同的BM25參數
+BM25_K1 = 1.2
+BM25_B = 0.75
+# graphiti rrf() 的 rank_const
+RRF_RANK_CONST = 1
+
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+|[一-鿿]")
+# camelCase、PascalCase與數字邊界
+_SUBWORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how i in is it of on or the this that to use used using "
+    "what when where which who why with".split()
+)
+# 不納入搜尋文本的屬性（檔案路徑由 documents 保存）
+_SKIP_ATTRIBUTES = frozenset({"file_path"})
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分為小寫詞：識別字依底線與camelCase拆開，中文以單字為詞，去除常見停用詞
+
+    例如 "getCustomFieldManager()" -> ["get", "custom", "field", "manager"]
+
+    :param text: 文本
+    :return: 詞列表
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        for part in word.split("_"):
+            pieces = _SUBWORD_RE.findall(part) or ([part] if part else [])
+            for piece in pieces:
+                piece = piece.lower()
+                if piece not in _STOPWORDS:
+                    tokens.append(piece)
+    return tokens
+
+
+def hash_vectors(texts: Sequence[str], dim: int = VECTOR_DIM) -> np.ndarray:
+    """
+    以詞與字元三元組的特徵雜湊產生L2正規化向量，不需要呼叫嵌入模型
+
+    字元三元組讓拼錯或部分相同的詞（custumfield / customfield）仍有相似度。
+
+    :param texts: 文本
+    :param dim: 向量維度
+    :return: (len(texts), dim) 的float32矩陣
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in tokenize(text):
+            features = [token] + [f"#{token[i:i + 3]}" for i in range(max(1, len(token) - 2))]
+            for feature in features:
+                digest = zlib.crc32(feature.encode("utf-8"))
+                # 最高位決定正負號，減少碰撞造成的偏差
+                matrix[row, digest % dim] += -1.0 if digest & 0x80000000 else 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+@dataclass
+class LocalEntry:
+    """索引中的一個條目：同類別同文本的抽取合併為一筆"""
+
+    extraction_class: str
+    text: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    documents: List[str] = field(default_factory=list)
+    # 各文件中出現過的屬性值（usage、context等），一併納入搜尋文本
+    notes: List[str] = field(default_factory=list)
+
+    def search_text(self) -> str:
+        return " ".join([self.text, *self.notes])
+
+
+@dataclass
+class LocalHit:
+    extraction_class: str
+    text: str
+    attributes: Dict[str, Any]
+    documents: List[str]
+    score: float
+
+
+@dataclass
+class LocalSearchResult:
+    """
+    :param hits: 依RRF分數排序的結果
+    :param confident: 最高分結果是否同時被BM25與向量找到且涵蓋足夠的查詢詞
+    :param coverage: 最高分結果涵蓋的查詢詞比例
+    """
+
+    hits: List[LocalHit]
+    confident: bool
+    coverage: float
+
+
+def rrf(rankings: Sequence[Sequence[int]], rank_const: int = RRF_RANK_CONST) -> List[Tuple[int, float]]:
+    """
+    Reciprocal Rank Fusion，與 graphiti_core.search.search_utils.rrf 相同：每個排名貢獻 1 / (名次 + rank_const)
+
+    :param rankings: 各搜尋方法依分數排序的條目編號
+    :return: [(條目編號, 分數)]，分數由高到低
+    """
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for position, index in enumerate(ranking):
+            scores[index] += 1 / (position + rank_const)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _top(scores: np.ndarray, limit: int, min_score: float) -> List[int]:
+    # argpartition只排序前limit個，條目數大時不需要完整排序；
+    # 取尾端而非對負值取前端，BM25分數大量相同時後者會退化
+    candidates = np.flatnonzero(scores > min_score)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(scores[candidates], len(candidates) - limit)[-limit:]]
+    return candidates[np.argsort(-scores[candidates], kind="stable")].tolist()
+
+
+class LocalSearchIndex:
+    """
+    行程內的混合搜尋索引：BM25反向索引 + 向量矩陣，以RRF融合
+
+    與 NODE_HYBRID_SEARCH_RRF 相同的流程：BM25與餘弦相似度各取 2 × limit 個候選，
+    餘弦相似度低於 sim_min_score 的捨棄，再以 rrf 合併排序。
+    向量預設為 hash_vectors，查詢不需要任何網路請求。
+    """
+
+    def __init__(
+        self,
+        entries: Sequence[LocalEntry],
+        vectors: Optional[np.ndarray] = None,
+        vectorizer: Callable[[Sequence[str]], np.ndarray] = hash_vectors,
+    ):
+        """
+        :param entries: 索引條目
+        :param vectors: 已計算的向量（可為memmap），None時以 vectorizer 計算
+        :param vectorizer: 文本轉為L2正規化向量的函數，查詢時也使用
+        """
+        self.entries = list(entries)
+        self.vectorizer = vectorizer
+        texts = [entry.search_text() for entry in self.entries]
+        if vectors is None:
+            vectors = vectorizer(texts) if texts else np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        # 以column-major（Fortran順序）存放：查詢向量稀疏時只需讀取非零維度對應的連續欄
+        self.vectors = vectors if vectors.flags.f_contiguous else np.asfortranarray(vectors, dtype=np.float32)
+        self._build_postings(texts)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _build_postings(self, texts: Sequence[str]) -> None:
+        counts = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(count.values()) for count in counts], dtype=np.float32)
+        average = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average)
+
+        ids: Dict[str, List[int]] = defaultdict(list)
+        freqs: Dict[str, List[float]] = defaultdict(list)
+        for index, count in enumerate(counts):
+            for term, tf in count.items():
+                ids[term].append(index)
+                freqs[term].append(tf)
+
+        # 每個posting預先算好BM25權重，查詢時只需要累加
+        total = len(texts)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, term_ids in ids.items():
+            term_ids = np.array(term_ids, dtype=np.int32)
+            tf = np.array(freqs[term], dtype=np.float32)
+            idf = np.log(1 + (total - len(term_ids) + 0.5) / (len(term_ids) + 0.5))
+            self.postings[term] = (term_ids, (idf * tf * (BM25_K1 + 1) / (tf + norm[term_ids])).astype(np.float32))
+
+    @classmethod
+    def from_records(cls, records: Iterable[ExtractionRecord], **kwargs) -> "LocalSearchIndex":
+        """
+        :param records: 抽取記錄，同類別同文本的記錄合併為一個條目
+        :return: LocalSearchIndex
+        """
+        entries: Dict[Tuple[str, str], LocalEntry] = {}
+        for record in records:
+            if record is None:
+                continue
+            _merge(entries, record)
+        return cls(list(entries.values()), **kwargs)
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict], **kwargs) -> "LocalSearchIndex":
+        """
+        :param results: langExtractor 的結果（含 id 與 records）
+        :return: LocalSearchIndex
+        """
+        return cls.from_records(RecordStore.from_results(results).records, **kwargs)
+
+    def updated(self, results: Iterable[Dict] = (), removed: Iterable[str] = ()) -> "LocalSearchIndex":
+        """
+        以新的抽取結果取代對應文件的條目，並移除已刪除的文件
+
+        未受影響條目的向量直接沿用，只計算新條目的向量。
+
+        :param results: 新增或修改文件的結果
+        :param removed: 已刪除的文件ID
+        :return: 新的 LocalSearchIndex
+        """
+        results = list(results)
+        replaced = {res['id'] for res in results} | set(removed)
+        entries: Dict[Tuple[str, str], LocalEntry] = {}
+        kept_rows: Dict[Tuple[str, str], int] = {}
+        for row, entry in enumerate(self.entries):
+            documents = [doc_id for doc_id in entry.documents if doc_id not in replaced]
+            if not documents:
+                continue
+            key = (entry.extraction_class, entry.text)
+            entries[key] = LocalEntry(entry.extraction_class, entry.text, dict(entry.attributes), documents, list(entry.notes))
+            if len(documents) == len(entry.documents):
+                kept_rows[key] = row
+
+        for record in RecordStore.from_results(results).records:
+            if record is not None and _merge(entries, record):
+                # 搜尋文本改變的條目需要重新計算向量
+                kept_rows.pop((record.extraction_class, record.text), None)
+
+        merged = list(entries.values())
+        vectors = np.zeros((len(merged), self.vectors.shape[1]), dtype=np.float32, order='F')
+        missing = []
+        for row, entry in enumerate(merged):
+            old_row = kept_rows.get((entry.extraction_class, entry.text))
+            if old_row is None:
+                missing.append(row)
+            else:
+                vectors[row] = self.vectors[old_row]
+        if missing:
+            vectors[missing] = self.vectorizer([merged[row].search_text() for row in missing])
+        return LocalSearchIndex(merged, vectors, self.vectorizer)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        sim_min_score: float = LOCAL_SEARCH_SIM_MIN_SCORE,
+        min_coverage: float = LOCAL_SEARCH_MIN_COVERAGE,
+    ) -> LocalSearchResult:
+        """
+        :param query: 查詢文本
+        :param limit: 結果數量
+        :param sim_min_score: 餘弦相似度下限
+        :param min_coverage: 判定有信心所需的查詢詞涵蓋比例
+        :return: LocalSearchResult
+        """
+        with metrics.timer("local_search_seconds"):
+            result = self._search(query, limit, sim_min_score, min_coverage)
+        metrics.inc("local_search_total", result="confident" if result.confident else "low_confidence")
+        return result
+
+    def _search(self, query: str, limit: int, sim_min_score: float, min_coverage: float) -> LocalSearchResult:
+        terms = set(tokenize(query))
+        if not self.entries or not terms:
+            return LocalSearchResult([], False, 0.0)
+
+        bm25 = np.zeros(len(self.entries), dtype=np.float32)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                bm25[posting[0]] += posting[1]
+        bm25_ranking = _top(bm25, 2 * limit, 0.0)
+
+        query_vector = self.vectorizer([query])[0]
+        dims = np.flatnonzero(query_vector)
+        if len(dims) * 4 < len(query_vector):
+            # 雜湊向量的查詢通常只有數十個非零維度，不必讀取整個矩陣
+            cosine = self.vectors[:, dims] @ query_vector[dims]
+        else:
+            cosine = self.vectors @ query_vector
+        cosine_ranking = _top(cosine, 2 * limit, sim_min_score)
+
+        fused = rrf([bm25_ranking, cosine_ranking])[:limit]
+        hits = [
+            LocalHit(
+                self.entries[index].extraction_class,
+                self.entries[index].text,
+                self.entries[index].attributes,
+                self.entries[index].documents,
+                score,
+            )
+            for index, score in fused
+        ]
+        if not hits:
+            return LocalSearchResult([], False, 0.0)
+
+        best = fused[0][0]
+        best_terms = set(tokenize(self.entries[best].search_text()))
+        coverage = len(terms & best_terms) / len(terms)
+        confident = best in bm25_ranking and best in cosine_ranking and coverage >= min_coverage
+        return LocalSearchResult(hits, confident, coverage)
+
+    def save(self, directory: str = DEFAULT_LOCAL_INDEX) -> None:
+        """
+        寫出條目（JSON）與向量矩陣（.npy），兩者都先寫入暫存檔再替換
+
+        :param directory: 索引目錄
+        """
+        os.makedirs(directory, exist_ok=True)
+        _atomic_write(directory, "vectors.npy", lambda f: np.save(f, np.asfortranarray(self.vectors, dtype=np.float32)))
+        _atomic_write(
+            directory,
+            "entries.json",
+            lambda f: f.write(json.dumps(
+                [[e.extraction_class, e.text, e.attributes, e.documents, e.notes] for e in self.entries],
+                ensure_ascii=False,
+            ).encode("utf-8")),
+        )
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_LOCAL_INDEX, **kwargs) -> Optional["LocalSearchIndex"]:
+        """
+        讀回索引，向量以memmap唯讀映射；BM25反向索引在載入時重建
+
+        :param directory: 索引目錄
+        :return: LocalSearchIndex，目錄不存在或檔案不一致時為None
+        """
+        entries_path = os.path.join(directory, "entries.json")
+        vectors_path = os.path.join(directory, "vectors.npy")
+        if not (os.path.exists(entries_path) and os.path.exists(vectors_path)):
+            return None
+        with open(entries_path, 'r', encoding='utf-8') as f:
+            entries = [LocalEntry(*row) for row in json.load(f)]
+        vectors = np.load(vectors_path, mmap_mode='r')
+        if len(vectors) != len(entries):
+            # 兩個檔案分別替換，中途中斷時可能不一致
+            return None
+        return cls(entries, vectors, **kwargs)
+
+
+def _merge(entries: Dict[Tuple[str, str], LocalEntry], record: ExtractionRecord) -> bool:
+    # 加入一筆記錄，回傳條目的搜尋文本是否改變
+    key = (record.extraction_class, record.text)
+    entry = entries.get(key)
+    changed = entry is None
+    if entry is None:
+        entry = entries[key] = LocalEntry(record.extraction_class, record.text, dict(record.attributes))
+    if record.doc_id not in entry.documents:
+        entry.documents.append(record.doc_id)
+    for name, value in record.attributes.items():
+        if name in _SKIP_ATTRIBUTES or not isinstance(value, str) or value in entry.notes:
+            continue
+        entry.notes.append(value)
+        changed = True
+    return changed
+
+
+def _atomic_write(directory: str, name: str, write: Callable[[Any], Any]) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, os.path.join(directory, name))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_MANIFEST_PATH = os.environ.get('INGEST_MANIFEST', 'KnowledgeBase/.cache/ingest_manifest.sqlite')
+
+
+@dataclass
+class ManifestEntry:
+    """已導入Graphiti的文件記錄"""
+
+    path: str
+    content_hash: str
+    episode_uuid: str
+    mtime: float
+
+
+@dataclass
+class SyncPlan:
+    """本次同步需要處理的文件"""
+
+    added: List[Dict] = field(default_factory=list)
+    modified: List[Dict] = field(default_factory=list)
+    unchanged: List[Dict] = field(default_factory=list)
+    deleted: List[ManifestEntry] = field(default_factory=list)
+
+    @property
+    def changed(self) -> List[Dict]:
+        return self.added + self.modified
+
+    def summary(self) -> str:
+        return (
+            f"新增 {len(self.added)}、修改 {len(self.modified)}、"
+            f"未變 {len(self.unchanged)}、刪除 {len(self.deleted)}"
+        )
+
+
+class IngestManifest:
+    """以SQLite保存的導入清單，用於增量同步"""
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingested (
+                path TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                episode_uuid TEXT NOT NULL,
+                mtime REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def entries(self) -> Dict[str, ManifestEntry]:
+        with self._lock:
+            rows = self._conn.execute("SELECT path, content_hash, episode_uuid, mtime FROM ingested").fetchall()
+        return {row[0]: ManifestEntry(*row) for row in rows}
+
+    def get(self, path: str) -> Optional[ManifestEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, content_hash, episode_uuid, mtime FROM ingested WHERE path = ?", (path,)
+            ).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def plan(self, documents: Iterable[Dict]) -> SyncPlan:
+        """
+        比較目前文件與清單，計算需要新增、更新與刪除的項目
+
+        :param documents: DocumentCollector 產生的文檔（需含 document_id 與 content_hash）
+        :return: SyncPlan
+        """
+        known = self.entries()
+        plan = SyncPlan()
+        for doc in documents:
+            entry = known.pop(doc["document_id"], None)
+            if entry is None:
+                plan.added.append(doc)
+            elif entry.content_hash != doc["content_hash"]:
+                plan.modified.append(doc)
+            else:
+                plan.unchanged.append(doc)
+        # 剩下的條目在磁碟上已不存在
+        plan.deleted = list(known.values())
+        return plan
+
+    def record(self, path: str, content_hash: str, episode_uuid: str, mtime: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingested VALUES (?, ?, ?, ?)",
+                (path, content_hash, episode_uuid, mtime),
+            )
+            self._conn.commit()
+
+    def remove(self, path: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM ingested WHERE path = ?", (path,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,251 @@
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 設定 AGENTS_METRICS=1 開啟；關閉時 registry 為None，各記錄函數只做一次None檢查
+ENABLED = os.environ.get('AGENTS_METRICS', '') == '1'
+# 結束時寫出的檔案，.json 為JSON快照，其餘為Prometheus文字格式
+METRICS_FILE = os.environ.get('AGENTS_METRICS_FILE', '')
+
+PREFIX = "agents_"
+
+# 延遲直方圖的上界（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    "discovery_seconds": "Time spent walking the docs tree",
+    "files_discovered_total": "Source files matched by discovery",
+    "file_read_seconds": "Time to read and decode one file",
+    "bytes_decoded_total": "Bytes read from disk and decoded, by encoding",
+    "file_read_errors_total": "Files that could not be read, by error kind",
+    "extraction_cache_requests_total": "Extraction cache lookups, by result",
+    "model_call_seconds": "Model call latency including retries and rate-limit waits",
+    "model_calls_total": "Model calls, by outcome",
+    "model_retries_total": "Retried model requests",
+    "model_ratelimit_wait_seconds_total": "Time spent waiting on the client-side rate limiter",
+    "model_tokens_in_total": "Estimated prompt tokens sent to the model",
+    "model_tokens_out_total": "Estimated tokens in returned extractions",
+    "normalize_seconds": "Time to normalize one document's extractions",
+    "graph_add_episode_seconds": "graphiti.add_episode / add_episode_bulk latency",
+    "episodes_total": "Episodes written to the graph, by outcome",
+    "graph_cypher_seconds": "Batched UNWIND Cypher write latency, by query",
+    "graph_search_seconds": "graphiti search latency on cache misses",
+    "search_cache_requests_total": "Search result cache lookups, by result",
+    "local_search_seconds": "In-process BM25 + vector search latency",
+    "local_search_total": "Local index queries, by confidence",
+    "query_ttft_seconds": "Query agent time to first answer token",
+    "neighborhood_rerank_seconds": "In-process graph-distance rerank latency for center-node searches",
+}
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """固定上界的直方圖（各桶非累積計數，匯出時再累加）"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """以桶上界估計分位數"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """執行緒安全的計數器與直方圖集合"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[Tuple, float]] = {}
+        self.histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def time(self, name: str, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        JSON友好的快照
+
+        :return: {'counters': {名稱: [{labels, value}]}, 'histograms': {名稱: [{labels, count, sum, p50, p99, buckets}]}}
+        """
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self.counters.items()
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "p50": histogram.quantile(0.5),
+                        "p99": histogram.quantile(0.99),
+                        "buckets": {str(bound): count for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts)},
+                    }
+                    for key, histogram in series.items()
+                ]
+                for name, series in self.histograms.items()
+            }
+        return {"timestamp": time.time(), "counters": counters, "histograms": histograms}
+
+    def to_prometheus(self, openmetrics: bool = False) -> str:
+        """
+        Prometheus文字格式（可供node_exporter textfile collector讀取）
+
+        :param openmetrics: 輸出OpenMetrics格式（counter的TYPE不含_total，結尾加 # EOF）
+        :return: 匯出文字
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                family = PREFIX + (name[:-len("_total")] if openmetrics and name.endswith("_total") else name)
+                lines.append(f"# HELP {family} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {family} counter")
+                for key, value in series.items():
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                family = PREFIX + name
+                lines.append(f"# HELP {family} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {family} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{family}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+                    lines.append(f"{family}_sum{_format_labels(key)} {histogram.sum:g}")
+                    lines.append(f"{family}_count{_format_labels(key)} {histogram.count}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """
+        寫出到檔案（先寫暫存檔再改名，讀取方不會看到寫到一半的內容）
+
+        :param path: .json 寫JSON快照，其餘寫Prometheus文字格式
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.endswith(".json"):
+            payload = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        else:
+            payload = self.to_prometheus()
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(temporary, path)
+
+
+registry: Optional[MetricsRegistry] = MetricsRegistry() if ENABLED else None
+
+
+def enable() -> MetricsRegistry:
+    """開啟記錄（已開啟時返回現有的registry）"""
+    global registry
+    if registry is None:
+        registry = MetricsRegistry()
+    return registry
+
+
+def disable() -> None:
+    global registry
+    registry = None
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    if registry is not None:
+        registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    if registry is not None:
+        registry.observe(name, value, **labels)
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def timer(name: str, **labels: Any):
+    """
+    量測with區塊的耗時，關閉時返回共用的空context
+
+    :param name: 直方圖名稱
+    :return: context manager
+    """
+    if registry is None:
+        return _NULL_TIMER
+    return registry.time(name, **labels)
+
+
+def write(path: Optional[str] = None) -> Optional[str]:
+    """
+    寫出目前的指標
+
+    :param path: 目標檔案，預設 AGENTS_METRICS_FILE
+    :return: 實際寫出的路徑，未開啟或沒有路徑時返回None
+    """
+    path = path or METRICS_FILE
+    if registry is None or not path:
+        return None
+    registry.write(path)
+    return path
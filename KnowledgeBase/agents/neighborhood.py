@@ -0,0 +1,214 @@
+import math
+import os
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import metrics
+
+# 以中心節點重排序時在行程內計算圖距離，不必每次查詢都對Neo4j做一次遍歷
+# 設為0時改回 graphiti 的 node_distance_reranker
+NEIGHBORHOOD_ENABLED = os.environ.get('NEIGHBORHOOD_RERANK', '1') != '0'
+# 計算距離的跳數；graphiti 只區分中心、一跳鄰居與其他節點，預設1與其排序相同
+NEIGHBORHOOD_HOPS = int(os.environ.get('NEIGHBORHOOD_HOPS', 1))
+# 快取距離表的中心節點數（LRU）
+NEIGHBORHOOD_CACHE_SIZE = int(os.environ.get('NEIGHBORHOOD_CACHE_SIZE', 1024))
+# 增量加入的邊累積到此數量時併入CSR陣列
+NEIGHBORHOOD_COMPACT_EDGES = int(os.environ.get('NEIGHBORHOOD_COMPACT_EDGES', 4096))
+
+# node_distance_reranker 以無向的 RELATES_TO 計算距離，這裡同樣視為無向邊
+ADJACENCY_QUERY = """
+MATCH (source:Entity)-[:RELATES_TO]->(target:Entity)
+RETURN source.uuid AS source, target.uuid AS target
+"""
+
+
+def _csr(src: np.ndarray, dst: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """將 (src, dst) 邊列轉為去重、排序後的CSR陣列"""
+    keys = np.unique(src.astype(np.int64) * size + dst)
+    src, dst = np.divmod(keys, size)
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=size), out=indptr[1:])
+    return indptr, dst.astype(np.int32)
+
+
+class NeighborhoodIndex:
+    """
+    Entity 節點的無向鄰接表（CSR陣列）與熱門中心節點的k跳距離表
+
+    導入新的邊時先放在增量鄰接表，累積到 compact_edges 條再併入CSR；只有可能受影響的
+    距離表會失效。刪除episode會同時刪除邊，無法增量處理，改以 stale 標記下次使用時重新載入。
+    """
+
+    def __init__(
+        self,
+        hops: int = NEIGHBORHOOD_HOPS,
+        cache_size: int = NEIGHBORHOOD_CACHE_SIZE,
+        compact_edges: int = NEIGHBORHOOD_COMPACT_EDGES,
+    ):
+        """
+        :param hops: 計算距離的跳數，超過的節點距離為無限大
+        :param cache_size: 快取距離表的中心節點數
+        :param compact_edges: 增量邊併入CSR的門檻
+        """
+        self.hops = max(1, hops)
+        self.cache_size = max(1, cache_size)
+        self.compact_edges = max(1, compact_edges)
+        self.node_ids: Dict[str, int] = {}
+        self.uuids: List[str] = []
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self._delta: Dict[int, List[int]] = defaultdict(list)
+        self._delta_edges = 0
+        self._distances: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self.stale = False
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[str, str]], **kwargs: Any) -> "NeighborhoodIndex":
+        """
+        :param edges: (source_node_uuid, target_node_uuid)
+        :return: 以全部邊建立CSR的索引
+        """
+        index = cls(**kwargs)
+        src, dst = [], []
+        for source, target in edges:
+            if source == target:
+                continue
+            a, b = index._node(source), index._node(target)
+            src += (a, b)
+            dst += (b, a)
+        index.indptr, index.indices = _csr(
+            np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64), len(index.uuids)
+        )
+        return index
+
+    @classmethod
+    async def load(cls, driver: Any, **kwargs: Any) -> "NeighborhoodIndex":
+        """
+        以一次查詢讀取所有 RELATES_TO 邊
+
+        :param driver: 提供 execute_query 的圖資料庫驅動（graphiti.driver）
+        :return: NeighborhoodIndex
+        """
+        records, _, _ = await driver.execute_query(ADJACENCY_QUERY, routing_='r')
+        return cls.from_edges(((record["source"], record["target"]) for record in records), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.uuids)
+
+    @property
+    def edge_count(self) -> int:
+        """無向邊數（增量部分可能含重複）"""
+        return (len(self.indices) + sum(len(neighbors) for neighbors in self._delta.values())) // 2
+
+    def _node(self, node_uuid: str) -> int:
+        node = self.node_ids.get(node_uuid)
+        if node is None:
+            node = self.node_ids[node_uuid] = len(self.uuids)
+            self.uuids.append(node_uuid)
+        return node
+
+    def add_edges(self, edges: Iterable[Tuple[str, str]]) -> None:
+        """
+        增量加入導入時寫入的邊
+
+        :param edges: (source_node_uuid, target_node_uuid)
+        """
+        touched = set()
+        for source, target in edges:
+            if source == target:
+                continue
+            a, b = self._node(source), self._node(target)
+            self._delta[a].append(b)
+            self._delta[b].append(a)
+            self._delta_edges += 1
+            touched.update((source, target))
+        if not touched:
+            return
+        # 新的邊只會縮短距離；端點都不在中心節點 hops-1 跳以內時，該中心的距離表不變
+        for center, distances in list(self._distances.items()):
+            if len(distances) < len(touched):
+                affected = any(node in touched and distance < self.hops for node, distance in distances.items())
+            else:
+                affected = any(distances.get(node, self.hops) < self.hops for node in touched)
+            if affected:
+                del self._distances[center]
+        if self._delta_edges >= self.compact_edges:
+            self._compact()
+
+    def _compact(self) -> None:
+        rows = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr))
+        delta_src = [node for node, neighbors in self._delta.items() for _ in neighbors]
+        delta_dst = [neighbor for neighbors in self._delta.values() for neighbor in neighbors]
+        self.indptr, self.indices = _csr(
+            np.concatenate([rows, np.array(delta_src, dtype=np.int64)]),
+            np.concatenate([self.indices.astype(np.int64), np.array(delta_dst, dtype=np.int64)]),
+            len(self.uuids),
+        )
+        self._delta.clear()
+        self._delta_edges = 0
+
+    def _neighbors(self, frontier: np.ndarray) -> np.ndarray:
+        """frontier 中所有節點的鄰居（可能重複）"""
+        rows = frontier[frontier < len(self.indptr) - 1]
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        counts = ends - starts
+        # 一次取出多個CSR列：每個位置 = 列起點 + 在列內的序號
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        parts = [self.indices[positions]]
+        if self._delta:
+            parts.extend(
+                np.array(self._delta[node], dtype=np.int32) for node in frontier.tolist() if node in self._delta
+            )
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def _bfs(self, center: int) -> Dict[str, int]:
+        distances = {self.uuids[center]: 0}
+        visited = np.zeros(len(self.uuids), dtype=bool)
+        visited[center] = True
+        frontier = np.array([center], dtype=np.int64)
+        for depth in range(1, self.hops + 1):
+            neighbors = self._neighbors(frontier)
+            neighbors = np.unique(neighbors[~visited[neighbors]])
+            if not len(neighbors):
+                break
+            visited[neighbors] = True
+            distances.update((self.uuids[node], depth) for node in neighbors.tolist())
+            frontier = neighbors.astype(np.int64)
+        return distances
+
+    def distances(self, center_node_uuid: str) -> Dict[str, int]:
+        """
+        :param center_node_uuid: 中心節點
+        :return: hops 跳以內的節點 → 距離（含中心本身，距離0）
+        """
+        distances = self._distances.get(center_node_uuid)
+        if distances is not None:
+            self._distances.move_to_end(center_node_uuid)
+            return distances
+        center = self.node_ids.get(center_node_uuid)
+        distances = {center_node_uuid: 0} if center is None else self._bfs(center)
+        self._distances[center_node_uuid] = distances
+        while len(self._distances) > self.cache_size:
+            self._distances.popitem(last=False)
+        return distances
+
+    def rerank_edges(self, edges: Sequence[Any], center_node_uuid: str, limit: Optional[int] = None) -> List[Any]:
+        """
+        與 graphiti 的 node_distance_reranker 相同的排序：依來源節點與中心的距離排序
+        （中心節點本身最前，hops 跳外最後），同距離保持原本的相關性順序，同一來源的邊相鄰
+
+        :param edges: 依相關性排序的 EntityEdge
+        :param center_node_uuid: 中心節點
+        :param limit: 結果數量，None表示全部
+        :return: 重排序後的邊
+        """
+        with metrics.timer("neighborhood_rerank_seconds"):
+            distances = self.distances(center_node_uuid)
+            by_source: Dict[str, List[Any]] = {}
+            for edge in edges:
+                by_source.setdefault(edge.source_node_uuid, []).append(edge)
+            order = sorted(by_source, key=lambda node: distances.get(node, math.inf))
+            reranked = [edge for node in order for edge in by_source[node]]
+        return reranked if limit is None else reranked[:limit]
@@ -0,0 +1,142 @@
+import bisect
+import copy
+import dataclasses
+import os
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+DEFAULT_PACK_CHARS = int(os.environ.get('EXTRACT_PACK_CHARS', 6000))
+
+FILE_MARKER = "\n\n=== FILE: {relative_path} ===\n\n"
+
+
+def pack_text(docs: Sequence[Dict]) -> Tuple[str, List[Tuple[str, int, int]]]:
+    """
+    以 `=== FILE: ... ===` 標記串接文檔，線性時間建構
+
+    :param docs: 含 document_id 與 text 的文檔
+    :return: (合併文本, [(document_id, 內容起點, 內容終點)])
+    """
+    parts: List[str] = []
+    members = []
+    position = 0
+    for doc in docs:
+        marker = FILE_MARKER.format(relative_path=doc["document_id"])
+        start = position + len(marker)
+        end = start + len(doc["text"])
+        parts.append(marker)
+        parts.append(doc["text"])
+        members.append((doc["document_id"], start, end))
+        position = end
+    return "".join(parts), members
+
+
+def pack_documents(docs: Sequence[Dict], max_chars: int = DEFAULT_PACK_CHARS) -> Tuple[List[Dict], List[Dict]]:
+    """
+    以best-fit decreasing將小文件裝箱成接近 max_chars 的批次
+
+    :param docs: DocumentCollector 產生的文檔
+    :param max_chars: 每批（含標記）的字符上限，0表示不打包
+    :return: (打包後的批次文檔, 不適合打包而原樣返回的文檔)
+    """
+    if max_chars <= 0:
+        return [], list(docs)
+
+    def cost(doc: Dict) -> int:
+        return len(FILE_MARKER.format(relative_path=doc["document_id"])) + len(doc["text"])
+
+    candidates = []
+    rest = []
+    for doc in docs:
+        # 只打包明顯小於上限的文件，大文件單獨處理（或切塊）
+        (candidates if cost(doc) <= max_chars // 2 else rest).append(doc)
+
+    # bins依剩餘容量排序，便於以二分搜尋找到最合適的箱子
+    capacities: List[Tuple[int, int]] = []
+    bins: List[List[Dict]] = []
+    for doc in sorted(candidates, key=cost, reverse=True):
+        size = cost(doc)
+        index = bisect.bisect_left(capacities, (size, -1))
+        if index < len(capacities):
+            remaining, bin_id = capacities.pop(index)
+        else:
+            remaining, bin_id = max_chars, len(bins)
+            bins.append([])
+        bins[bin_id].append(doc)
+        bisect.insort(capacities, (remaining - size, bin_id))
+
+    packs = []
+    for bin_id, members in enumerate(bins):
+        if len(members) == 1:
+            rest.append(members[0])
+            continue
+        # 同一批次內依路徑排序，相關文件相鄰
+        members.sort(key=lambda doc: doc["document_id"])
+        text, spans = pack_text(members)
+        packs.append({
+            "text": text,
+            "document_id": f"pack#{bin_id}",
+            "members": spans,
+        })
+    return packs, rest
+
+
+def _rebase(extraction: Any, offset: int) -> Any:
+    """返回偏移換算為文件內位置的副本，不修改模型結果，重試或重用時不會重複扣除偏移"""
+    interval = getattr(extraction, "char_interval", None)
+    if interval is not None and interval.start_pos is not None:
+        extraction = copy.copy(extraction)
+        extraction.char_interval = dataclasses.replace(
+            interval,
+            start_pos=interval.start_pos - offset,
+            end_pos=interval.end_pos - offset if interval.end_pos is not None else None,
+        )
+    return extraction
+
+
+def split_packed_extractions(pack: Dict, extractions: Iterable[Any]) -> Tuple[Dict[str, List[Any]], int]:
+    """
+    將批次的抽取結果歸還給各來源文件，偏移換算為文件內的位置
+
+    依序使用：char_interval 所在的文件區段 → attributes 中的 file_path → 文本出現的文件。
+
+    :param pack: pack_documents 產生的批次
+    :param extractions: 模型對批次文本的抽取結果
+    :return: ({document_id: extractions}, 無法歸屬的數量)
+    """
+    members = pack["members"]
+    starts = [start for _, start, _ in members]
+    by_id = {doc_id: (start, end) for doc_id, start, end in members}
+    text = pack["text"]
+    assigned: Dict[str, List[Any]] = {doc_id: [] for doc_id, _, _ in members}
+    unassigned = 0
+
+    for extraction in extractions:
+        owner = None
+        interval = getattr(extraction, "char_interval", None)
+        if interval is not None and interval.start_pos is not None:
+            index = bisect.bisect_right(starts, interval.start_pos) - 1
+            if index >= 0 and interval.start_pos < members[index][2]:
+                owner = members[index][0]
+            elif interval.end_pos is not None and interval.end_pos > interval.start_pos:
+                # 起點落在標記中（例如包含了前導換行），以終點判斷並截去標記部分
+                index = bisect.bisect_right(starts, interval.end_pos - 1) - 1
+                if index >= 0 and interval.start_pos < starts[index] < interval.end_pos <= members[index][2]:
+                    owner = members[index][0]
+                    extraction.char_interval = dataclasses.replace(interval, start_pos=starts[index])
+        if owner is None:
+            file_path = (getattr(extraction, "attributes", None) or {}).get("file_path")
+            if file_path in by_id:
+                owner = file_path
+                extraction.char_interval = None
+        if owner is None:
+            for doc_id, start, end in members:
+                found = text.find(extraction.extraction_text, start, end)
+                if found >= 0:
+                    owner = doc_id
+                    extraction.char_interval = None
+                    break
+        if owner is None:
+            unassigned += 1
+            continue
+        assigned[owner].append(_rebase(extraction, by_id[owner][0]))
+    return assigned, unassigned
@@ -0,0 +1,223 @@
+import asyncio
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from .cache import ExtractionCache
+from .chunker import DEFAULT_CHUNK_CHARS, merge_chunk_extractions, split_document
+from .extractor import EXTRACT_MODE, DocumentCollector, _normalize, combine_extractions, mode_fingerprint
+from .scheduler import ExtractionScheduler, ScheduledResult
+
+# 佇列結束標記
+_DONE = object()
+
+
+async def _run_all(coros: Iterable[Awaitable[Any]]) -> None:
+    """同時執行，任一個拋出例外時取消其餘的並拋出該例外（asyncio.gather 不會取消其餘的）"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@asynccontextmanager
+async def _signal_done(out: asyncio.Queue, count: int) -> AsyncIterator[None]:
+    """
+    區塊結束（包括出錯）時向下游送出 count 個結束標記
+
+    被取消時整條管線都在取消中，下游不再讀取，佇列可能已滿，因此不送出。
+    """
+    try:
+        yield
+    except asyncio.CancelledError:
+        raise
+    except BaseException:
+        for _ in range(count):
+            await out.put(_DONE)
+        raise
+    for _ in range(count):
+        await out.put(_DONE)
+
+
+@dataclass
+class PipelineStats:
+    """串流管線各階段的處理數量"""
+
+    discovered: int = 0
+    loaded: int = 0
+    cached: int = 0
+    extracted: int = 0
+    failed: int = 0
+    emitted: int = 0
+
+
+class StreamingPipeline:
+    """
+    以有界佇列串接 discover → read → extract → normalize 的串流管線
+
+    每個文件抽取完成後立即往下游傳遞，結果不帶原始碼內容，
+    記憶體用量只與佇列大小有關，與文件總數無關。
+    """
+
+    def __init__(
+        self,
+        collector: DocumentCollector,
+        scheduler: ExtractionScheduler,
+        cache: Optional[ExtractionCache] = None,
+        queue_size: int = 64,
+        read_workers: int = 4,
+        chunk_chars: int = DEFAULT_CHUNK_CHARS,
+        mode: str = EXTRACT_MODE,
+    ):
+        """
+        :param collector: 文件收集器
+        :param scheduler: 抽取排程器（使用其限流、重試與模型客戶端）
+        :param cache: 抽取結果快取
+        :param queue_size: 各階段之間的佇列上限
+        :param read_workers: 讀檔並行數
+        :param chunk_chars: 超過此長度的文件切塊並行抽取
+        :param mode: 抽取模式（llm / hybrid / static），須與建立scheduler時相同
+        """
+        self.collector = collector
+        self.scheduler = scheduler
+        self.cache = cache
+        self.queue_size = queue_size
+        self.read_workers = max(1, read_workers)
+        self.chunk_chars = chunk_chars
+        self.mode = mode
+        self.fingerprint = mode_fingerprint(scheduler, mode)
+        self.stats = PipelineStats()
+        self._model_slots: Optional[asyncio.Semaphore] = None
+
+    async def _discover(self, out: asyncio.Queue) -> None:
+        files = self.collector.iter_files()
+        async with _signal_done(out, self.read_workers):
+            # 每次在執行緒中取一小批路徑，佇列滿時自然形成背壓
+            while batch := await asyncio.to_thread(lambda: list(islice(files, 256))):
+                for file_path in batch:
+                    self.stats.discovered += 1
+                    await out.put(file_path)
+
+    async def _read(self, inbox: asyncio.Queue, out: asyncio.Queue) -> None:
+        while (file_path := await inbox.get()) is not _DONE:
+            doc = await asyncio.to_thread(self.collector.load_document, file_path)
+            if doc is not None:
+                self.stats.loaded += 1
+                await out.put(doc)
+
+    async def _call_model(self, chunk: Dict) -> ScheduledResult:
+        # 切塊後的請求同樣受排程器的並行上限約束
+        async with self._model_slots:
+            return await asyncio.to_thread(self.scheduler.extract_one, chunk["text"])
+
+    async def _extract_document(self, doc: Dict, chunks: List[Dict]) -> Optional[Dict]:
+        """查詢快取或呼叫模型，抽取失敗時返回None"""
+        if self.cache is not None:
+            data = await asyncio.to_thread(self.cache.get, self.fingerprint, doc["content_hash"])
+            if data is not None:
+                self.stats.cached += 1
+                return data
+        outcomes = await asyncio.gather(*(self._call_model(chunk) for chunk in chunks))
+        errors = [outcome for outcome in outcomes if outcome.error is not None]
+        if errors:
+            self.stats.failed += 1
+            print(f"❌ 抽取失敗 {doc['document_id']} (嘗試 {errors[0].attempts} 次): {errors[0].error}")
+            return None
+        self.stats.extracted += 1
+        extractions = merge_chunk_extractions(
+            (chunk["chunk_start"], outcome.result.extractions) for chunk, outcome in zip(chunks, outcomes)
+        )
+        data = _normalize(combine_extractions(extractions, doc, self.mode), doc)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, self.fingerprint, doc["content_hash"], data)
+        return data
+
+    async def _extract(self, inbox: asyncio.Queue, out: asyncio.Queue) -> None:
+        while (doc := await inbox.get()) is not _DONE:
+            chunks = split_document(doc, self.chunk_chars)
+            if self.mode == "static":
+                data = _normalize(combine_extractions((), doc, self.mode), doc)
+                self.stats.extracted += 1
+            else:
+                data = await self._extract_document(doc, chunks)
+                if data is None:
+                    continue
+
+            # 原始碼內容在此之後不再需要
+            await out.put({
+                'id': doc['document_id'],
+                'content_hash': doc['content_hash'],
+                'mtime': doc['mtime'],
+                'chunks': [[chunk["chunk_start"], chunk["chunk_end"]] for chunk in chunks],
+                'metadata': data['metadata'],
+                'records': data['records'],
+            })
+
+    async def stream(self) -> AsyncIterator[Dict]:
+        """
+        串流產出正規化後的結果（完成順序）
+
+        :return: 抽取結果的非同步迭代器
+        """
+        paths: asyncio.Queue = asyncio.Queue(self.queue_size)
+        docs: asyncio.Queue = asyncio.Queue(self.queue_size)
+        results: asyncio.Queue = asyncio.Queue(self.queue_size)
+        extract_workers = self.scheduler.max_concurrency
+        self._model_slots = asyncio.Semaphore(self.scheduler.max_concurrency)
+
+        async def read_stage() -> None:
+            async with _signal_done(docs, extract_workers):
+                await _run_all(self._read(paths, docs) for _ in range(self.read_workers))
+
+        async def extract_stage() -> None:
+            async with _signal_done(results, 1):
+                await _run_all(self._extract(docs, results) for _ in range(extract_workers))
+
+        tasks = [
+            asyncio.create_task(self._discover(paths)),
+            asyncio.create_task(read_stage()),
+            asyncio.create_task(extract_stage()),
+        ]
+        try:
+            while (res := await results.get()) is not _DONE:
+                self.stats.emitted += 1
+                yield res
+            # 讓上游的例外浮現
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self, sink: Callable[[Dict], Awaitable[Any]], sink_workers: int = 4) -> PipelineStats:
+        """
+        執行管線並把每個結果交給下游（例如 EpisodeIngestor.ingest_one）
+
+        任一階段或sink拋出例外時取消其餘工作，並將該例外拋給呼叫端。
+
+        :param sink: 處理單筆結果的協程函數
+        :param sink_workers: 下游並行數
+        :return: 各階段統計
+        """
+        pending: asyncio.Queue = asyncio.Queue(self.queue_size)
+        sink_workers = max(1, sink_workers)
+
+        async def feed() -> None:
+            # 被取消時關閉產生器，上游各階段的task一併取消
+            async with aclosing(self.stream()) as results:
+                async for res in results:
+                    await pending.put(res)
+            for _ in range(sink_workers):
+                await pending.put(_DONE)
+
+        async def drain() -> None:
+            while (res := await pending.get()) is not _DONE:
+                await sink(res)
+
+        # sink出錯時不能只等餵入結束：sink全部停止後 pending.put 會永遠等待
+        await _run_all([feed(), *(drain() for _ in range(sink_workers))])
+        return self.stats
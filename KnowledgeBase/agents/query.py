@@ -1,11 +1,179 @@
-import asyncio
+import os
+import time
 from datetime import datetime, timezone
-from typing import Annotated, List
+from typing import Annotated, Any, AsyncIterator, Dict, List, Optional
 from typing_extensions import TypedDict
 
-from graphiti_core.nodes import EpisodeType
-
-from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.messages import AIMessageChunk, HumanMessage, SystemMessage
+from langchain_core.tools import tool
 from langgraph.graph import add_messages
 
-from .agent import ()
\ No newline at end of file
+from . import metrics
+from .agent import build_tool_agent, thread_config, trim_history
+
+QUERY_MODEL = os.environ.get('QUERY_MODEL', 'gpt-4.1-mini')
+# 每個對話執行緒保留的訊息數上限，超過時從最舊的輪次開始移除
+QUERY_HISTORY_MESSAGES = int(os.environ.get('QUERY_HISTORY_MESSAGES', 24))
+# 每次搜尋回傳的結果數
+QUERY_SEARCH_LIMIT = int(os.environ.get('QUERY_SEARCH_LIMIT', 8))
+
+SYSTEM_PROMPT = """你是程式碼知識庫的查詢助理，知識圖中收錄了Jira腳本的import、Jira欄位、函數與設定參數。
+
+- 互相獨立的搜尋請在同一輪一次呼叫（例如同時搜尋關係與實體），不要一個接一個呼叫
+- 需要以某個實體為中心的關係時，先取得其節點UUID再呼叫 search_related
+- 以繁體中文回答，列出相關的檔案路徑；知識圖中沒有的資訊請直接說明，不要猜測
+"""
+
+
+class QueryState(TypedDict):
+    messages: Annotated[List, add_messages]
+
+
+def _format_edges(edges: Any) -> str:
+    lines = [f"- {edge.fact} (uuid={edge.uuid}, source={edge.source_node_uuid})" for edge in edges]
+    return "\n".join(lines) or "沒有找到相關的關係"
+
+
+def _format_nodes(nodes: Any) -> str:
+    lines = [f"- {node.name}: {node.summary[:200]} (uuid={node.uuid})" for node in nodes]
+    return "\n".join(lines) or "沒有找到相關的實體"
+
+
+def make_tools(searcher: Any = None) -> List[Any]:
+    """
+    建立查詢知識圖的工具
+
+    :param searcher: 提供 search_edges / search_nodes / get_local_index 的物件，預設為 connection 模組
+    :return: 工具列表
+    """
+    if searcher is None:
+        from . import connection as searcher
+
+    @tool
+    async def search_facts(query: str) -> str:
+        """以混合搜尋（語意相似度 + BM25）查詢知識圖中的關係（事實），例如某個腳本使用了哪些Jira欄位"""
+        return _format_edges(await searcher.search_edges(query, num_results=QUERY_SEARCH_LIMIT))
+
+    @tool
+    async def search_entities(query: str) -> str:
+        """以 NODE_HYBRID_SEARCH_RRF 查詢知識圖中的實體（package、Jira欄位、函數、設定參數）"""
+        return _format_nodes(await searcher.search_nodes(query, limit=QUERY_SEARCH_LIMIT))
+
+    @tool
+    async def search_related(query: str, center_node_uuid: str) -> str:
+        """查詢關係並依與中心節點的圖距離重排序；center_node_uuid 取自 search_entities 或 search_facts 的結果"""
+        return _format_edges(await searcher.search_edges(
+            query, center_node_uuid=center_node_uuid, num_results=QUERY_SEARCH_LIMIT
+        ))
+
+    @tool
+    async def search_code_index(query: str) -> str:
+        """查詢本地的抽取記錄索引（不經過圖資料庫），適合查函數名、import與欄位ID出現在哪些檔案"""
+        index = searcher.get_local_index()
+        if index is None:
+            return "本地索引尚未建立"
+        hits = index.search(query, QUERY_SEARCH_LIMIT).hits
+        lines = [f"- [{hit.extraction_class}] {hit.text}: {', '.join(hit.documents[:5])}" for hit in hits]
+        return "\n".join(lines) or "沒有找到相關的記錄"
+
+    return [search_facts, search_entities, search_related, search_code_index]
+
+
+def default_llm() -> Any:
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model=QUERY_MODEL, temperature=0, streaming=True)
+
+
+class QueryAgent:
+    """
+    知識圖查詢agent：agent ⇄ tools 迴圈，模型同一輪的多個工具呼叫同時執行，回答逐詞串流
+
+    對話記憶以 BoundedMemorySaver 保存，每個執行緒的訊息數以 QUERY_HISTORY_MESSAGES 為上限。
+    """
+
+    def __init__(self, llm: Any = None, searcher: Any = None, checkpointer: Any = None, remember: bool = False):
+        """
+        :param llm: 支援 bind_tools 的聊天模型，預設為 ChatOpenAI(QUERY_MODEL)
+        :param searcher: 搜尋後端，預設為 connection 模組
+        :param checkpointer: 預設為 BoundedMemorySaver
+        :param remember: 是否將每輪問答以message episode寫回Graphiti
+        """
+        self.tools = make_tools(searcher)
+        llm = llm if llm is not None else default_llm()
+        self.remember = remember
+        self.graph = build_tool_agent(QueryState, self._call_model(llm.bind_tools(self.tools)), self.tools, checkpointer)
+
+    @staticmethod
+    def _call_model(llm: Any):
+        async def call_model(state: QueryState) -> Dict[str, List]:
+            removals = trim_history(state["messages"], QUERY_HISTORY_MESSAGES)
+            history = state["messages"][len(removals):]
+            response = await llm.ainvoke([SystemMessage(SYSTEM_PROMPT), *history])
+            return {"messages": [*removals, response]}
+
+        return call_model
+
+    async def stream(self, question: str, thread_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        逐詞產生回答（工具呼叫輪次不產生文字）
+
+        :param question: 問題
+        :param thread_id: 對話執行緒ID，相同ID延續先前的對話
+        """
+        answer = []
+        async for chunk, meta in self.graph.astream(
+            {"messages": [HumanMessage(question)]}, thread_config(thread_id), stream_mode="messages"
+        ):
+            if meta.get("langgraph_node") != "agent" or not isinstance(chunk, AIMessageChunk):
+                continue
+            if isinstance(chunk.content, str) and chunk.content:
+                answer.append(chunk.content)
+                yield chunk.content
+        if self.remember:
+            await remember_turn(question, "".join(answer))
+
+    async def ask(self, question: str, thread_id: Optional[str] = None) -> str:
+        return "".join([token async for token in self.stream(question, thread_id)])
+
+
+async def remember_turn(question: str, answer: str) -> None:
+    """將一輪問答以message episode寫回Graphiti，之後的搜尋可以參考"""
+    from graphiti_core.nodes import EpisodeType
+
+    from .connection import get_graphiti, invalidate_search_cache, update_neighborhood
+
+    try:
+        added = await get_graphiti().add_episode(
+            name="Query Turn",
+            episode_body=f"user: {question}\nassistant: {answer}",
+            source=EpisodeType.message,
+            reference_time=datetime.now(timezone.utc),
+            source_description="Knowledge base query agent",
+        )
+        invalidate_search_cache()
+        update_neighborhood([(edge.source_node_uuid, edge.target_node_uuid) for edge in added.edges])
+    except Exception as e:
+        print(f"⚠️ 寫回問答失敗: {e}")
+
+
+async def measure_ttft(agent: QueryAgent, question: str, thread_id: Optional[str] = None) -> Dict[str, float]:
+    """
+    量測首字延遲（從送出問題到第一個回答token）與總時間
+
+    :param agent: QueryAgent（可搭配 fake_chat.FakeChatModel 與 fakes.FakeSearcher）
+    :param question: 問題
+    :param thread_id: 對話執行緒ID
+    :return: {'ttft_seconds', 'total_seconds', 'tokens'}
+    """
+    started = time.perf_counter()
+    ttft = None
+    tokens = 0
+    async for _ in agent.stream(question, thread_id):
+        if ttft is None:
+            ttft = time.perf_counter() - started
+        tokens += 1
+    total = time.perf_counter() - started
+    if ttft is not None:
+        metrics.observe("query_ttft_seconds", ttft)
+    return {"ttft_seconds": ttft if ttft is not None else total, "total_seconds": total, "tokens": tokens}
@@ -0,0 +1,142 @@
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+_JIRA_FIELD_RE = re.compile(r"customfield_\d+")
+
+
+class ExtractionRecord:
+    """單一抽取結果，保留類別、文本、屬性與原文偏移"""
+
+    __slots__ = ("doc_id", "extraction_class", "text", "attributes", "start", "end")
+
+    def __init__(
+        self,
+        doc_id: str,
+        extraction_class: str,
+        text: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ):
+        self.doc_id = doc_id
+        self.extraction_class = extraction_class
+        self.text = text
+        self.attributes = attributes or {}
+        self.start = start
+        self.end = end
+
+    def to_row(self) -> List[Any]:
+        """序列化為不含doc_id的緊湊列表（JSON友好）"""
+        return [self.extraction_class, self.text, self.attributes, self.start, self.end]
+
+    @classmethod
+    def from_row(cls, doc_id: str, row: List[Any]) -> "ExtractionRecord":
+        return cls(doc_id, *row)
+
+    def __repr__(self) -> str:
+        return f"ExtractionRecord({self.doc_id!r}, {self.extraction_class!r}, {self.text!r}, start={self.start}, end={self.end})"
+
+
+def records_from_extractions(extractions: Iterable[Any], doc_id: str) -> List[ExtractionRecord]:
+    """
+    將LangExtract的抽取結果轉為記錄，每個抽取都保留
+
+    :param extractions: Extraction 列表
+    :param doc_id: 文件ID
+    :return: ExtractionRecord 列表
+    """
+    records = []
+    for extraction in extractions:
+        interval = getattr(extraction, "char_interval", None)
+        records.append(ExtractionRecord(
+            doc_id,
+            extraction.extraction_class,
+            extraction.extraction_text,
+            dict(getattr(extraction, "attributes", None) or {}),
+            getattr(interval, "start_pos", None),
+            getattr(interval, "end_pos", None),
+        ))
+    return records
+
+
+class RecordStore:
+    """
+    抽取記錄的記憶體存放區，維護依類別、Jira欄位、函數名與文件的反向索引
+
+    例如 files_with_field("customfield_19210") 直接查表，不需要圖查詢。
+    """
+
+    def __init__(self):
+        self.records: List[Optional[ExtractionRecord]] = []
+        self.by_doc: Dict[str, List[int]] = defaultdict(list)
+        self.by_class: Dict[str, Set[int]] = defaultdict(set)
+        self.by_jira_field: Dict[str, Set[str]] = defaultdict(set)
+        self.by_function: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self.by_doc.values())
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict]) -> "RecordStore":
+        """
+        由 langExtractor 的結果建立
+
+        :param results: 含 id 與 records 的結果
+        :return: RecordStore
+        """
+        store = cls()
+        for res in results:
+            store.add_document(res['id'], (ExtractionRecord.from_row(res['id'], row) for row in res.get('records', ())))
+        return store
+
+    def add_document(self, doc_id: str, records: Iterable[ExtractionRecord]) -> None:
+        """加入（或取代）一個文件的所有記錄"""
+        self.remove_document(doc_id)
+        for record in records:
+            index = len(self.records)
+            self.records.append(record)
+            self.by_doc[doc_id].append(index)
+            self.by_class[record.extraction_class].add(index)
+            for field_id in self._jira_fields(record):
+                self.by_jira_field[field_id].add(doc_id)
+            if record.extraction_class == "function_name":
+                self.by_function[record.text.lower()].add(doc_id)
+
+    def remove_document(self, doc_id: str) -> None:
+        """移除文件的記錄，列表中的位置留空以保持其他索引有效"""
+        for index in self.by_doc.pop(doc_id, ()):
+            record = self.records[index]
+            self.records[index] = None
+            self.by_class[record.extraction_class].discard(index)
+            for field_id in self._jira_fields(record):
+                self._discard(self.by_jira_field, field_id, doc_id)
+            if record.extraction_class == "function_name":
+                self._discard(self.by_function, record.text.lower(), doc_id)
+
+    def files_with_field(self, field_id: str) -> Set[str]:
+        return self.by_jira_field.get(field_id, set())
+
+    def files_with_function(self, name: str) -> Set[str]:
+        return self.by_function.get(name.lower(), set())
+
+    def records_of_class(self, extraction_class: str) -> List[ExtractionRecord]:
+        return [self.records[index] for index in sorted(self.by_class.get(extraction_class, ()))]
+
+    def records_of_document(self, doc_id: str) -> List[ExtractionRecord]:
+        return [self.records[index] for index in self.by_doc.get(doc_id, ())]
+
+    @staticmethod
+    def _jira_fields(record: ExtractionRecord) -> Set[str]:
+        # jira_field 以外的記錄（如 code_with_comment）也可能引用欄位
+        return set(_JIRA_FIELD_RE.findall(record.text))
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, doc_id: str) -> None:
+        # 鍵已沒有任何文件時一併刪除，避免索引殘留空集合
+        docs = index.get(key)
+        if docs is None:
+            return
+        docs.discard(doc_id)
+        if not docs:
+            del index[key]
@@ -0,0 +1,250 @@
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence
+
+from . import metrics
+
+# 可重試的HTTP狀態碼：限流與伺服器端錯誤
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRYABLE_MARKERS = re.compile(
+    r"\b(429|500|502|503|504)\b|RESOURCE_EXHAUSTED|UNAVAILABLE|rate limit|quota",
+    re.IGNORECASE,
+)
+
+
+class ModelClient(Protocol):
+    """模型客戶端介面，回傳帶有 extractions 屬性的結果"""
+
+    def extract(self, text: str, prompt: str, examples: Sequence[Any], model_id: str) -> Any:
+        ...
+
+
+class LangExtractClient:
+    """預設客戶端，直接呼叫 lx.extract"""
+
+    def extract(self, text: str, prompt: str, examples: Sequence[Any], model_id: str) -> Any:
+        import langextract as lx
+
+        return lx.extract(
+            text_or_documents=text,
+            prompt_description=prompt,
+            examples=examples,
+            model_id=model_id,
+        )
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token數（約4字符一個token）"""
+    return len(text) // 4 + 1
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    """
+    從例外（及其cause鏈）中找出HTTP狀態碼
+
+    :param exc: 模型呼叫拋出的例外
+    :return: 狀態碼，找不到時返回None
+    """
+    seen = set()
+    current: Optional[BaseException] = exc
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        for attr in ("status_code", "code", "status"):
+            value = getattr(current, attr, None)
+            if isinstance(value, int):
+                return value
+        response = getattr(current, "response", None)
+        value = getattr(response, "status_code", None)
+        if isinstance(value, int):
+            return value
+        current = getattr(current, "original", None) or current.__cause__ or current.__context__
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """判斷例外是否為可重試的429/5xx錯誤"""
+    code = status_code_of(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return bool(_RETRYABLE_MARKERS.search(str(exc)))
+
+
+class TokenBucket:
+    """執行緒安全的令牌桶，速率以每分鐘計"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute 必須大於0")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        取得指定數量的令牌，不足時阻塞等待
+
+        :param amount: 需要的令牌數（超過容量時以容量計）
+        :return: 實際等待的秒數
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class RateLimiter:
+    """同時限制每分鐘請求數與token數"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens: int) -> float:
+        """
+        :param tokens: 本次請求的估計token數
+        :return: 等待的總秒數
+        """
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += self.tokens.acquire(tokens)
+        return waited
+
+
+@dataclass
+class RetryPolicy:
+    """指數退避加full jitter的重試策略"""
+
+    max_retries: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+@dataclass
+class ScheduledResult:
+    """單一文檔的抽取結果，error 不為 None 表示最終失敗"""
+
+    index: int
+    doc: Dict
+    result: Any = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+    latency: float = 0.0
+
+
+class ExtractionScheduler:
+    """以執行緒池並行呼叫模型，附帶限流與重試"""
+
+    def __init__(
+        self,
+        prompt: str,
+        examples: Sequence[Any],
+        model_id: str = "gemini-2.5-flash",
+        client: Optional[ModelClient] = None,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        retry: Optional[RetryPolicy] = None,
+    ):
+        self.prompt = prompt
+        self.examples = examples
+        self.model_id = model_id
+        self.client = client or LangExtractClient()
+        self.max_concurrency = max(1, max_concurrency)
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.retry = retry or RetryPolicy()
+        # prompt與範例在每次請求中都會送出，只需估算一次
+        self._overhead_tokens = estimate_tokens(prompt) + sum(
+            estimate_tokens(getattr(example, "text", "")) for example in examples
+        )
+
+    def extract_one(self, text: str) -> ScheduledResult:
+        """
+        對單一文本執行抽取，遇到429/5xx時以jitter退避重試
+
+        :param text: 文檔內容
+        :return: ScheduledResult（index與doc由呼叫方填入）
+        """
+        outcome = ScheduledResult(index=-1, doc={})
+        tokens = self._overhead_tokens + estimate_tokens(text)
+        started = time.monotonic()
+        waited = 0.0
+        for attempt in range(self.retry.max_retries + 1):
+            outcome.attempts = attempt + 1
+            waited += self.limiter.acquire(tokens)
+            try:
+                outcome.result = self.client.extract(text, self.prompt, self.examples, self.model_id)
+                outcome.error = None
+                break
+            except Exception as e:
+                outcome.error = e
+                if attempt >= self.retry.max_retries or not is_retryable(e):
+                    break
+                delay = self.retry.delay(attempt)
+                print(f"⏳ 模型請求失敗 ({e})，{delay:.1f}s 後重試 ({attempt + 1}/{self.retry.max_retries})")
+                time.sleep(delay)
+        outcome.latency = time.monotonic() - started
+        if metrics.registry is not None:
+            self._record(outcome, tokens, waited)
+        return outcome
+
+    def _record(self, outcome: ScheduledResult, tokens: int, waited: float) -> None:
+        metrics.observe("model_call_seconds", outcome.latency, model=self.model_id)
+        metrics.inc("model_calls_total", model=self.model_id, outcome="error" if outcome.error is not None else "ok")
+        metrics.inc("model_tokens_in_total", tokens * outcome.attempts, model=self.model_id)
+        if outcome.attempts > 1:
+            metrics.inc("model_retries_total", outcome.attempts - 1, model=self.model_id)
+        if waited:
+            metrics.inc("model_ratelimit_wait_seconds_total", waited, model=self.model_id)
+        if outcome.result is not None:
+            produced = sum(estimate_tokens(e.extraction_text) for e in getattr(outcome.result, "extractions", None) or [])
+            metrics.inc("model_tokens_out_total", produced, model=self.model_id)
+
+    def run(
+        self,
+        documents: Sequence[Dict],
+        on_result: Optional[Callable[[ScheduledResult], None]] = None,
+    ) -> List[ScheduledResult]:
+        """
+        並行抽取所有文檔
+
+        :param documents: 含 text 與 document_id 的文檔列表
+        :param on_result: 每完成一個文檔時在呼叫執行緒中回呼（完成順序）
+        :return: 與輸入順序一致的結果列表
+        """
+        results: List[Optional[ScheduledResult]] = [None] * len(documents)
+
+        def task(index: int, doc: Dict) -> ScheduledResult:
+            outcome = self.extract_one(doc["text"])
+            outcome.index = index
+            outcome.doc = doc
+            return outcome
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = [pool.submit(task, i, doc) for i, doc in enumerate(documents)]
+            for future in as_completed(futures):
+                outcome = future.result()
+                results[outcome.index] = outcome
+                if on_result is not None:
+                    on_result(outcome)
+
+        return results
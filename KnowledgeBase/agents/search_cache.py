@@ -0,0 +1,178 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+from graphiti_core.cross_encoder.client import CrossEncoderClient
+from graphiti_core.embedder.client import EmbedderClient
+
+from . import metrics
+
+SEARCH_CACHE_TTL = float(os.environ.get('SEARCH_CACHE_TTL', 300))
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 256))
+EMBED_CACHE_SIZE = int(os.environ.get('EMBED_CACHE_SIZE', 4096))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """帶有存活時間的LRU快取"""
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        """
+        :param maxsize: 最大條目數，超過時淘汰最久未使用者
+        :param ttl: 條目存活秒數，None表示不過期
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class CachedEmbedder(EmbedderClient):
+    """包裝Graphiti embedder，相同文本只嵌入一次"""
+
+    def __init__(self, embedder: Any, maxsize: int = EMBED_CACHE_SIZE):
+        self.embedder = embedder
+        self.cache = TTLCache(maxsize)
+
+    async def create(self, input_data: Any) -> List[float]:
+        key = input_data if isinstance(input_data, str) else None
+        if key is None and isinstance(input_data, list) and all(isinstance(item, str) for item in input_data):
+            key = tuple(input_data)
+        if key is None:
+            return await self.embedder.create(input_data)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = await self.embedder.create(input_data)
+            self.cache.set(key, vector)
+        return vector
+
+    async def create_batch(self, input_data_list: List[str]) -> List[List[float]]:
+        vectors: List[Optional[List[float]]] = [self.cache.get(text) for text in input_data_list]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            created = await self.embedder.create_batch([input_data_list[i] for i in missing])
+            for i, vector in zip(missing, created):
+                vectors[i] = vector
+                self.cache.set(input_data_list[i], vector)
+        return vectors
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.embedder, name)
+
+
+class CachedCrossEncoder(CrossEncoderClient):
+    """包裝Graphiti reranker，相同的 (query, passages) 不再重新排序"""
+
+    def __init__(self, cross_encoder: Any, maxsize: int = SEARCH_CACHE_SIZE, ttl: Optional[float] = SEARCH_CACHE_TTL):
+        self.cross_encoder = cross_encoder
+        self.cache = TTLCache(maxsize, ttl)
+
+    async def rank(self, query: str, passages: List[str]) -> List[Tuple[str, float]]:
+        key = (query, tuple(passages))
+        ranked = self.cache.get(key)
+        if ranked is None:
+            ranked = await self.cross_encoder.rank(query, passages)
+            self.cache.set(key, ranked)
+        return ranked
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.cross_encoder, name)
+
+
+def _config_key(config: Any) -> str:
+    if config is None:
+        return ""
+    dump = getattr(config, "model_dump_json", None)
+    return dump() if dump is not None else repr(config)
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+class SearchCache:
+    """
+    graphiti.search / graphiti._search 的結果快取
+
+    鍵為 (方法, 查詢, 搜尋設定, 中心節點, 其他參數)，導入新episode後呼叫 invalidate()。
+    """
+
+    def __init__(self, maxsize: int = SEARCH_CACHE_SIZE, ttl: Optional[float] = SEARCH_CACHE_TTL):
+        self.results = TTLCache(maxsize, ttl)
+        self.generation = 0
+
+    def invalidate(self) -> None:
+        """圖資料已改變，丟棄所有快取結果"""
+        self.generation += 1
+        self.results.clear()
+
+    async def search(self, graphiti: Any, query: str, center_node_uuid: Optional[str] = None, **kwargs: Any) -> Any:
+        """
+        快取版本的 graphiti.search
+
+        :param graphiti: Graphiti 實例
+        :param query: 查詢文本
+        :param center_node_uuid: 依圖距離重排序的中心節點
+        :return: graphiti.search 的結果
+        """
+        key = ("search", query, center_node_uuid, _freeze(kwargs))
+        return await self._cached(key, lambda: graphiti.search(query, center_node_uuid=center_node_uuid, **kwargs))
+
+    async def search_(self, graphiti: Any, query: str, config: Any, center_node_uuid: Optional[str] = None, **kwargs: Any) -> Any:
+        """
+        快取版本的 graphiti._search（搭配 NODE_HYBRID_SEARCH_RRF 等設定）
+
+        :param graphiti: Graphiti 實例
+        :param query: 查詢文本
+        :param config: SearchConfig
+        :param center_node_uuid: 依圖距離重排序的中心節點
+        :return: SearchResults
+        """
+        key = ("_search", query, _config_key(config), center_node_uuid, _freeze(kwargs))
+        return await self._cached(
+            key, lambda: graphiti._search(query=query, config=config, center_node_uuid=center_node_uuid, **kwargs)
+        )
+
+    async def _cached(self, key: Hashable, call: Any) -> Any:
+        results = self.results.get(key, _MISSING)
+        if results is not _MISSING:
+            metrics.inc("search_cache_requests_total", result="hit")
+            return results
+        metrics.inc("search_cache_requests_total", result="miss")
+        generation = self.generation
+        with metrics.timer("graph_search_seconds", method=key[0]):
+            results = await call()
+        # 查詢期間若有新資料導入，結果可能已過時，不寫入快取
+        if generation == self.generation:
+            self.results.set(key, results)
+        return results
@@ -0,0 +1,295 @@
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+# 抽取與導入之間的交換格式：單一檔案內的欄式陣列，可直接以memmap零複製讀取
+# 不含原始碼內容；字串（文件ID、類別、package、欄位ID等）只存一次，欄位內以編號引用
+SEGMENT_MAGIC = b"AGSEG\x00\x00\x01"
+SEGMENT_SUFFIX = ".seg"
+_ALIGN = 64
+_NONE = -1
+
+
+class _Columns:
+    """寫入時累積各欄位的值，字串經過interning"""
+
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+        self.doc_id: List[int] = []
+        self.content_hash: List[int] = []
+        self.mtime: List[float] = []
+        self.record_offset: List[int] = [0]
+        self.chunk_offset: List[int] = [0]
+        self.meta_offset: List[int] = [0]
+        self.rec_class: List[int] = []
+        self.rec_text: List[int] = []
+        self.rec_start: List[int] = []
+        self.rec_end: List[int] = []
+        self.attr_offset: List[int] = [0]
+        self.attr_key: List[int] = []
+        self.attr_value: List[int] = []
+        self.meta_key: List[int] = []
+        self.meta_value: List[int] = []
+        self.chunks: List[List[int]] = []
+
+    def intern(self, value: Any) -> int:
+        # 非字串的值（LLM偶爾回傳數字或列表）以JSON字串保存，讀取時還原
+        if not isinstance(value, str):
+            value = "\x00" + json.dumps(value, ensure_ascii=False)
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def add(self, res: Dict) -> None:
+        self.doc_id.append(self.intern(res['id']))
+        self.content_hash.append(self.intern(res.get('content_hash', '')))
+        self.mtime.append(float(res.get('mtime') or 0.0))
+        for key, value in (res.get('metadata') or {}).items():
+            self.meta_key.append(self.intern(key))
+            self.meta_value.append(self.intern(value))
+        self.meta_offset.append(len(self.meta_key))
+        for extraction_class, text, attributes, start, end in res.get('records', ()):
+            self.rec_class.append(self.intern(extraction_class))
+            self.rec_text.append(self.intern(text))
+            self.rec_start.append(_NONE if start is None else start)
+            self.rec_end.append(_NONE if end is None else end)
+            for key, value in (attributes or {}).items():
+                self.attr_key.append(self.intern(key))
+                self.attr_value.append(self.intern(value))
+            self.attr_offset.append(len(self.attr_key))
+        self.record_offset.append(len(self.rec_class))
+        self.chunks.extend(res.get('chunks', ()))
+        self.chunk_offset.append(len(self.chunks))
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        encoded = [value.encode("utf-8") for value in self.strings]
+        string_offset = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=string_offset[1:])
+        return {
+            "string_offset": string_offset,
+            "string_data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "doc_id": np.array(self.doc_id, dtype=np.int32),
+            "content_hash": np.array(self.content_hash, dtype=np.int32),
+            "mtime": np.array(self.mtime, dtype=np.float64),
+            "record_offset": np.array(self.record_offset, dtype=np.int64),
+            "chunk_offset": np.array(self.chunk_offset, dtype=np.int64),
+            "meta_offset": np.array(self.meta_offset, dtype=np.int64),
+            "meta_key": np.array(self.meta_key, dtype=np.int32),
+            "meta_value": np.array(self.meta_value, dtype=np.int32),
+            "rec_class": np.array(self.rec_class, dtype=np.int32),
+            "rec_text": np.array(self.rec_text, dtype=np.int32),
+            "rec_start": np.array(self.rec_start, dtype=np.int64),
+            "rec_end": np.array(self.rec_end, dtype=np.int64),
+            "attr_offset": np.array(self.attr_offset, dtype=np.int64),
+            "attr_key": np.array(self.attr_key, dtype=np.int32),
+            "attr_value": np.array(self.attr_value, dtype=np.int32),
+            "chunks": np.array(self.chunks, dtype=np.int64).reshape(-1, 2),
+        }
+
+
+def write_segment(results: Iterable[Dict], path: str) -> int:
+    """
+    將抽取結果寫成欄式交換檔（content 不寫入）
+
+    檔案結構：magic(8) | 標頭長度(uint64) | JSON標頭 | 各欄位陣列（64位元組對齊）。
+    先寫入暫存檔再替換，讀取端不會看到寫到一半的檔案。
+
+    :param results: langExtractor 的結果
+    :param path: 輸出路徑
+    :return: 寫入的文件數
+    """
+    columns = _Columns()
+    for res in results:
+        columns.add(res)
+    arrays = columns.arrays()
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({"documents": len(columns.doc_id), "columns": layout}).encode("utf-8")
+    data_start = _aligned(len(SEGMENT_MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(SEGMENT_MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name][2])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(columns.doc_id)
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class Segment:
+    """
+    以memmap開啟的交換檔，各欄位是檔案上的唯讀NumPy視圖
+
+    迭代時逐一產生與 langExtractor 相同格式的結果（不含 content），
+    字串在第一次使用時才解碼，不需要一次把整個檔案讀進記憶體。
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: write_segment 寫出的檔案
+        """
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._map[:len(SEGMENT_MAGIC)]) != SEGMENT_MAGIC:
+            raise ValueError(f"{path} 不是抽取結果交換檔")
+        header_length = int.from_bytes(bytes(self._map[len(SEGMENT_MAGIC):len(SEGMENT_MAGIC) + 8]), "little")
+        header_start = len(SEGMENT_MAGIC) + 8
+        header = json.loads(bytes(self._map[header_start:header_start + header_length]))
+        data_start = _aligned(header_start + header_length)
+
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, (dtype, shape, offset) in header["columns"].items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape)) if shape else 1
+            self.columns[name] = np.frombuffer(
+                self._map, dtype=dtype, count=count, offset=data_start + offset
+            ).reshape(shape)
+        self._strings: List[Optional[Any]] = [None] * (len(self.columns["string_offset"]) - 1)
+        self._string_ids: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.columns["doc_id"])
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(len(self)):
+            yield self.document(index)
+
+    def string(self, index: int) -> Any:
+        """
+        :param index: 字串編號
+        :return: 解碼後的值（寫入時不是字串的值還原為原本的型別）
+        """
+        value = self._strings[index]
+        if value is None:
+            offsets = self.columns["string_offset"]
+            value = bytes(self.columns["string_data"][offsets[index]:offsets[index + 1]]).decode("utf-8")
+            if value.startswith("\x00"):
+                value = json.loads(value[1:])
+            self._strings[index] = value
+        return value
+
+    def string_id(self, value: str) -> Optional[int]:
+        """
+        :param value: 字串
+        :return: 字串編號，不存在時為None（第一次呼叫時解碼整個字串表）
+        """
+        if self._string_ids is None:
+            self._string_ids = {self.string(index): index for index in range(len(self._strings)) if isinstance(self.string(index), str)}
+        return self._string_ids.get(value)
+
+    def document(self, index: int) -> Dict:
+        """
+        :param index: 文件位置
+        :return: {'id', 'content_hash', 'mtime', 'chunks', 'metadata', 'records'}
+        """
+        c = self.columns
+        meta_start, meta_end = c["meta_offset"][index], c["meta_offset"][index + 1]
+        chunk_start, chunk_end = c["chunk_offset"][index], c["chunk_offset"][index + 1]
+        return {
+            'id': self.string(c["doc_id"][index]),
+            'content_hash': self.string(c["content_hash"][index]),
+            'mtime': float(c["mtime"][index]),
+            'chunks': c["chunks"][chunk_start:chunk_end].tolist(),
+            'metadata': {
+                self.string(key): self.string(value)
+                for key, value in zip(c["meta_key"][meta_start:meta_end].tolist(), c["meta_value"][meta_start:meta_end].tolist())
+            },
+            'records': self.records(index),
+        }
+
+    def records(self, index: int) -> List[List[Any]]:
+        """
+        :param index: 文件位置
+        :return: ExtractionRecord.to_row() 格式的記錄
+        """
+        c = self.columns
+        rows = []
+        for position in range(c["record_offset"][index], c["record_offset"][index + 1]):
+            attr_start, attr_end = c["attr_offset"][position], c["attr_offset"][position + 1]
+            start, end = int(c["rec_start"][position]), int(c["rec_end"][position])
+            rows.append([
+                self.string(c["rec_class"][position]),
+                self.string(c["rec_text"][position]),
+                {
+                    self.string(key): self.string(value)
+                    for key, value in zip(c["attr_key"][attr_start:attr_end].tolist(), c["attr_value"][attr_start:attr_end].tolist())
+                },
+                None if start == _NONE else start,
+                None if end == _NONE else end,
+            ])
+        return rows
+
+    def class_counts(self) -> Dict[str, int]:
+        """各抽取類別的記錄數，直接在欄位上計算"""
+        classes, counts = np.unique(self.columns["rec_class"], return_counts=True)
+        return {self.string(index): int(count) for index, count in zip(classes.tolist(), counts.tolist())}
+
+    def documents_with(self, text: str) -> List[str]:
+        """
+        :param text: 抽取文本，例如 "customfield_19210" 或完整的import
+        :return: 含有此抽取的文件ID
+        """
+        string_id = self.string_id(text)
+        if string_id is None:
+            return []
+        positions = np.flatnonzero(self.columns["rec_text"] == string_id)
+        documents = np.searchsorted(self.columns["record_offset"], positions, side="right") - 1
+        return [self.string(self.columns["doc_id"][index]) for index in np.unique(documents).tolist()]
+
+    def close(self) -> None:
+        # 視圖仍引用memmap時由GC釋放；這裡只斷開本物件的引用
+        self.columns = {}
+        self._map = None
+
+    def __enter__(self) -> "Segment":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def is_segment(path: str) -> bool:
+    """以副檔名或檔頭判斷是否為交換檔（否則視為JSONL）"""
+    if path.endswith(SEGMENT_SUFFIX):
+        return True
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(SEGMENT_MAGIC)) == SEGMENT_MAGIC
+    except OSError:
+        return False
+
+
+def load_results(path: str) -> Iterable[Dict]:
+    """
+    讀取 extract --output 寫出的結果
+
+    :param path: 交換檔（.seg）或JSONL
+    :return: Segment（可迭代）或結果列表
+    """
+    if is_segment(path):
+        return Segment(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
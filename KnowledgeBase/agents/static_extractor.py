@@ -0,0 +1,197 @@
+import ast
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# 靜態規則改變時遞增，使hybrid模式的快取失效
+STATIC_VERSION = 1
+
+# 可以由語法分析精確取得、不需要LLM的抽取類別
+STATIC_CLASSES = frozenset({"import_statement", "jira_field", "function_name"})
+
+_JIRA_FIELD_RE = re.compile(r"customfield_\d+")
+
+# 副檔名 → 語言
+LANGUAGES = {
+    ".py": "python",
+    ".java": "java",
+    ".groovy": "groovy",
+    ".gradle": "groovy",
+    ".kt": "kotlin",
+    ".kts": "kotlin",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".ts": "typescript",
+    ".tsx": "typescript",
+}
+
+# 字串、模板字串與註解；比對前替換為等長空白以保留偏移
+_MASK_RE = re.compile(
+    r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`'
+    r'|//[^\n]*|/\*[\s\S]*?\*/'
+)
+_IMPORT_RE = re.compile(r"^[ \t]*import\b(?:[ \t]*(?:type[ \t]+)?\{[^}]*\})?[^;\n]*", re.MULTILINE)
+_REQUIRE_RE = re.compile(r"\b(?:const|let|var)\s+[\w${},\s]+?=\s*require\s*\([^)]*\)")
+_DEFINITION_RES = {
+    "groovy": [
+        re.compile(r"\bdef\s+(\w+)\s*\("),
+    ],
+    "kotlin": [
+        re.compile(r"\bfun\s+(?:<[^>]*>\s*)?(?:[\w.]+\.)?(\w+)\s*\("),
+    ],
+    "javascript": [
+        re.compile(r"\bfunction\s*\*?\s*(\w+)\s*\("),
+        re.compile(r"\b(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s*)?(?:function\b|(?:\([^)]*\)|\w+)\s*=>)"),
+        re.compile(r"^[ \t]*(?:(?:public|private|protected|static|async|get|set)\s+)*(\w+)\s*\([^)]*\)\s*\{", re.MULTILINE),
+    ],
+}
+_DEFINITION_RES["typescript"] = _DEFINITION_RES["javascript"] + [
+    re.compile(r"^[ \t]*(?:(?:public|private|protected|static|async|readonly)\s+)*(\w+)\s*\([^)]*\)\s*:\s*[^{;=]+\{", re.MULTILINE),
+]
+# Java/Groovy 帶型別的方法宣告
+_TYPED_METHOD_RE = re.compile(
+    r"^[ \t]*(?:@\w+(?:\([^)]*\))?\s+)*(?:(?:public|private|protected|static|final|abstract|synchronized|native|default)\s+)*"
+    r"(?:<[^>]*>\s+)?[\w.$]+(?:<[^;{}()]*>)?(?:\[\])*\s+(\w+)\s*\([^;{}]*\)\s*(?:throws\s+[\w.,\s]+)?\{",
+    re.MULTILINE,
+)
+_DEFINITION_RES["java"] = [_TYPED_METHOD_RE]
+_DEFINITION_RES["groovy"].append(_TYPED_METHOD_RE)
+_METHOD_CALL_RE = re.compile(r"\.\s*(\w+)\s*\(")
+
+# 與函數呼叫語法相同的關鍵字
+_KEYWORDS = frozenset({
+    "if", "for", "while", "switch", "catch", "return", "new", "throw", "synchronized", "super", "this",
+    "function", "typeof", "await", "yield", "else", "do", "try", "when", "constructor",
+})
+
+
+@dataclass
+class StaticCharInterval:
+    start_pos: Optional[int] = None
+    end_pos: Optional[int] = None
+
+
+@dataclass
+class StaticExtraction:
+    """與 lx.data.Extraction 欄位相容的抽取結果"""
+
+    extraction_class: str
+    extraction_text: str
+    attributes: Optional[Dict[str, Any]] = None
+    char_interval: Optional[StaticCharInterval] = None
+
+
+def language_of(file_path: str) -> Optional[str]:
+    return LANGUAGES.get(os.path.splitext(file_path)[1].lower())
+
+
+def _mask(text: str) -> str:
+    """將字串與註解替換為空白（保留換行），長度不變"""
+    return _MASK_RE.sub(lambda match: re.sub(r"[^\n]", " ", match.group(0)), text)
+
+
+class _Collector:
+    """收集抽取結果，同一 (類別, 文本) 只保留第一次出現"""
+
+    def __init__(self, file_path: str, language: Optional[str]):
+        self.file_path = file_path
+        self.language = language
+        self.extractions: List[StaticExtraction] = []
+        self._seen: Set[Tuple[str, str]] = set()
+
+    def add(self, extraction_class: str, text: str, start: int, end: int, **attributes: Any) -> None:
+        key = (extraction_class, text)
+        if not text or key in self._seen:
+            return
+        self._seen.add(key)
+        attributes["file_path"] = self.file_path
+        if self.language:
+            attributes["language"] = self.language
+        self.extractions.append(StaticExtraction(
+            extraction_class=extraction_class,
+            extraction_text=text,
+            attributes=attributes,
+            char_interval=StaticCharInterval(start, end),
+        ))
+
+
+def _python(text: str, collector: _Collector) -> bool:
+    """以 ast 抽取Python的import、函數定義與呼叫，語法錯誤時返回False"""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return False
+
+    lines = text.splitlines(keepends=True)
+    line_starts = [0]
+    for line in lines:
+        line_starts.append(line_starts[-1] + len(line))
+
+    def offset(lineno: int, col: int) -> int:
+        # ast 的欄位偏移以UTF-8位元組計
+        line = lines[lineno - 1] if lineno - 1 < len(lines) else ""
+        return line_starts[lineno - 1] + len(line.encode("utf-8")[:col].decode("utf-8", errors="ignore"))
+
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            start = offset(node.lineno, node.col_offset)
+            end = offset(node.end_lineno, node.end_col_offset)
+            found.append((start, "import_statement", text[start:end], start, end, {"kind": "import"}))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            start = text.find(node.name, offset(node.lineno, node.col_offset))
+            found.append((start, "function_name", node.name, start, start + len(node.name), {"kind": "definition"}))
+        elif isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Attribute):
+                end = offset(func.end_lineno, func.end_col_offset)
+                found.append((end, "function_name", func.attr, end - len(func.attr), end, {"kind": "call"}))
+            elif isinstance(func, ast.Name):
+                start = offset(func.lineno, func.col_offset)
+                found.append((start, "function_name", func.id, start, start + len(func.id), {"kind": "call"}))
+    # ast.walk 為廣度優先，依原文位置排序使結果穩定
+    for _, extraction_class, value, start, end, attributes in sorted(found, key=lambda item: item[0]):
+        collector.add(extraction_class, value, start, end, **attributes)
+    return True
+
+
+def _brace(text: str, collector: _Collector) -> None:
+    """以遮蔽字串/註解後的正則抽取Groovy、Java、Kotlin、JS/TS"""
+    masked = _mask(text)
+    found = []
+    for pattern in (_IMPORT_RE, _REQUIRE_RE):
+        for match in pattern.finditer(masked):
+            start = match.start() + len(match.group(0)) - len(match.group(0).lstrip())
+            end = start + len(text[start:match.end()].rstrip())
+            found.append((start, "import_statement", text[start:end], start, end, {"kind": "import"}))
+    for pattern in _DEFINITION_RES.get(collector.language, _DEFINITION_RES["groovy"]):
+        for match in pattern.finditer(masked):
+            if match.group(1) not in _KEYWORDS:
+                found.append((match.start(1), "function_name", match.group(1), match.start(1), match.end(1), {"kind": "definition"}))
+    for match in _METHOD_CALL_RE.finditer(masked):
+        if match.group(1) not in _KEYWORDS:
+            found.append((match.start(1), "function_name", match.group(1), match.start(1), match.end(1), {"kind": "call"}))
+    for _, extraction_class, value, start, end, attributes in sorted(found, key=lambda item: item[0]):
+        collector.add(extraction_class, value, start, end, **attributes)
+
+
+def static_extract(text: str, file_path: str = "") -> List[StaticExtraction]:
+    """
+    不經LLM抽取 import_statement、jira_field 與 function_name
+
+    Python使用 ast（語法錯誤時退回正則），其餘語言在遮蔽字串與註解後以正則比對；
+    Jira欄位ID直接在原文（包含字串）中搜尋。
+
+    :param text: 文件內容
+    :param file_path: 文件路徑，用於判斷語言並寫入attributes
+    :return: StaticExtraction 列表（欄位與 lx.data.Extraction 相容）
+    """
+    language = language_of(file_path)
+    collector = _Collector(file_path, language)
+    for match in _JIRA_FIELD_RE.finditer(text):
+        collector.add("jira_field", match.group(0), match.start(), match.end(), field_type="custom_field")
+    if language != "python" or not _python(text, collector):
+        _brace(text, collector)
+    return collector.extractions
@@ -0,0 +1,377 @@
+import asyncio
+import json
+import os
+import re
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import metrics
+from .ingest import DEFAULT_RETRY_QUEUE, EpisodeIngestor, build_episode
+from .records import ExtractionRecord
+
+# 導入方式：episode 交給 graphiti.add_episode（LLM抽取實體與關係），structured 直接寫入節點與邊
+INGEST_MODES = ("episode", "structured")
+INGEST_MODE = os.environ.get('INGEST_MODE', "episode")
+# structured模式下自由文本類別（如 code_with_comment）的處理：episode 仍交給LLM，skip 只保留在episode內容中
+FREE_TEXT_MODES = ("episode", "skip")
+INGEST_FREE_TEXT = os.environ.get('INGEST_FREE_TEXT', "episode")
+DEFAULT_GROUP_ID = os.environ.get('INGEST_GROUP_ID', '')
+
+# 結構化類別 → (實體標籤, 關係名稱)；function_name 依 kind 分為定義與呼叫
+STRUCTURED_CLASSES = {
+    "import_statement": ("Package", "IMPORTS"),
+    "jira_field": ("JiraField", "USES_FIELD"),
+    "function_name": ("Function", "CALLS"),
+    "configuration_parameter": ("ConfigParameter", "DECLARES"),
+}
+FILE_LABEL = "File"
+
+# 確定性UUID的命名空間：同一實體在不同文件、不同次導入中得到相同UUID，MERGE即可去重
+_NAMESPACE = uuid.UUID("6f1c9a3e-2b7d-4e0a-9c55-0d8e4a7b1f21")
+_IMPORT_RES = (
+    re.compile(r"^\s*from\s+([\w.]+)\s+import\b"),
+    re.compile(r"\bfrom\s+['\"]([^'\"]+)['\"]"),
+    re.compile(r"\brequire\s*\(\s*['\"]([^'\"]+)['\"]"),
+    re.compile(r"^\s*import\s+(?:static\s+)?([\w.$*]+)"),
+)
+
+# Graphiti的Neo4j結構：Entity/Episodic 節點、RELATES_TO 與 MENTIONS 邊，導入後可直接以graphiti搜尋
+EPISODES_QUERY = """
+UNWIND $episodes AS episode
+MERGE (n:Episodic {uuid: episode.uuid})
+ON CREATE SET n.name = episode.name, n.group_id = episode.group_id, n.source = episode.source,
+    n.source_description = episode.source_description, n.content = episode.content,
+    n.created_at = episode.created_at, n.valid_at = episode.valid_at, n.entity_edges = []
+SET n.entity_edges = coalesce(n.entity_edges, []) + [x IN episode.entity_edges WHERE NOT x IN coalesce(n.entity_edges, [])]
+"""
+# 標籤無法參數化，只會代入 STRUCTURED_CLASSES 與 FILE_LABEL 中的固定值
+ENTITIES_QUERY = """
+UNWIND $nodes AS node
+MERGE (n:Entity {{uuid: node.uuid}})
+ON CREATE SET n += node
+SET n:{label}
+"""
+EDGES_QUERY = """
+UNWIND $edges AS edge
+MATCH (source:Entity {uuid: edge.source_node_uuid})
+MATCH (target:Entity {uuid: edge.target_node_uuid})
+MERGE (source)-[e:RELATES_TO {uuid: edge.uuid}]->(target)
+SET e = edge.properties
+"""
+MENTIONS_QUERY = """
+UNWIND $mentions AS mention
+MATCH (episode:Episodic {uuid: mention.episode_uuid})
+MATCH (node:Entity {uuid: mention.node_uuid})
+MERGE (episode)-[e:MENTIONS {uuid: mention.uuid}]->(node)
+SET e.group_id = mention.group_id, e.created_at = mention.created_at
+"""
+
+
+def _uuid(*parts: str) -> str:
+    return str(uuid.uuid5(_NAMESPACE, "\x1f".join(parts)))
+
+
+def package_of(record: ExtractionRecord) -> str:
+    """從import敘述取出套件/模組名稱，無法辨識時返回原文"""
+    package = record.attributes.get("package")
+    if package:
+        return str(package)
+    for pattern in _IMPORT_RES:
+        match = pattern.search(record.text)
+        if match:
+            return match.group(1)
+    return record.text.strip()
+
+
+@dataclass
+class GraphBatch:
+    """一批文件對應的節點、邊與episode列，供 UNWIND 批次寫入"""
+
+    episodes: List[Dict[str, Any]] = field(default_factory=list)
+    nodes: Dict[str, Dict[str, Dict[str, Any]]] = field(default_factory=dict)
+    edges: List[Dict[str, Any]] = field(default_factory=list)
+    mentions: List[Dict[str, Any]] = field(default_factory=list)
+
+    def add_node(self, label: str, name: str, group_id: str, now: datetime) -> str:
+        node_uuid = _uuid(group_id, label, name)
+        self.nodes.setdefault(label, {}).setdefault(node_uuid, {
+            "uuid": node_uuid,
+            "name": name,
+            "group_id": group_id,
+            "summary": "",
+            "created_at": now,
+        })
+        return node_uuid
+
+    def add_document(self, res: Dict, episode_uuid: str, group_id: str, now: datetime) -> None:
+        """
+        將一個文件的結構化記錄轉為 File 節點、目標實體、RELATES_TO 邊與 MENTIONS 邊
+
+        :param res: langExtractor 的結果（id, mtime, records）
+        :param episode_uuid: 此文件的episode
+        :param group_id: graphiti group_id
+        :param now: 建立時間
+        """
+        path = res["id"]
+        valid_at = datetime.fromtimestamp(res["mtime"], timezone.utc)
+        file_uuid = self.add_node(FILE_LABEL, path, group_id, now)
+        mentioned = {file_uuid}
+        edge_uuids = []
+        seen = set()
+        for row in res.get("records", ()):
+            record = ExtractionRecord.from_row(path, row)
+            mapping = STRUCTURED_CLASSES.get(record.extraction_class)
+            if mapping is None:
+                continue
+            label, relation = mapping
+            if record.extraction_class == "import_statement":
+                name = package_of(record)
+            elif record.extraction_class == "function_name":
+                name = record.text.lower()
+                if record.attributes.get("kind") == "definition":
+                    relation = "DEFINES"
+            else:
+                name = record.text
+            if (relation, label, name) in seen:
+                continue
+            seen.add((relation, label, name))
+            target_uuid = self.add_node(label, name, group_id, now)
+            mentioned.add(target_uuid)
+            # 邊屬於episode：文件更新後由 remove_episode 連同舊episode一起刪除
+            edge_uuid = _uuid(episode_uuid, relation, target_uuid)
+            edge_uuids.append(edge_uuid)
+            self.edges.append({
+                "uuid": edge_uuid,
+                "source_node_uuid": file_uuid,
+                "target_node_uuid": target_uuid,
+                "properties": {
+                    "uuid": edge_uuid,
+                    "name": relation,
+                    "fact": f"{path} {relation.lower().replace('_', ' ')} {name}",
+                    "group_id": group_id,
+                    "episodes": [episode_uuid],
+                    "created_at": now,
+                    "valid_at": valid_at,
+                    "expired_at": None,
+                    "invalid_at": None,
+                },
+            })
+        episode = build_episode(res)
+        self.episodes.append({
+            "uuid": episode_uuid,
+            "name": episode["name"],
+            "group_id": group_id,
+            "source": episode["source"].value,
+            "source_description": episode["source_description"],
+            "content": episode["episode_body"],
+            "created_at": now,
+            "valid_at": valid_at,
+            "entity_edges": edge_uuids,
+        })
+        self.mentions.extend(
+            {
+                "uuid": _uuid(episode_uuid, "MENTIONS", node_uuid),
+                "episode_uuid": episode_uuid,
+                "node_uuid": node_uuid,
+                "group_id": group_id,
+                "created_at": now,
+            }
+            for node_uuid in mentioned
+        )
+
+
+def free_text_records(res: Dict) -> List[List[Any]]:
+    """不屬於 STRUCTURED_CLASSES、需要LLM理解的記錄"""
+    return [row for row in res.get("records", ()) if row[0] not in STRUCTURED_CLASSES]
+
+
+def structured_episode_uuid(res: Dict, group_id: str = DEFAULT_GROUP_ID) -> str:
+    # 內容不變時重新導入得到同一個episode，MERGE不會重複寫入
+    return _uuid(group_id, "episode", res["id"], res.get("content_hash", ""))
+
+
+class GraphWriter:
+    """
+    以 UNWIND Cypher 批次寫入 GraphBatch
+
+    driver 需提供 `await execute_query(query, **params)`，如 graphiti 的 Neo4jDriver
+    或 neo4j.AsyncDriver（兩者都使用連線池）；測試時可用 fakes.FakeGraphDriver。
+    """
+
+    def __init__(self, driver: Any, embedder: Any, batch_rows: int = 1000):
+        """
+        :param driver: 圖資料庫驅動
+        :param embedder: 提供 create_batch 的embedder，用於節點名稱與關係事實的向量
+        :param batch_rows: 每個 UNWIND 查詢的最大列數
+        """
+        self.driver = driver
+        self.embedder = embedder
+        self.batch_rows = max(1, batch_rows)
+        self.queries = 0
+
+    async def _embed(self, rows: Sequence[Dict[str, Any]], source: str, target: str) -> None:
+        texts = list(dict.fromkeys(row[source] for row in rows))
+        if not texts:
+            return
+        vectors = dict(zip(texts, await self.embedder.create_batch(texts)))
+        for row in rows:
+            row[target] = vectors[row[source]]
+
+    async def _run(self, query: str, key: str, rows: Sequence[Dict[str, Any]]) -> None:
+        for start in range(0, len(rows), self.batch_rows):
+            with metrics.timer("graph_cypher_seconds", query=key):
+                await self.driver.execute_query(query, **{key: list(rows[start:start + self.batch_rows])})
+            self.queries += 1
+
+    async def write(self, batch: GraphBatch) -> None:
+        """
+        先寫節點再寫邊（邊的MATCH需要兩端節點已存在）
+
+        不同標籤的實體與episode互不重疊，並行寫入；兩種邊會鎖定相同的端點節點，依序寫入避免死鎖。
+        """
+        nodes = [node for by_uuid in batch.nodes.values() for node in by_uuid.values()]
+        await asyncio.gather(
+            self._embed(nodes, "name", "name_embedding"),
+            self._embed([edge["properties"] for edge in batch.edges], "fact", "fact_embedding"),
+        )
+        await asyncio.gather(
+            self._run(EPISODES_QUERY, "episodes", batch.episodes),
+            *(
+                self._run(ENTITIES_QUERY.format(label=label), "nodes", list(by_uuid.values()))
+                for label, by_uuid in batch.nodes.items()
+            ),
+        )
+        await self._run(EDGES_QUERY, "edges", batch.edges)
+        await self._run(MENTIONS_QUERY, "mentions", batch.mentions)
+
+
+class StructuredIngestor(EpisodeIngestor):
+    """
+    直接將結構化記錄寫成節點與邊的導入器，只計算向量，不經LLM
+
+    import、Jira欄位、函數與配置參數以批次 UNWIND 寫入；code_with_comment 等自由文本類別
+    在 free_text="episode" 時仍以 add_episode 交給graphiti抽取，其episode同時掛上結構化的邊。
+    """
+
+    def __init__(
+        self,
+        graphiti: Any,
+        driver: Optional[Any] = None,
+        embedder: Optional[Any] = None,
+        batch_size: int = 200,
+        max_concurrency: int = 4,
+        retry_queue_path: Optional[str] = DEFAULT_RETRY_QUEUE,
+        group_id: str = DEFAULT_GROUP_ID,
+        free_text: str = INGEST_FREE_TEXT,
+        on_edges: Optional[Callable[[List[Tuple[str, str]]], None]] = None,
+    ):
+        """
+        :param graphiti: Graphiti 實例（自由文本episode與預設的driver/embedder來源）
+        :param driver: 圖資料庫驅動，預設 graphiti.driver
+        :param embedder: embedder，預設 graphiti.embedder
+        :param batch_size: 每批文件數（一批的所有列合併為少數幾個 UNWIND 查詢）
+        :param max_concurrency: 同時進行的自由文本 add_episode 數
+        :param retry_queue_path: 失敗項目的JSONL路徑，None表示不寫入
+        :param group_id: graphiti group_id
+        :param free_text: FREE_TEXT_MODES 之一
+        :param on_edges: 寫入新的關係邊後的回呼，見 EpisodeIngestor
+        """
+        super().__init__(
+            graphiti,
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+            retry_queue_path=retry_queue_path,
+            episode_builder=self._free_text_episode,
+            on_edges=on_edges,
+        )
+        if free_text not in FREE_TEXT_MODES:
+            raise ValueError(f"未知的自由文本處理方式: {free_text}")
+        self.writer = GraphWriter(
+            driver if driver is not None else graphiti.driver,
+            embedder if embedder is not None else graphiti.embedder,
+        )
+        self.group_id = group_id
+        self.free_text = free_text
+
+    def _free_text_episode(self, res: Dict) -> Dict[str, Any]:
+        episode = build_episode(res)
+        episode["episode_body"] = json.dumps(
+            [{"class": row[0], "text": row[1], "attributes": row[2]} for row in free_text_records(res)],
+            ensure_ascii=False,
+        )
+        episode["group_id"] = self.group_id
+        return episode
+
+    async def _ingest_batch(
+        self,
+        batch: Sequence[Dict],
+        on_ingested: Optional[Callable[[Dict, str], Awaitable[None]]],
+        add_one: Callable[[Dict], Awaitable[bool]],
+    ) -> List[bool]:
+        return await self._write(batch, on_ingested)
+
+    async def ingest_one(
+        self,
+        res: Dict,
+        on_ingested: Optional[Callable[[Dict, str], Awaitable[None]]] = None,
+    ) -> bool:
+        return (await self._write([res], on_ingested))[0]
+
+    async def _episode_uuids(self, batch: Sequence[Dict]) -> List[Optional[str]]:
+        """有自由文本的文件先經 add_episode 取得episode，其餘使用確定性UUID"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def one(res: Dict) -> Optional[str]:
+            if self.free_text == "skip" or not free_text_records(res):
+                return structured_episode_uuid(res, self.group_id)
+            async with semaphore:
+                try:
+                    with metrics.timer("graph_add_episode_seconds", op="add_episode"):
+                        added = await self.graphiti.add_episode(**self.episode_builder(res))
+                except Exception as e:
+                    metrics.inc("episodes_total", outcome="failed")
+                    self._enqueue_retry(res, e)
+                    return None
+            self._report_edges(added.edges)
+            return added.episode.uuid
+
+        return list(await asyncio.gather(*(one(res) for res in batch)))
+
+    async def _write(
+        self,
+        batch: Sequence[Dict],
+        on_ingested: Optional[Callable[[Dict, str], Awaitable[None]]],
+    ) -> List[bool]:
+        episode_uuids = await self._episode_uuids(batch)
+        now = datetime.now(timezone.utc)
+        graph = GraphBatch()
+        written: List[Tuple[Dict, str]] = []
+        for res, episode_uuid in zip(batch, episode_uuids):
+            if episode_uuid is not None:
+                graph.add_document(res, episode_uuid, self.group_id, now)
+                written.append((res, episode_uuid))
+        try:
+            await self.writer.write(graph)
+        except Exception as e:
+            # 同一批的查詢是整批成功或失敗
+            metrics.inc("episodes_total", len(written), outcome="failed")
+            for res, _ in written:
+                self._enqueue_retry(res, e)
+            return [False] * len(batch)
+        if self.on_edges is not None and graph.edges:
+            self.on_edges([(edge["source_node_uuid"], edge["target_node_uuid"]) for edge in graph.edges])
+
+        succeeded = set()
+        for res, episode_uuid in written:
+            try:
+                if on_ingested is not None:
+                    await on_ingested(res, episode_uuid)
+            except Exception as e:
+                metrics.inc("episodes_total", outcome="failed")
+                self._enqueue_retry(res, e)
+                continue
+            metrics.inc("episodes_total", outcome="ok")
+            succeeded.add(id(res))
+        return [id(res) in succeeded for res in batch]
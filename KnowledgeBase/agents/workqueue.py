@@ -0,0 +1,468 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .cache import DEFAULT_CACHE_PATH, ExtractionCache
+
+DEFAULT_QUEUE_PATH = os.environ.get('WORKQUEUE_PATH', 'KnowledgeBase/.cache/workqueue.sqlite')
+# 每個工作項目包含的文件數；同一項目內的小文件仍會合併為單一請求
+DEFAULT_SHARD_SIZE = int(os.environ.get('WORKQUEUE_SHARD_SIZE', 16))
+# 租約秒數，worker每隔三分之一租約續約一次；逾期未續約的項目會被重新租出
+DEFAULT_LEASE_SECONDS = float(os.environ.get('WORKQUEUE_LEASE_SECONDS', 300))
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get('WORKQUEUE_MAX_ATTEMPTS', 3))
+# 多台機器透過網路檔案系統共用佇列時設為0：WAL需要共享記憶體，只能在同一台機器上使用
+WORKQUEUE_WAL = os.environ.get('WORKQUEUE_WAL', '1') != '0'
+# 每個本機worker位置異常結束後最多重新啟動的次數（例如金鑰錯誤、缺少套件時每次啟動都會失敗）
+DEFAULT_MAX_RESPAWNS = int(os.environ.get('WORKQUEUE_MAX_RESPAWNS', 3))
+# 以逗號分隔的API金鑰，依序分配給本機worker以分攤各金鑰的配額
+DEFAULT_API_KEYS = [key.strip() for key in os.environ.get('EXTRACT_API_KEYS', '').split(',') if key.strip()]
+
+
+def worker_cache_path(name: str) -> str:
+    """
+    worker專用的抽取快取路徑（EXTRACT_CACHE 加上worker名稱）
+
+    SQLite的檔案鎖在網路檔案系統上不可靠，抽取快取只能放在本機磁碟；
+    佇列放在共用儲存上時，各worker仍各自使用本機的快取檔，不互相共用。
+
+    :param name: worker名稱
+    :return: 快取路徑
+    """
+    root, ext = os.path.splitext(DEFAULT_CACHE_PATH)
+    return f"{root}-{name}{ext}"
+
+
+def paths_digest(paths: Sequence[str]) -> str:
+    """文件清單的指紋，續跑時用來確認佇列與本次要處理的文件相同"""
+    return hashlib.sha256(json.dumps(list(paths), ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class WorkItem:
+    """一個租出的工作項目"""
+
+    id: int
+    paths: List[str]
+    attempts: int
+
+
+class WorkQueue:
+    """
+    以SQLite保存的租約式工作佇列
+
+    coordinator 將文件清單分片寫入，多個 worker 行程（可在不同機器上，透過共用儲存）
+    以租約領取項目、抽取後寫回結果；worker死亡時租約逾期，項目自動回到可領取狀態。
+    每個行程各自開啟一個 WorkQueue。抽取快取不隨佇列共用，見 worker_cache_path。
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_QUEUE_PATH,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        """
+        :param path: SQLite檔案路徑
+        :param lease_seconds: 租約秒數
+        :param max_attempts: 單一項目最多嘗試次數，超過後標記為failed
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # 自行以 BEGIN IMMEDIATE 控制交易，領取與狀態轉換在行程之間互斥
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={'WAL' if WORKQUEUE_WAL else 'DELETE'}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                paths TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_items_status ON items(status, lease_until)")
+
+    def _transaction(self, statements) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                statements(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def create(self, docs_root: str, paths: Sequence[str], shard_size: int = DEFAULT_SHARD_SIZE, mode: str = "") -> int:
+        """
+        清空佇列並寫入新的文件清單
+
+        :param docs_root: 文件根目錄，worker以此還原完整路徑
+        :param paths: 相對於 docs_root 的文件路徑（依此順序合併結果）
+        :param shard_size: 每個工作項目的文件數
+        :param mode: 抽取模式，未指定模式的worker沿用此設定
+        :return: 工作項目數
+        """
+        shard_size = max(1, shard_size)
+        shards = [list(paths[start:start + shard_size]) for start in range(0, len(paths), shard_size)]
+
+        def statements(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM items")
+            conn.execute("DELETE FROM meta")
+            conn.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [("docs_root", os.path.abspath(docs_root)), ("mode", mode), ("paths_digest", paths_digest(paths))],
+            )
+            conn.executemany(
+                "INSERT INTO items (id, paths, status) VALUES (?, ?, 'pending')",
+                [(i, json.dumps(shard, ensure_ascii=False)) for i, shard in enumerate(shards)],
+            )
+
+        self._transaction(statements)
+        return len(shards)
+
+    def matches(self, docs_root: str, paths: Sequence[str], mode: str) -> bool:
+        """
+        :return: 佇列是否以相同的文件根目錄、文件清單與抽取模式建立（可以續跑）
+        """
+        return (
+            self.meta("docs_root") == os.path.abspath(docs_root)
+            and self.meta("paths_digest") == paths_digest(paths)
+            and self.meta("mode") == mode
+        )
+
+    def meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def lease(self, worker_id: str) -> Optional[WorkItem]:
+        """
+        領取一個待處理或租約已逾期的項目
+
+        :param worker_id: worker識別名稱
+        :return: WorkItem，沒有可領取的項目時返回None
+        """
+        leased: List[WorkItem] = []
+
+        def statements(conn: sqlite3.Connection) -> None:
+            now = time.time()
+            # 已用完嘗試次數的逾期項目不再租出
+            conn.execute(
+                "UPDATE items SET status = 'failed', error = 'lease expired', worker = NULL, lease_until = NULL "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, paths, attempts FROM items "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return
+            conn.execute(
+                "UPDATE items SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now + self.lease_seconds, row[0]),
+            )
+            leased.append(WorkItem(id=row[0], paths=json.loads(row[1]), attempts=row[2] + 1))
+
+        self._transaction(statements)
+        return leased[0] if leased else None
+
+    def heartbeat(self, item_id: int, worker_id: str) -> bool:
+        """
+        續約
+
+        :return: 租約仍屬於此worker時返回True
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE items SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, item_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, item_id: int, worker_id: str, results: List[Dict]) -> bool:
+        """
+        寫回結果
+
+        :param results: 抽取結果（不含原始碼內容）
+        :return: 租約已被其他worker取得時返回False，結果不寫入
+        """
+        payload = json.dumps(results, ensure_ascii=False)
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE items SET status = 'done', result = ?, error = NULL, lease_until = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (payload, item_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, item_id: int, worker_id: str, error: str) -> None:
+        """記錄失敗；未超過 max_attempts 時放回佇列"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, worker = NULL, lease_until = NULL WHERE id = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, error, item_id, worker_id),
+            )
+
+    def release_worker(self, worker_id: str) -> int:
+        """
+        立即釋放已死亡worker持有的租約（不必等到逾期）
+
+        :return: 釋放的項目數
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = 'worker died', worker = NULL, lease_until = NULL WHERE worker = ? AND status = 'leased'",
+                (self.max_attempts, worker_id),
+            )
+        return cursor.rowcount
+
+    def retry_failed(self) -> int:
+        """將failed項目重設為pending並清除嘗試次數（續跑時使用）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE items SET status = 'pending', attempts = 0, worker = NULL, lease_until = NULL WHERE status = 'failed'"
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def finished(self) -> bool:
+        counts = self.counts()
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+    def results(self) -> List[Dict]:
+        """依項目順序合併所有完成項目的結果"""
+        with self._lock:
+            rows = self._conn.execute("SELECT result FROM items WHERE status = 'done' ORDER BY id").fetchall()
+        return [res for (payload,) in rows for res in json.loads(payload)]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class _Heartbeat:
+    """在背景執行緒中定期續約，抽取時間超過租約也不會被其他worker搶走"""
+
+    def __init__(self, queue: WorkQueue, item: WorkItem, worker_id: str):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(queue, item, worker_id), daemon=True)
+
+    def _run(self, queue: WorkQueue, item: WorkItem, worker_id: str) -> None:
+        while not self._stop.wait(queue.lease_seconds / 3):
+            if not queue.heartbeat(item.id, worker_id):
+                return
+
+    def __enter__(self) -> "_Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(
+    queue_path: str = DEFAULT_QUEUE_PATH,
+    worker_id: Optional[str] = None,
+    mode: Optional[str] = None,
+    api_key: Optional[str] = None,
+    poll_seconds: float = 2.0,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    cache_path: Optional[str] = None,
+) -> int:
+    """
+    worker主迴圈：領取項目、讀檔抽取、寫回結果，佇列全部完成後結束
+
+    :param queue_path: 佇列路徑（多台機器時放在共用儲存上）
+    :param worker_id: worker識別名稱，預設 主機名-pid
+    :param mode: 抽取模式，預設沿用佇列建立時的設定
+    :param api_key: 此worker使用的API金鑰（多金鑰分攤配額），預設沿用環境變數
+    :param poll_seconds: 沒有可領取項目但其他worker仍在處理時的輪詢間隔
+    :param lease_seconds: 租約秒數
+    :param cache_path: 抽取快取路徑（必須在本機磁碟上），預設 worker_cache_path(worker_id)
+    :return: 完成的項目數
+    """
+    if api_key:
+        os.environ['LANGEXTRACT_API_KEY'] = api_key
+    from .extractor import EXTENSIONS, EXTRACT_MODE, DocumentCollector, Extractor
+
+    worker_id = worker_id or default_worker_id()
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+    docs_root = queue.meta("docs_root")
+    if docs_root is None:
+        queue.close()
+        raise ValueError(f"佇列尚未建立: {queue_path}")
+    mode = mode or queue.meta("mode") or EXTRACT_MODE
+    collector = DocumentCollector(docs_root, EXTENSIONS)
+    cache = ExtractionCache(cache_path or worker_cache_path(worker_id))
+    completed = 0
+    try:
+        while True:
+            item = queue.lease(worker_id)
+            if item is None:
+                if queue.finished():
+                    break
+                # 其他worker仍持有租約；若它們死亡，租約逾期後會在這裡被領走
+                time.sleep(poll_seconds)
+                continue
+            try:
+                with _Heartbeat(queue, item, worker_id):
+                    documents = [
+                        doc for doc in (collector.load_document(os.path.join(docs_root, path)) for path in item.paths)
+                        if doc is not None
+                    ]
+                    results = Extractor.langExtractor(documents, cache=cache, mode=mode, verbose=False)
+            except Exception as e:
+                print(f"❌ [{worker_id}] 項目 {item.id} 失敗 (第 {item.attempts} 次): {e}")
+                queue.fail(item.id, worker_id, repr(e))
+                continue
+            # 原始碼內容留在原檔，不寫入佇列
+            if queue.complete(item.id, worker_id, [{k: v for k, v in res.items() if k != 'content'} for res in results]):
+                completed += 1
+                print(f"✅ [{worker_id}] 項目 {item.id}: {len(results)}/{len(item.paths)} 個文件")
+            else:
+                print(f"⚠️ [{worker_id}] 項目 {item.id} 的租約已逾期，結果已捨棄")
+    finally:
+        cache.close()
+        queue.close()
+    return completed
+
+
+def coordinate(
+    docs_path: str,
+    workers: int,
+    mode: str,
+    queue_path: str = DEFAULT_QUEUE_PATH,
+    paths: Optional[Sequence[str]] = None,
+    resume: bool = False,
+    api_keys: Sequence[str] = tuple(DEFAULT_API_KEYS),
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    poll_seconds: float = 2.0,
+    max_respawns: int = DEFAULT_MAX_RESPAWNS,
+) -> List[Dict]:
+    """
+    coordinator：將文件清單分片寫入佇列，啟動本機worker行程，等待全部完成後合併結果
+
+    其他機器可在同一時間以 `python -m agents worker --queue <共用路徑>` 加入。
+    本機worker異常結束時立即釋放其租約並補上一個新的worker；同一位置重啟超過 max_respawns 次後不再補上，
+    所有本機worker都停止時拋出 RuntimeError。
+
+    :param docs_path: 文件根目錄
+    :param workers: 本機worker行程數，0表示只建立佇列並等待外部worker
+    :param mode: 抽取模式
+    :param queue_path: 佇列路徑
+    :param paths: 相對於 docs_path 的文件清單，預設掃描整個目錄
+    :param resume: 沿用現有佇列，只處理未完成與失敗的項目；佇列的文件根目錄、文件清單或模式
+        與本次不同時（例如上次同步後文件又有變動）捨棄舊佇列重新建立
+    :param api_keys: API金鑰列表，依序分配給本機worker，預設讀取 EXTRACT_API_KEYS
+    :param shard_size: 每個工作項目的文件數
+    :param poll_seconds: 檢查進度的間隔
+    :param max_respawns: 每個本機worker位置的重啟次數上限
+    :return: 依文件順序合併的抽取結果（不含原始碼內容）
+    """
+    from .extractor import EXTENSIONS, DocumentCollector
+
+    queue = WorkQueue(queue_path)
+    try:
+        if paths is None:
+            collector = DocumentCollector(docs_path, EXTENSIONS)
+            paths = [os.path.relpath(path, docs_path) for path in collector.find_files_with_extensions()]
+        if resume and queue.matches(docs_path, paths, mode):
+            retried = queue.retry_failed()
+            print(f"⏯️ 沿用佇列 {queue_path}: {queue.counts()}（重試 {retried} 個失敗項目）")
+        else:
+            if resume and queue.meta("docs_root") is not None:
+                print(f"⚠️ 佇列 {queue_path} 的文件根目錄、文件清單或模式與本次不同，重新建立")
+            shards = queue.create(docs_path, paths, shard_size, mode)
+            print(f"🗂️ {len(paths)} 個文件分為 {shards} 個工作項目")
+
+        context = multiprocessing.get_context("spawn")
+        processes: Dict[str, Tuple[multiprocessing.Process, int]] = {}
+        respawns = [0] * workers
+        exhausted = set()
+        spawned = 0
+
+        def spawn(slot: int) -> None:
+            nonlocal spawned
+            worker_id = f"{default_worker_id()}-w{spawned}"
+            # 金鑰依位置分配，重啟的worker沿用同一把金鑰
+            api_key = api_keys[slot % len(api_keys)] if api_keys else None
+            # 快取依位置命名，下次執行時同一位置的worker沿用上次的快取
+            process = context.Process(
+                target=run_worker,
+                args=(queue_path, worker_id, mode, api_key, poll_seconds),
+                kwargs={"cache_path": worker_cache_path(f"{socket.gethostname()}-w{slot}")},
+            )
+            process.start()
+            processes[worker_id] = (process, slot)
+            spawned += 1
+
+        for slot in range(workers):
+            spawn(slot)
+
+        while not queue.finished():
+            time.sleep(poll_seconds)
+            for worker_id, (process, slot) in list(processes.items()):
+                if process.is_alive():
+                    continue
+                del processes[worker_id]
+                if process.exitcode != 0:
+                    released = queue.release_worker(worker_id)
+                    print(f"💀 {worker_id} 異常結束 (exit {process.exitcode})，釋放 {released} 個項目")
+                    if queue.finished():
+                        continue
+                    if respawns[slot] >= max_respawns:
+                        print(f"🛑 worker位置 {slot} 已重啟 {respawns[slot]} 次，不再補上")
+                        exhausted.add(slot)
+                        continue
+                    respawns[slot] += 1
+                    spawn(slot)
+            if exhausted and not processes and not queue.finished():
+                raise RuntimeError(
+                    f"所有本機worker都已異常結束且超過重啟上限（{max_respawns} 次），"
+                    f"請檢查worker的錯誤輸出（API金鑰、套件安裝）後以 --resume 續跑"
+                )
+            counts = queue.counts()
+            print(f"⏱️ 進度: 完成 {counts['done']}、處理中 {counts['leased']}、待處理 {counts['pending']}、失敗 {counts['failed']}")
+
+        for process in processes.values():
+            process.join()
+
+        counts = queue.counts()
+        if counts["failed"]:
+            print(f"❌ {counts['failed']} 個工作項目超過重試次數，可用 --resume 重試")
+        return queue.results()
+    finally:
+        queue.close()